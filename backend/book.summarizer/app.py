@@ -1,422 +1,1181 @@
+"""Book summaries API
+
+The Flask app is built by create_app(); `app.app` (what the WSGI server and
+asgi.py load) is created on first access. Importing this module only reads
+configuration from the environment: upstream clients, stores and indexes
+are built the first time a request needs them, and background work starts
+when the app is created. Set STARTUP_SNAPSHOT to a file written by
+`python summary_index.py snapshot PATH` to restore the summary index at
+boot instead of scanning OUTPUT_DIR.
+"""
 import os
+import re
+import hmac
 import json
+import time
 import logging
+import threading
 from datetime import datetime
-from flask import Flask, request, jsonify, Response
+from contextlib import contextmanager
+from flask import Flask, Blueprint, current_app, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
-import requests
 from pathlib import Path
+from urllib.parse import urlsplit
 from dotenv import load_dotenv
+import metrics
+from upstream import create_session, UpstreamClient, ResilientSession
+from search_engine import SearchEngine
+from author_resolver import AuthorResolver
+from response_cache import ResponseCache, cached_response
+from llm import LLMClient, SingleFlight, prompt_hash
+from jobs import JobQueue, QueueFull
+from streaming import SectionSplitter, sse_event
+from translation import Translator
+from book_store import open_store
+from prompts import PromptBuilder
+from summary_index import SummaryIndex
+from summary_search import SummarySearch, PENDING, parse_frontmatter
+from catalog import Catalog
+from http_cache import FileBodyCache, PreparedBody
+from category_browser import CategoryBrowser, leaf_codes
 
 # Build the path to the .env file: go up three levels from the current file's directory
 env_path = Path(__file__).parent.parent.parent / ".env"
-print("Loading .env from:", env_path.resolve())
 load_dotenv(dotenv_path=env_path)
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("book_api_service.log"),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
 # API keys loaded from environment
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-print("Loaded OPENAI_API_KEY:", repr(OPENAI_API_KEY))
+GOOGLE_BOOKS_API_KEY = os.getenv("GOOGLE_BOOKS_API_KEY")
 
-# Initialize OpenAI client using the standard method
-import openai
-openai.api_key = OPENAI_API_KEY
-
-# Initialize Flask app
-app = Flask(__name__)
-CORS(app)  # Enable cross-origin requests
+# Log file opened by create_app(); empty to log to stderr only
+LOG_FILE = os.getenv("LOG_FILE", "book_api_service.log")
+# Summary index snapshot restored at boot (see summary_index.py)
+STARTUP_SNAPSHOT = os.getenv("STARTUP_SNAPSHOT")
 
 # Constants
 # Updated OUTPUT_DIR to point to your website's content folder for book summaries.
-OUTPUT_DIR = "C:/Users/alime/book-summaries/src/content/books"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-
-
-def generate_amazon_link(title, authors):
-    """Generate Amazon affiliate link"""
-    base_url = "https://www.amazon.com/s"
-    query = f"{title} {' '.join(authors)}".replace(' ', '+')
-    return f"{base_url}?k={query}&tag=gmh07-20" 
-
-def suggest_related_books(title, category=None):
-    """Suggest related books based on title or category"""
-    related_books = [
-        "The 7 Habits of Highly Effective People by Stephen Covey",
-        "Atomic Habits by James Clear",
-        "Deep Work by Cal Newport"
-    ]
-    return related_books
-
-def extract_quotes(summary):
-    """Extract or generate meaningful quotes from the summary"""
-    quotes = [
-        "A powerful quote capturing the book's essence",
-        "An insightful line that resonates with the book's theme",
-        "A thought-provoking statement from the text"
-    ]
-    return quotes
-
-def format_summary(title, authors, description, gpt_summary, language='english'):
-    """Format the summary in the desired Markdown structure"""
-    # Ensure authors is a string
-    if isinstance(authors, list):
-        authors = ', '.join(authors)
-    
-    # Generate links and suggestions
-    amazon_link = generate_amazon_link(title, [authors])
-    related_books = suggest_related_books(title)
-    quotes = extract_quotes(gpt_summary)
-    
-    # Parse the GPT-generated summary
-    sections = gpt_summary.split('## ')
-    
-    # Extract sections, with fallback values
-    short_summary = sections[1].split('\n')[0].strip() if len(sections) > 1 else "A brief overview of the book."
-    detailed_summary = sections[2] if len(sections) > 2 else "Detailed exploration of the book's content."
-    key_takeaways = sections[3].split('\n') if len(sections) > 3 else ["Key insight 1", "Key insight 2"]
-    
-    # Clean up key takeaways
-    key_takeaways = [takeaway.strip().replace('- ', '') for takeaway in key_takeaways if takeaway.strip()]
-    
-    summary_content = f"""---
-title: "{title}"
-author: "{authors}"
-pubDate: "{datetime.now().strftime('%Y-%m-%d')}"
-description: "{description or 'A comprehensive book summary'}"
-language: "{language}"
-amazonLink: "{amazon_link}"
----
-
-## Intro Sentence
-{short_summary}
-
-## The Big Idea
-A concise statement of the book's central thesis or most important concept.
-
-## Core Summary
-{detailed_summary.strip()}
-
-## Key Takeaways
-{''.join([f"🔑 {takeaway}\n" for takeaway in key_takeaways])}
-
-## Apply This Now
-1. 🎯 First actionable step derived from the book
-2. 🛠 Second practical application
-3. 🌱 Third implementable strategy
-
-## Quotes to Remember
-1. "{quotes[0]}"
-2. "{quotes[1]}"
-3. "{quotes[2]}"
-
-## Get this Book Now
-[Buy on Amazon]({amazon_link})
-
-## Pair With
-1. {related_books[0]}
-2. {related_books[1]}
-3. {related_books[2]}
-
-## About the Author
-{authors} is a notable author known for their significant contributions to literature and writing. Their other works include [List other books by the author if available].
-"""
-    return summary_content
+OUTPUT_DIR = os.getenv("OUTPUT_DIR", "C:/Users/alime/book-summaries/src/content/books")
+# Backend-only state (caches, indexes). The leading underscore keeps Astro's
+# content collection from picking these files up.
+CACHE_DIR = os.path.join(OUTPUT_DIR, "_cache")
+# Durable backend state that must not be thrown away with the caches
+DATA_DIR = os.path.join(OUTPUT_DIR, "_data")
+# Raw completions and generation metadata, one JSON record per summary file
+RAW_DIR = os.path.join(DATA_DIR, "raw")
+
+# Upstream base URLs, overridable so benchmarks can point at local stubs
+GOOGLE_BOOKS_API_URL = os.getenv("GOOGLE_BOOKS_API_URL", "https://www.googleapis.com/books/v1").rstrip('/')
+OPEN_LIBRARY_URL = os.getenv("OPEN_LIBRARY_URL", "https://openlibrary.org").rstrip('/')
+
+# Upstream timeouts (seconds). SEARCH_DEADLINE bounds the whole fan-out in
+# /api/book/search; UPSTREAM_TIMEOUT bounds any single upstream request.
+SEARCH_DEADLINE = float(os.getenv("SEARCH_DEADLINE", "4.0"))
+UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", "10.0"))
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "3.05"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60.0"))
+# Outbound requests per second allowed to each upstream
+GOOGLE_BOOKS_RPS = float(os.getenv("GOOGLE_BOOKS_RPS", "10"))
+OPEN_LIBRARY_RPS = float(os.getenv("OPEN_LIBRARY_RPS", "10"))
+OPENAI_RPS = float(os.getenv("OPENAI_RPS", "3"))
+
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "gpt-3.5-turbo")
+# Per-language / per-tier generation settings (model, max_tokens, temperature,
+# description_budget) as JSON, e.g.
+# {"languages": {"japanese": {"max_tokens": 1800}}, "tiers": {"premium": {"model": "gpt-4"}}}
+SUMMARY_PROFILES = json.loads(os.getenv("SUMMARY_PROFILES", "{}"))
+TRANSLATION_MODEL = os.getenv("TRANSLATION_MODEL", "gpt-3.5-turbo")
+# Replay mode serves only cached completions and never calls OpenAI
+OPENAI_REPLAY = os.getenv("OPENAI_REPLAY", "").lower() in ("1", "true", "yes")
+# Seconds between category warm-ups; 0 disables warming
+CATEGORY_WARMUP_INTERVAL = float(os.getenv("CATEGORY_WARMUP_INTERVAL", str(6 * 3600)))
+
+SUPPORTED_LANGUAGES = [
+    "english", "spanish", "french", "hindi", "german",
+    "italian", "portuguese", "russian", "japanese",
+    "chinese", "korean", "arabic", "dutch", "swedish",
+    "turkish", "polish", "ukrainian", "vietnamese",
+    "thai", "indonesian", "greek", "czech", "romanian",
+    "danish", "finnish", "norwegian", "hebrew", "farsi",
+    "malay", "swahili"
+]
+
+LANGUAGES = [
+    {"code": "english", "name": "English"},
+    {"code": "spanish", "name": "Spanish"},
+    {"code": "french", "name": "French"},
+    {"code": "hindi", "name": "Hindi"},
+    {"code": "german", "name": "German"},
+    {"code": "italian", "name": "Italian"},
+    {"code": "portuguese", "name": "Portuguese"},
+    {"code": "russian", "name": "Russian"},
+    {"code": "japanese", "name": "Japanese"},
+    {"code": "chinese", "name": "Chinese"},
+    {"code": "korean", "name": "Korean"},
+    {"code": "arabic", "name": "Arabic"},
+    {"code": "dutch", "name": "Dutch"},
+    {"code": "swedish", "name": "Swedish"},
+    {"code": "turkish", "name": "Turkish"},
+    {"code": "polish", "name": "Polish"},
+    {"code": "ukrainian", "name": "Ukrainian"},
+    {"code": "vietnamese", "name": "Vietnamese"},
+    {"code": "thai", "name": "Thai"},
+    {"code": "indonesian", "name": "Indonesian"},
+    {"code": "greek", "name": "Greek"},
+    {"code": "czech", "name": "Czech"},
+    {"code": "romanian", "name": "Romanian"},
+    {"code": "danish", "name": "Danish"},
+    {"code": "finnish", "name": "Finnish"},
+    {"code": "norwegian", "name": "Norwegian"},
+    {"code": "hebrew", "name": "Hebrew"},
+    {"code": "farsi", "name": "Farsi"},
+    {"code": "malay", "name": "Malay"},
+    {"code": "swahili", "name": "Swahili"}
+]
+
+CATEGORIES = [
+    {
+        "name": "Fiction",
+        "code": "fiction",
+        "subcategories": [
+            {
+                "name": "Literature",
+                "code": "literary+fiction",
+                "subcategories": [
+                    {"name": "Literary Fiction", "code": "literary+fiction"},
+                    {"name": "Classics", "code": "classic+literature"},
+                    {"name": "Historical Fiction", "code": "historical+fiction"},
+                    {"name": "Short Stories", "code": "short+stories"},
+                    {"name": "Women's Fiction", "code": "womens+fiction"},
+                    {"name": "Men's Fiction", "code": "mens+fiction"}
+                ]
+            }
+        ]
+    },
+    {
+        "name": "Non-Fiction",
+        "code": "nonfiction",
+        "subcategories": [
+            {
+                "name": "Self-Help",
+                "code": "self-help",
+                "subcategories": [
+                    {"name": "Personal Development", "code": "personal+development"},
+                    {"name": "Motivation", "code": "motivation+self-help"},
+                    {"name": "Mindfulness and Meditation", "code": "mindfulness+meditation"}
+                ]
+            }
+        ]
+    }
+]
+
+# Cache-Control for summary markdown and for the constant catalogs
+SUMMARY_CACHE_CONTROL = os.getenv("SUMMARY_CACHE_CONTROL", "public, max-age=300, stale-while-revalidate=86400")
+CATALOG_CACHE_CONTROL = os.getenv("CATALOG_CACHE_CONTROL", "public, max-age=86400")
+
+# Background summary generation: worker threads and max unfinished jobs
+SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", "2"))
+SUMMARY_MAX_PENDING = int(os.getenv("SUMMARY_MAX_PENDING", "200"))
+# Seconds a running job stays leased to its process without a heartbeat
+SUMMARY_JOB_LEASE = float(os.getenv("SUMMARY_JOB_LEASE", "60"))
+
+# Bearer token for the moderation endpoints; they are disabled when unset
+MODERATION_TOKEN = os.getenv("MODERATION_TOKEN")
+
+# Local Open Library catalog built by catalog.py; searched before the API when it exists
+CATALOG_DB = os.getenv("CATALOG_DB", os.path.join(DATA_DIR, "catalog.sqlite3"))
+CATALOG_CHECK_INTERVAL = 30.0
+
+# Cover proxy: thumbnailUrl in API responses points at /api/cover, which serves
+# resized covers from a disk cache. COVER_PROXY_URL is this API's public base
+# URL (defaults to the one the request came in on); only COVER_HOSTS are proxied.
+COVER_PROXY = os.getenv("COVER_PROXY", "true").lower() in ("1", "true", "yes")
+COVER_PROXY_URL = os.getenv("COVER_PROXY_URL", "").rstrip('/')
+COVER_HOSTS = os.getenv("COVER_HOSTS", "covers.openlibrary.org,books.google.com,books.googleusercontent.com").split(',')
+COVER_CACHE_MAX_BYTES = int(os.getenv("COVER_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+COVER_CACHE_CONTROL = os.getenv("COVER_CACHE_CONTROL", "public, max-age=31536000, immutable")
+
+
+DEFAULT_RELATED_BOOKS = [
+    "The 7 Habits of Highly Effective People by Stephen Covey",
+    "Atomic Habits by James Clear",
+    "Deep Work by Cal Newport"
+]
+
+def suggest_related_books(title, authors='', description='', summary='', count=3, related_engine=None):
+    """Suggest the most similar books we have summaries for
+
+    Uses book_service.related_engine unless another index is given. Falls
+    back to the static list while the corpus is too small (or numpy is not
+    installed).
+    """
+    suggestions = []
+    if related_engine is None:
+        related_engine = book_service.related_engine
+    if related_engine is not None:
+        from related_books import format_related_book, summary_text
+        try:
+            text = summary_text({'title': title, 'author': authors, 'description': description}, summary)
+            suggestions = [format_related_book(book)
+                           for book in related_engine.related(text, count, exclude=make_slug(title))]
+        except Exception as e:
+            logger.error(f"Error finding related books for {title}: {e}")
+    return with_fallback_books(title, suggestions, count)
+
+def with_fallback_books(title, suggestions, count=3):
+    """Pad related-book suggestions with the static list"""
+    suggestions = list(suggestions[:count])
+    for fallback in DEFAULT_RELATED_BOOKS:
+        if len(suggestions) >= count:
+            break
+        if not fallback.startswith(f"{title} by "):
+            suggestions.append(fallback)
+    return suggestions
+
+def make_slug(title):
+    """Derive the summary file slug from a book title"""
+    slug = ''.join(c if c.isalnum() or c.isspace() else '-' for c in title.lower())
+    slug = re.sub(r'-{2,}', '-', '-'.join(slug.split()))
+    return slug[:100]
+
+def summary_filename(slug, language='english'):
+    """Path of the summary markdown for a slug and language"""
+    if language != "english":
+        return f"{OUTPUT_DIR}/{slug}-{language}.md"
+    return f"{OUTPUT_DIR}/{slug}.md"
+
+OPEN_LIBRARY_ID_RE = re.compile(r'^OL\d+[WM]$')
+
+def book_source(book_id):
+    """The search source a book id came from: Open Library ids look like OL123W, the rest are Google's"""
+    return 'Open Library' if OPEN_LIBRARY_ID_RE.match(book_id) else 'Google Books'
+
+def write_file_atomic(filename, content):
+    """Write a text file via a temp file and rename so readers never see a partial file"""
+    tmp_filename = f"{filename}.{os.getpid()}.tmp"
+    with open(tmp_filename, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_filename, filename)
+
+def create_upstreams():
+    """Build the per-upstream clients (timeouts, rate limits, retries, breakers)"""
+    session = create_session()
+    return {
+        'googleBooks': UpstreamClient('googleBooks', session, UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_TIMEOUT,
+                                      rate=GOOGLE_BOOKS_RPS, burst=2 * GOOGLE_BOOKS_RPS),
+        'openLibrary': UpstreamClient('openLibrary', session, UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_TIMEOUT,
+                                      rate=OPEN_LIBRARY_RPS, burst=2 * OPEN_LIBRARY_RPS),
+        'openai': UpstreamClient('openai', None, UPSTREAM_CONNECT_TIMEOUT, OPENAI_TIMEOUT,
+                                 rate=OPENAI_RPS, burst=2 * OPENAI_RPS, max_rate_wait=30.0,
+                                 max_retries=3, backoff_max=20.0)
+    }
+
+def open_related_engine():
+    """A related-books index over OUTPUT_DIR that the caller loads or builds, or None without numpy"""
+    from related_books import RelatedBooks, NUMPY_AVAILABLE
+    if not NUMPY_AVAILABLE:
+        return None
+    return RelatedBooks(OUTPUT_DIR, os.path.join(CACHE_DIR, "related"), SUPPORTED_LANGUAGES)
+
+class lazy_property:
+    """Like functools.cached_property, but built once even when threads race for it"""
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.name = factory.__name__
+        self.__doc__ = factory.__doc__
+        self.lock = threading.RLock()
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        with self.lock:
+            if self.name not in instance.__dict__:
+                instance.__dict__[self.name] = self.factory(instance)
+        return instance.__dict__[self.name]
+
+
+def lazy(factory):
+    """Memoize a zero-argument factory the same way"""
+    lock = threading.RLock()
+    built = []
+
+    def get():
+        if not built:
+            with lock:
+                if not built:
+                    built.append(factory())
+        return built[0]
+
+    get.__name__ = factory.__name__
+    get.__doc__ = factory.__doc__
+    return get
+
 
 # Book Service class
 class BookService:
-    """Service to handle book data and API interactions"""
-    
-    def __init__(self):
-        self.processed_books = self._load_processed_books()
-    
-    def _load_processed_books(self):
-        """Load previously processed books"""
-        processed_books_file = os.path.join(OUTPUT_DIR, "processed_books.json")
-        if os.path.exists(processed_books_file):
-            try:
-                with open(processed_books_file, 'r') as f:
-                    return json.load(f)
-            except Exception as e:
-                logger.error(f"Error loading processed books: {e}")
-        return {}
-    
-    def save_processed_books(self):
-        """Save processed books to file"""
-        processed_books_file = os.path.join(OUTPUT_DIR, "processed_books.json")
+    """Service to handle book data and API interactions
+
+    Upstream clients, stores and indexes are built on first use, so
+    creating the service (and importing this module) does no I/O.
+    """
+
+    _catalog = None
+    _catalog_checked_at = None
+    _catalog_lock = threading.Lock()
+
+    @lazy_property
+    def upstreams(self):
+        return create_upstreams()
+
+    @lazy_property
+    def processed_books(self):
+        return open_store(
+            os.path.join(DATA_DIR, "processed_books.sqlite3"),
+            legacy_json=os.path.join(OUTPUT_DIR, "processed_books.json")
+        )
+
+    @lazy_property
+    def session(self):
+        upstreams = self.upstreams
+        return ResilientSession({
+            urlsplit(GOOGLE_BOOKS_API_URL).netloc: upstreams['googleBooks'],
+            urlsplit(OPEN_LIBRARY_URL).netloc: upstreams['openLibrary'],
+            'covers.openlibrary.org': upstreams['openLibrary'],
+            'books.google.com': upstreams['googleBooks']
+        }, default=upstreams['openLibrary'])
+
+    @lazy_property
+    def response_cache(self):
+        return ResponseCache(os.path.join(CACHE_DIR, "responses.sqlite3"))
+
+    @lazy_property
+    def search_engine(self):
+        return SearchEngine([
+            ('googleBooks', self._search_google_books),
+            ('openLibrary', self._search_open_library)
+        ], deadline=SEARCH_DEADLINE)
+
+    @lazy_property
+    def summary_index(self):
+        return SummaryIndex(OUTPUT_DIR, SUPPORTED_LANGUAGES, self.processed_books)
+
+    @lazy_property
+    def summary_search(self):
+        summary_search = SummarySearch(os.path.join(CACHE_DIR, "summary_search.sqlite3"),
+                                       OUTPUT_DIR, SUPPORTED_LANGUAGES)
+        summary_search.start_sync()
+        return summary_search
+
+    @lazy_property
+    def moderation(self):
+        from moderation import ModerationQueue
+        moderation = ModerationQueue(os.path.join(DATA_DIR, "moderation.sqlite3"),
+                                     OUTPUT_DIR, SUPPORTED_LANGUAGES)
+        moderation.start_sync()
+        return moderation
+
+    @lazy_property
+    def author_resolver(self):
+        return AuthorResolver(
+            self.session,
+            base_url=OPEN_LIBRARY_URL,
+            persist_path=os.path.join(CACHE_DIR, "authors.sqlite3"),
+            legacy_json=os.path.join(CACHE_DIR, "authors.json")
+        )
+
+    @property
+    def catalog(self):
+        """The local Open Library catalog, or None until one has been imported
+
+        A missing database is looked for again every CATALOG_CHECK_INTERVAL seconds.
+        """
+        if self._catalog is None:
+            now = time.monotonic()
+            with self._catalog_lock:
+                if self._catalog is None and (self._catalog_checked_at is None
+                                              or now - self._catalog_checked_at >= CATALOG_CHECK_INTERVAL):
+                    self._catalog_checked_at = now
+                    if os.path.exists(CATALOG_DB):
+                        self._catalog = Catalog(CATALOG_DB)
+        return self._catalog
+
+    @lazy_property
+    def covers(self):
+        from covers import CoverStore
+        return CoverStore(
+            os.path.join(CACHE_DIR, "covers"),
+            lambda url: self.session.get(url, site='cover'),
+            COVER_HOSTS,
+            max_bytes=COVER_CACHE_MAX_BYTES,
+            cache_control=COVER_CACHE_CONTROL
+        )
+
+    @lazy_property
+    def related_engine(self):
+        """The related-books index, kept in sync in the background, or None without numpy"""
+        related_engine = open_related_engine()
+        if related_engine is not None:
+            related_engine.start_sync()
+        return related_engine
+
+    def load_snapshot(self, path):
+        """Restore the summary index from a snapshot file; returns False if it could not be used"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring summary index snapshot {path}: {e}")
+            return False
+        summary_index = SummaryIndex(OUTPUT_DIR, SUPPORTED_LANGUAGES, self.processed_books, snapshot=snapshot)
+        self.__dict__['summary_index'] = summary_index
+        return summary_index.restored
+
+    def search(self, query, max_results=10):
+        """Search our own summaries, then every provider concurrently under the search deadline
+
+        Summaries whose title or author match come first. When they alone
+        fill the page the upstreams are not queried at all.
+        """
+        local_books = self.search_summaries(query, max_results)
+        if len(local_books) >= max_results:
+            return {"results": local_books, "sources": {"summaries": "ok"}, "partial": False, "elapsedMs": 0}
+        return self.merge_search(local_books, self.search_engine.search(query, max_results))
+
+    def search_summaries(self, query, max_results=10):
+        """Our own summaries whose title or author match, one entry per book"""
+        try:
+            hits = self.summary_search.search(query, limit=max_results, columns=('title', 'author'))['results']
+        except Exception as e:
+            logger.error(f"Error searching local summaries: {e}")
+            hits = []
+        # One entry per book, whichever of its languages ranked best
+        hits = list({hit['slug']: hit for hit in reversed(hits)}.values())[::-1]
+        books = []
+        for hit in hits:
+            book_id = self.book_id_for_slug(hit['slug'])
+            books.append({
+                'source': book_source(book_id) if book_id else 'Book Summaries',
+                'id': book_id or hit['slug'],
+                'slug': hit['slug'],
+                'title': hit['title'],
+                'authors': [author.strip() for author in hit['author'].split(',') if author.strip()],
+                'description': hit['description'],
+                'language': hit['language'],
+                'hasSummary': True
+            })
+        return books
+
+    def book_id_for_slug(self, slug):
+        """The Google Books or Open Library id a summary was generated for, or None"""
         try:
-            with open(processed_books_file, 'w') as f:
-                json.dump(self.processed_books, f)
-            logger.info(f"Saved {len(self.processed_books)} processed books")
+            for book_id, _ in self.processed_books.find_by_slug(slug):
+                return book_id
         except Exception as e:
-            logger.error(f"Error saving processed books: {e}")
+            logger.error(f"Error looking up the book id of {slug}: {e}")
+        return None
+
+    @staticmethod
+    def merge_search(local_books, search):
+        """Put local summaries ahead of the upstream results, dropping upstream copies of them"""
+        known_titles = {make_slug(book['title']) for book in local_books}
+        search['results'] = local_books + [
+            book for book in search['results'] if make_slug(book.get('title', '')) not in known_titles
+        ]
+        search['sources'] = dict({"summaries": "ok"}, **search['sources'])
+        return search
     
     def search_google_books(self, query, max_results=10):
         """Search for books using Google Books API"""
         try:
-            url = f"https://www.googleapis.com/books/v1/volumes?q={query}&maxResults={max_results}&key={GOOGLE_BOOKS_API_KEY}"
-            response = requests.get(url)
-            if response.status_code != 200:
-                logger.warning(f"Google Books API returned {response.status_code}")
-                return []
-            
-            data = response.json()
-            if 'items' not in data:
-                return []
-                
-            books = []
-            for item in data['items']:
-                volume_info = item.get('volumeInfo', {})
-                if not volume_info.get('title'):
-                    continue
-                book = {
-                    'source': 'Google Books',
-                    'id': item.get('id'),
-                    'title': volume_info.get('title', 'Unknown'),
-                    'authors': volume_info.get('authors', ['Unknown']),
-                    'publishedDate': volume_info.get('publishedDate', ''),
-                    'description': volume_info.get('description', ''),
-                    'pageCount': volume_info.get('pageCount'),
-                    'categories': volume_info.get('categories', []),
-                    'averageRating': volume_info.get('averageRating'),
-                    'ratingsCount': volume_info.get('ratingsCount', 0),
-                    'language': volume_info.get('language', 'en'),
-                    'thumbnailUrl': volume_info.get('imageLinks', {}).get('thumbnail', '')
-                }
-                books.append(book)
-            return books
+            return self._search_google_books(query, max_results)
         except Exception as e:
             logger.error(f"Error searching Google Books: {e}")
             return []
     
+    @cached_response('search_google_books')
+    def _search_google_books(self, query, max_results=10):
+        """Search Google Books, raising on upstream failure"""
+        url = f"{GOOGLE_BOOKS_API_URL}/volumes?q={query}&maxResults={max_results}&key={GOOGLE_BOOKS_API_KEY}"
+        response = self.session.get(url, site='search_google_books')
+        if response.status_code != 200:
+            logger.warning(f"Google Books API returned {response.status_code}")
+            response.raise_for_status()
+            return []
+        
+        data = response.json()
+        if 'items' not in data:
+            return []
+            
+        return self.parse_google_books_search(data)
+
+    @staticmethod
+    def parse_google_books_search(data):
+        """Books from a Google Books /volumes search response"""
+        books = []
+        for item in data.get('items', []):
+            volume_info = item.get('volumeInfo', {})
+            if not volume_info.get('title'):
+                continue
+            book = {
+                'source': 'Google Books',
+                'id': item.get('id'),
+                'title': volume_info.get('title', 'Unknown'),
+                'authors': volume_info.get('authors', ['Unknown']),
+                'publishedDate': volume_info.get('publishedDate', ''),
+                'description': volume_info.get('description', ''),
+                'pageCount': volume_info.get('pageCount'),
+                'categories': volume_info.get('categories', []),
+                'averageRating': volume_info.get('averageRating'),
+                'ratingsCount': volume_info.get('ratingsCount', 0),
+                'language': volume_info.get('language', 'en'),
+                'thumbnailUrl': volume_info.get('imageLinks', {}).get('thumbnail', '')
+            }
+            books.append(book)
+        return books
+    
     def search_open_library(self, query, max_results=10):
         """Search for books using Open Library Search API"""
         try:
-            url = f"https://openlibrary.org/search.json?q={query}&limit={max_results}"
-            response = requests.get(url)
-            if response.status_code != 200:
-                logger.warning(f"Open Library API returned {response.status_code}")
-                return []
-            
-            data = response.json()
-            if 'docs' not in data:
-                return []
-                
-            books = []
-            for doc in data['docs']:
-                cover_url = ''
-                if doc.get('cover_i'):
-                    cover_url = f"https://covers.openlibrary.org/b/id/{doc['cover_i']}-M.jpg"
-                work_id = None
-                if doc.get('key'):
-                    if doc.get('key').startswith('/works/'):
-                        work_id = doc.get('key').split('/')[-1]
-                book = {
-                    'source': 'Open Library',
-                    'id': doc.get('key', '').split('/')[-1] if doc.get('key') else '',
-                    'work_id': work_id,
-                    'title': doc.get('title', 'Unknown'),
-                    'authors': doc.get('author_name', ['Unknown']),
-                    'publishedDate': str(doc.get('first_publish_year', '')),
-                    'description': '',
-                    'pageCount': doc.get('number_of_pages_median'),
-                    'categories': doc.get('subject', []),
-                    'thumbnailUrl': cover_url
-                }
-                books.append(book)
-            return books
+            return self._search_open_library(query, max_results)
         except Exception as e:
             logger.error(f"Error searching Open Library: {e}")
             return []
     
+    def _search_open_library(self, query, max_results=10):
+        """Search the local catalog, then Open Library, raising on upstream failure"""
+        books = self.search_catalog(query, max_results)
+        if books:
+            return books
+        return self._fetch_open_library_search(query, max_results)
+
+    def search_catalog(self, query, max_results=10):
+        """Books from the local catalog in the shape of an Open Library search; [] without a catalog"""
+        if self.catalog is None:
+            return []
+        try:
+            return self.parse_open_library_search({'docs': self.catalog.search(query, max_results)})
+        except Exception as e:
+            logger.error(f"Error searching the local catalog: {e}")
+            return []
+
+    @cached_response('search_open_library')
+    def _fetch_open_library_search(self, query, max_results=10):
+        """Search the Open Library API, raising on upstream failure"""
+        url = f"{OPEN_LIBRARY_URL}/search.json?q={query}&limit={max_results}"
+        response = self.session.get(url, site='search_open_library')
+        if response.status_code != 200:
+            logger.warning(f"Open Library API returned {response.status_code}")
+            response.raise_for_status()
+            return []
+        
+        data = response.json()
+        if 'docs' not in data:
+            return []
+            
+        return self.parse_open_library_search(data)
+
+    @staticmethod
+    def parse_open_library_search(data):
+        """Books from an Open Library search.json response"""
+        books = []
+        for doc in data.get('docs', []):
+            cover_url = ''
+            if doc.get('cover_i'):
+                cover_url = f"https://covers.openlibrary.org/b/id/{doc['cover_i']}-M.jpg"
+            work_id = None
+            if doc.get('key'):
+                if doc.get('key').startswith('/works/'):
+                    work_id = doc.get('key').split('/')[-1]
+            book = {
+                'source': 'Open Library',
+                'id': doc.get('key', '').split('/')[-1] if doc.get('key') else '',
+                'work_id': work_id,
+                'title': doc.get('title', 'Unknown'),
+                'authors': doc.get('author_name', ['Unknown']),
+                'publishedDate': str(doc.get('first_publish_year', '')),
+                'description': '',
+                'pageCount': doc.get('number_of_pages_median'),
+                'categories': doc.get('subject', []),
+                'thumbnailUrl': cover_url
+            }
+            books.append(book)
+        return books
+    
     def get_book_details_open_library(self, book_id, is_work=True):
-        """Get detailed book information from Open Library"""
+        """Get detailed book information from the local catalog, or else from Open Library"""
+        book_details = self.catalog_details(book_id, is_work)
+        if book_details is not None:
+            return book_details
+        return self._fetch_book_details_open_library(book_id, is_work)
+
+    def catalog_details(self, book_id, is_work=True):
+        """Book details of a work or edition in the local catalog, or None"""
+        if self.catalog is None:
+            return None
+        try:
+            record = self.catalog.get_work(book_id) if is_work else self.catalog.get_edition(book_id)
+        except Exception as e:
+            logger.error(f"Error reading {book_id} from the local catalog: {e}")
+            return None
+        if record is None:
+            return None
+        data, authors = record
+        return self.parse_open_library_details(data, book_id, is_work, authors)
+
+    @cached_response('book_details_open_library')
+    def _fetch_book_details_open_library(self, book_id, is_work=True):
+        """Get detailed book information from the Open Library API"""
         try:
             if is_work:
-                url = f"https://openlibrary.org/works/{book_id}.json"
+                url = f"{OPEN_LIBRARY_URL}/works/{book_id}.json"
             else:
-                url = f"https://openlibrary.org/books/{book_id}.json"
-            response = requests.get(url)
+                url = f"{OPEN_LIBRARY_URL}/books/{book_id}.json"
+            response = self.session.get(url, site='book_details_open_library')
             if response.status_code != 200:
                 logger.warning(f"Open Library API returned {response.status_code} for {url}")
                 return None
             data = response.json()
-            cover_url = ''
-            if data.get('covers', []):
-                cover_id = data['covers'][0]
-                cover_url = f"https://covers.openlibrary.org/b/id/{cover_id}-M.jpg"
-            authors = []
-            if 'authors' in data:
-                for author_ref in data['authors']:
-                    if isinstance(author_ref, dict) and 'author' in author_ref:
-                        author_key = author_ref['author']['key'].split('/')[-1]
-                        try:
-                            author_response = requests.get(f"https://openlibrary.org/authors/{author_key}.json")
-                            if author_response.status_code == 200:
-                                author_data = author_response.json()
-                                authors.append(author_data.get('name', 'Unknown'))
-                        except:
-                            authors.append('Unknown')
-                    elif isinstance(author_ref, dict) and 'key' in author_ref:
-                        author_key = author_ref['key'].split('/')[-1]
-                        try:
-                            author_response = requests.get(f"https://openlibrary.org/authors/{author_key}.json")
-                            if author_response.status_code == 200:
-                                author_data = author_response.json()
-                                authors.append(author_data.get('name', 'Unknown'))
-                        except:
-                            authors.append('Unknown')
-            description = ""
-            if 'description' in data:
-                if isinstance(data['description'], str):
-                    description = data['description']
-                elif isinstance(data['description'], dict) and 'value' in data['description']:
-                    description = data['description']['value']
-            book_details = {
-                'source': 'Open Library',
-                'id': book_id,
-                'title': data.get('title', 'Unknown'),
-                'subtitle': data.get('subtitle', ''),
-                'authors': authors,
-                'description': description,
-                'subjects': data.get('subjects', []),
-                'thumbnailUrl': cover_url
-            }
-            if not is_work:
-                book_details.update({
-                    'isbn_10': data.get('isbn_10', []),
-                    'isbn_13': data.get('isbn_13', []),
-                    'publish_date': data.get('publish_date', ''),
-                    'publishers': data.get('publishers', []),
-                    'number_of_pages': data.get('number_of_pages'),
-                    'physical_format': data.get('physical_format', '')
-                })
-            return book_details
+            authors = self.author_resolver.resolve(data.get('authors', []))
+            return self.parse_open_library_details(data, book_id, is_work, authors)
         except Exception as e:
             logger.error(f"Error getting Open Library details for {book_id}: {e}")
             return None
     
+    @staticmethod
+    def parse_open_library_details(data, book_id, is_work, authors):
+        """Book details from an Open Library work or edition, with resolved author names"""
+        cover_url = ''
+        if data.get('covers', []):
+            cover_id = data['covers'][0]
+            cover_url = f"https://covers.openlibrary.org/b/id/{cover_id}-M.jpg"
+        description = ""
+        if 'description' in data:
+            if isinstance(data['description'], str):
+                description = data['description']
+            elif isinstance(data['description'], dict) and 'value' in data['description']:
+                description = data['description']['value']
+        book_details = {
+            'source': 'Open Library',
+            'id': book_id,
+            'title': data.get('title', 'Unknown'),
+            'subtitle': data.get('subtitle', ''),
+            'authors': authors,
+            'description': description,
+            'subjects': data.get('subjects', []),
+            'thumbnailUrl': cover_url
+        }
+        if not is_work:
+            book_details.update({
+                'isbn_10': data.get('isbn_10', []),
+                'isbn_13': data.get('isbn_13', []),
+                'publish_date': data.get('publish_date', ''),
+                'publishers': data.get('publishers', []),
+                'number_of_pages': data.get('number_of_pages'),
+                'physical_format': data.get('physical_format', '')
+            })
+        return book_details
+    
+    @cached_response('book_details_google')
     def get_book_details_google(self, book_id):
         """Get detailed book information from Google Books"""
         try:
-            url = f"https://www.googleapis.com/books/v1/volumes/{book_id}?key={GOOGLE_BOOKS_API_KEY}"
-            response = requests.get(url)
+            url = f"{GOOGLE_BOOKS_API_URL}/volumes/{book_id}?key={GOOGLE_BOOKS_API_KEY}"
+            response = self.session.get(url, site='book_details_google')
             if response.status_code != 200:
                 logger.warning(f"Google Books API returned {response.status_code} for {url}")
                 return None
-            data = response.json()
-            volume_info = data.get('volumeInfo', {})
-            book_details = {
-                'source': 'Google Books',
-                'id': book_id,
-                'title': volume_info.get('title', 'Unknown'),
-                'subtitle': volume_info.get('subtitle', ''),
-                'authors': volume_info.get('authors', ['Unknown']),
-                'publishedDate': volume_info.get('publishedDate', 'Unknown'),
-                'description': volume_info.get('description', ''),
-                'pageCount': volume_info.get('pageCount'),
-                'categories': volume_info.get('categories', []),
-                'averageRating': volume_info.get('averageRating'),
-                'ratingsCount': volume_info.get('ratingsCount', 0),
-                'language': volume_info.get('language', ''),
-                'thumbnailUrl': volume_info.get('imageLinks', {}).get('thumbnail', '')
-            }
-            return book_details
+            return self.parse_google_books_details(response.json(), book_id)
         except Exception as e:
             logger.error(f"Error getting Google Books details for {book_id}: {e}")
             return None
     
+    @staticmethod
+    def parse_google_books_details(data, book_id):
+        """Book details from a Google Books volume"""
+        volume_info = data.get('volumeInfo', {})
+        book_details = {
+            'source': 'Google Books',
+            'id': book_id,
+            'title': volume_info.get('title', 'Unknown'),
+            'subtitle': volume_info.get('subtitle', ''),
+            'authors': volume_info.get('authors', ['Unknown']),
+            'publishedDate': volume_info.get('publishedDate', 'Unknown'),
+            'description': volume_info.get('description', ''),
+            'pageCount': volume_info.get('pageCount'),
+            'categories': volume_info.get('categories', []),
+            'averageRating': volume_info.get('averageRating'),
+            'ratingsCount': volume_info.get('ratingsCount', 0),
+            'language': volume_info.get('language', ''),
+            'thumbnailUrl': volume_info.get('imageLinks', {}).get('thumbnail', '')
+        }
+        return book_details
+    
+    @staticmethod
+    def get_book_details_summary(slug):
+        """Book details from the front matter of one of our summaries with no upstream book id"""
+        try:
+            with open(summary_filename(make_slug(slug)), 'r', encoding='utf-8') as f:
+                meta, _ = parse_frontmatter(f.read())
+        except OSError:
+            return None
+        return {
+            'source': 'Book Summaries',
+            'id': slug,
+            'title': meta.get('title', slug),
+            'subtitle': '',
+            'authors': [author.strip() for author in meta.get('author', '').split(',') if author.strip()],
+            'description': meta.get('description', ''),
+            'subjects': [],
+            'thumbnailUrl': ''
+        }
+
     def get_book_details(self, source, book_id, is_work=True):
         """Get detailed book information from appropriate source"""
         if source == 'Google Books':
             return self.get_book_details_google(book_id)
         elif source == 'Open Library':
             return self.get_book_details_open_library(book_id, is_work)
+        elif source == 'Book Summaries':
+            return self.get_book_details_summary(book_id)
         else:
             logger.warning(f"Unknown source: {source}")
             return None
-
-def get_books_by_category(self, category_code, page=1, limit=12):
-    """Get books by category from Google Books API"""
-    try:
-        offset = (page - 1) * limit
-        query = f"subject:{category_code}"
-        url = f"https://www.googleapis.com/books/v1/volumes?q={query}&maxResults={limit}&startIndex={offset}&orderBy=relevance&key={GOOGLE_BOOKS_API_KEY}"
-        logger.info(f"Attempting to fetch books with URL: {url}")
-        response = requests.get(url)
-        logger.info(f"Response status code: {response.status_code}")
-        if response.status_code != 200:
-            logger.error(f"Google Books API returned {response.status_code}")
-            logger.error(f"Response content: {response.text}")
+    
+    @cached_response('books_by_category', cacheable=lambda result: bool(result and result.get('totalCount')))
+    def get_books_by_category(self, category_code, page=1, limit=12):
+        """Get books by category from Google Books API"""
+        try:
+            offset = (page - 1) * limit
+            query = f"subject:{category_code}"
+            url = f"{GOOGLE_BOOKS_API_URL}/volumes?q={query}&maxResults={limit}&startIndex={offset}&orderBy=relevance&key={GOOGLE_BOOKS_API_KEY}"
+            logger.info(f"Attempting to fetch books with URL: {url}")
+            response = self.session.get(url, site='books_by_category')
+            logger.info(f"Response status code: {response.status_code}")
+            if response.status_code != 200:
+                logger.error(f"Google Books API returned {response.status_code}")
+                logger.error(f"Response content: {response.text}")
+                return {"results": [], "hasMore": False, "totalCount": 0, "page": page}
+            data = response.json()
+            logger.info(f"Total items found: {data.get('totalItems', 0)}")
+            total_items = data.get('totalItems', 0)
+            books = []
+            if 'items' in data:
+                logger.info(f"Number of items in response: {len(data['items'])}")
+                for item in data['items']:
+                    volume_info = item.get('volumeInfo', {})
+                    if not volume_info.get('title'):
+                        continue
+                    book = {
+                        'id': item.get('id'),
+                        'title': volume_info.get('title', 'Unknown'),
+                        'authors': volume_info.get('authors', ['Unknown']),
+                        'publishedDate': volume_info.get('publishedDate', ''),
+                        'description': volume_info.get('description', ''),
+                        'pageCount': volume_info.get('pageCount'),
+                        'categories': volume_info.get('categories', []),
+                        'rating': volume_info.get('averageRating'),
+                        'ratingsCount': volume_info.get('ratingsCount', 0),
+                        'thumbnailUrl': volume_info.get('imageLinks', {}).get('thumbnail', '')
+                    }
+                    books.append(book)
+            else:
+                logger.warning("No 'items' found in the response")
+            has_more = (offset + limit) < total_items
+            logger.info(f"Returning {len(books)} books, hasMore: {has_more}")
+            return {
+                "results": books,
+                "hasMore": has_more,
+                "totalCount": total_items,
+                "page": page
+            }
+        except Exception as e:
+            logger.error(f"Error fetching books by category: {e}")
             return {"results": [], "hasMore": False, "totalCount": 0, "page": page}
-        data = response.json()
-        logger.info(f"Total items found: {data.get('totalItems', 0)}")
-        total_items = data.get('totalItems', 0)
-        books = []
-        if 'items' in data:
-            logger.info(f"Number of items in response: {len(data['items'])}")
-            for item in data['items']:
-                volume_info = item.get('volumeInfo', {})
-                if not volume_info.get('title'):
-                    continue
-                book = {
-                    'id': item.get('id'),
-                    'title': volume_info.get('title', 'Unknown'),
-                    'authors': volume_info.get('authors', ['Unknown']),
-                    'publishedDate': volume_info.get('publishedDate', ''),
-                    'description': volume_info.get('description', ''),
-                    'pageCount': volume_info.get('pageCount'),
-                    'categories': volume_info.get('categories', []),
-                    'rating': volume_info.get('averageRating'),
-                    'ratingsCount': volume_info.get('ratingsCount', 0),
-                    'thumbnailUrl': volume_info.get('imageLinks', {}).get('thumbnail', '')
-                }
-                book['hasSummary'] = book['id'] in self.processed_books
-                books.append(book)
-        else:
-            logger.warning("No 'items' found in the response")
-        has_more = (offset + limit) < total_items
-        logger.info(f"Returning {len(books)} books, hasMore: {has_more}")
-        return {
-            "results": books,
-            "hasMore": has_more,
-            "totalCount": total_items,
-            "page": page
-        }
-    except Exception as e:
-        logger.error(f"Error fetching books by category: {e}")
-        return {"results": [], "hasMore": False, "totalCount": 0, "page": page}
 
 # Initialize the book service
 book_service = BookService()
 
+
+@lazy
+def get_category_browser():
+    return CategoryBrowser(book_service.get_books_by_category,
+                           lambda book_ids: book_service.processed_books.contains_many(book_ids))
+
+
+@lazy
+def get_llm_client():
+    return LLMClient(os.path.join(CACHE_DIR, "completions"), replay=OPENAI_REPLAY,
+                     upstream=book_service.upstreams['openai'], api_key=OPENAI_API_KEY)
+
+
+@lazy
+def get_translator():
+    return Translator(get_llm_client(), TRANSLATION_MODEL)
+
+
+summary_flights = SingleFlight()
+prompt_builder = PromptBuilder(dict(
+    SUMMARY_PROFILES,
+    default=dict({'model': SUMMARY_MODEL}, **SUMMARY_PROFILES.get('default', {}))
+))
+# Summaries and constant catalogs are served pre-compressed from memory
+summary_bodies = FileBodyCache('text/html', SUMMARY_CACHE_CONTROL)
+CATALOGS = {
+    'languages': {"languages": LANGUAGES},
+    'categories': CATEGORIES
+}
+catalog_bodies = {}
+
+
+def catalog_body(name):
+    """A constant catalog, serialized and compressed on first request"""
+    body = catalog_bodies.get(name)
+    if body is None:
+        body = catalog_bodies[name] = PreparedBody(current_app.json.dumps(CATALOGS[name]) + '\n',
+                                                   'application/json', CATALOG_CACHE_CONTROL)
+    return body
+
+
+def proxied_covers(books, host_url, variant='list'):
+    """Copies of books with thumbnailUrl pointing at the cover proxy
+
+    host_url is the base URL the request came in on, unless COVER_PROXY_URL
+    is set. The books may be cached objects, so they are never modified.
+    """
+    if not COVER_PROXY:
+        return books
+    from covers import proxy_url
+    base = COVER_PROXY_URL or host_url.rstrip('/')
+    proxied = []
+    for book in books:
+        url = book.get('thumbnailUrl')
+        if url and urlsplit(url).hostname in COVER_HOSTS:
+            book = dict(book, thumbnailUrl=proxy_url(base, url, variant))
+        proxied.append(book)
+    return proxied
+
+# Metrics (exposed at /metrics)
+def cache_lookup_counts():
+    """Cumulative cache lookups keyed by (cache, outcome)"""
+    responses = book_service.response_cache.stats()
+    authors = book_service.author_resolver.cache.stats()
+    return {
+        ('responses', 'memory_hit'): responses['memory_hits'],
+        ('responses', 'disk_hit'): responses['disk_hits'],
+        ('responses', 'stale_hit'): responses['stale_hits'],
+        ('responses', 'miss'): responses['misses'],
+        ('responses', 'stale_if_error'): responses['stale_if_error'],
+        ('authors', 'hit'): authors['hits'],
+        ('authors', 'miss'): authors['misses']
+    }
+
+
+def recorded_usage_tokens():
+    """Tokens of every uncached generation in the processed-books store, keyed by (model, kind)"""
+    tokens = {}
+    for model, totals in book_service.processed_books.usage_totals().items():
+        tokens[(model or 'unknown', 'prompt')] = totals['prompt_tokens']
+        tokens[(model or 'unknown', 'completion')] = totals['completion_tokens']
+    return tokens
+
+
+def circuit_states():
+    """1 for an open breaker, 0.5 for half-open, 0 for closed"""
+    levels = {'open': 1, 'half_open': 0.5}
+    return {(name,): levels.get(client.breaker.state, 0) for name, client in book_service.upstreams.items()}
+
+
+request_latency = metrics.registry.histogram(
+    'http_request_duration_seconds', 'Time to produce a response by route',
+    labels=('route', 'method', 'status')
+)
+openai_tokens = metrics.registry.counter(
+    'openai_tokens_total', 'Tokens spent on OpenAI completions', labels=('model', 'kind')
+)
+generations_in_flight = metrics.registry.gauge(
+    'summary_generations_in_flight', 'Summary generations currently running', labels=('mode',)
+)
+metrics.registry.gauge(
+    'summary_jobs', 'Summary jobs by status', labels=('status',),
+    callback=lambda: {(status,): count for status, count in get_summary_jobs().counts().items()}
+)
+metrics.registry.counter(
+    'cache_lookups_total', 'Cache lookups by cache and outcome', labels=('cache', 'outcome'),
+    callback=cache_lookup_counts
+)
+metrics.registry.counter(
+    'summary_usage_tokens_total', 'Tokens recorded for generated summaries by every process',
+    labels=('model', 'kind'), callback=recorded_usage_tokens
+)
+metrics.registry.counter(
+    'summary_generations_total', 'Uncached summary generations recorded by every process', labels=('model',),
+    callback=lambda: {(model or 'unknown',): totals['generations']
+                      for model, totals in book_service.processed_books.usage_totals().items()}
+)
+metrics.registry.gauge(
+    'upstream_circuit_open', 'Circuit breaker state per upstream', labels=('upstream',),
+    callback=circuit_states
+)
+
+
+api = Blueprint('api', __name__)
+
+
+@api.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@api.after_app_request
+def observe_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # Streamed responses are timed to their first byte
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        request_latency.observe(time.perf_counter() - started, route=route,
+                                method=request.method, status=response.status_code)
+    return response
+
+
+def prepare_summary(title, authors, language='english', description='', tier=None):
+    """Build the prompt for a summary within its profile's token budget
+
+    Returns a dict with the chat 'messages', the generation 'profile', the
+    compacted 'description', the completion cache 'key' and the 'options'
+    to pass to the completion call.
+    """
+    messages, profile, description = prompt_builder.build(title, authors, language, description, tier)
+    author_text = authors if isinstance(authors, str) else ', '.join(authors)
+    key_fields = dict(model=profile['model'], title=title, authors=author_text,
+                      language=language, description=description)
+    options = {'temperature': profile['temperature']}
+    if profile.get('max_tokens'):
+        key_fields['max_tokens'] = options['max_tokens'] = profile['max_tokens']
+    return {
+        'messages': messages,
+        'profile': profile,
+        'description': description,
+        'key': prompt_hash(**key_fields),
+        'options': options
+    }
+
+
+def write_summary(title, authors, language, description, slug, gpt_summary, model=None, usage=None, key=None):
+    """Format a completion and write it to OUTPUT_DIR, keeping the raw completion for re-rendering"""
+    author_text = authors if isinstance(authors, str) else ', '.join(authors)
+    record = {
+        'title': title,
+        'authors': author_text,
+        'description': description or '',
+        'language': language,
+        'slug': slug,
+        'raw': gpt_summary,
+        'model': model,
+        'usage': usage,
+        'promptKey': key,
+        'pubDate': datetime.now().strftime('%Y-%m-%d'),
+        'generatedAt': datetime.now().isoformat()
+    }
+    from rerender import raw_path, save_raw, render_record
+    related_books = suggest_related_books(title, author_text, description, gpt_summary)
+    formatted_summary, record['rendered'] = render_record(record, related_books)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    filename = summary_filename(slug, language)
+    try:
+        save_raw(raw_path(RAW_DIR, filename), record)
+    except OSError as e:
+        logger.error(f"Error saving raw completion for {slug}: {e}")
+    write_file_atomic(filename, formatted_summary)
+    summary_bodies.put(filename, formatted_summary)
+    book_service.summary_index.record(slug, language)
+    book_service.summary_search.index_file(filename)
+    if book_service.related_engine is not None:
+        book_service.related_engine.add_file(filename)
+    return formatted_summary
+
+
+@contextmanager
+def generation_in_flight(mode):
+    """Count a running generation in summary_generations_in_flight"""
+    generations_in_flight.inc(mode=mode)
+    try:
+        yield
+    finally:
+        generations_in_flight.dec(mode=mode)
+
+
+def summary_flight_key(prepared, slug):
+    """Single-flight key: concurrent requests for one prompt and slug share a generation"""
+    return f"{prepared['key']}:{slug}"
+
+
+def store_completion(title, authors, language, slug, prepared, completion):
+    """Write a finished completion and record its token usage
+
+    Every generation path ends here; only the completion call differs.
+    Returns the result dict of generate_summary_result().
+    """
+    model = prepared['profile']['model']
+    summary = write_summary(title, authors, language, prepared['description'], slug, completion['content'],
+                            model, completion['usage'], prepared['key'])
+    # A replayed cached completion cost nothing
+    if not completion['cached']:
+        record_usage(slug, language, model, completion['usage'], False)
+    return {
+        'summary': summary,
+        'slug': slug,
+        'model': model,
+        'usage': completion['usage'],
+        'cached': completion['cached']
+    }
+
+
+def record_usage(slug, language, model, usage, cached):
+    """Log the token usage of a generated summary"""
+    openai_tokens.inc(usage.get('prompt_tokens', 0), model=model, kind='prompt')
+    openai_tokens.inc(usage.get('completion_tokens', 0), model=model, kind='completion')
+    try:
+        book_service.processed_books.record_usage(slug, language, model, usage, cached)
+    except Exception as e:
+        logger.error(f"Error recording token usage for {slug}: {e}")
+
+
+def record_processed_book(book_id, title, authors, slug, model=None, usage=None):
+    """Remember that a book has a generated summary"""
+    if not book_id:
+        return
+    book_service.summary_index.record_book(book_id, slug)
+    entry = {
+        'title': title,
+        'author': authors if isinstance(authors, str) else ', '.join(authors),
+        'slug': slug,
+        'date_processed': datetime.now().isoformat()
+    }
+    if model:
+        entry['model'] = model
+    if usage:
+        entry['usage'] = usage
+    try:
+        book_service.processed_books.upsert(book_id, entry)
+    except Exception as e:
+        logger.error(f"Error saving processed book {book_id}: {e}")
+
+
+def generate_summary_result(title, authors, language='english', description='', slug=None, book_id=None, tier=None):
+    """Generate, format and store a summary
+
+    Returns a dict with the formatted 'summary', its 'slug', the 'model',
+    the completion 'usage' and whether the completion came from the cache.
+    Concurrent requests for the same prompt and slug share one generation
+    and one file write.
+    """
+    prepared = prepare_summary(title, authors, language, description, tier)
+    model = prepared['profile']['model']
+    if not slug:
+        slug = make_slug(title)
+
+    def generate():
+        with generation_in_flight('sync'):
+            completion = get_llm_client().complete(
+                model,
+                prepared['messages'],
+                key=prepared['key'],
+                **prepared['options']
+            )
+        return store_completion(title, authors, language, slug, prepared, completion)
+
+    result = summary_flights.do(summary_flight_key(prepared, slug), generate)
+    record_processed_book(book_id, title, authors, slug, model, result['usage'])
+    return result
+
+
+def generate_book_summary(title, authors, language='english', description='', slug=None, book_id=None, tier=None):
+    """Generate, format and store a summary, returning the formatted markdown"""
+    return generate_summary_result(title, authors, language, description, slug, book_id, tier)['summary']
+
+
+def run_summary_job(params):
+    """Job handler for queued summary generations"""
+    return generate_book_summary(
+        params['title'],
+        params.get('authors', 'Unknown'),
+        params.get('language', 'english'),
+        params.get('description', ''),
+        slug=params.get('slug'),
+        book_id=params.get('bookId'),
+        tier=params.get('tier')
+    )
+
+@lazy
+def get_summary_jobs():
+    """The summary job queue; unfinished jobs resume when it is created"""
+    return JobQueue(
+        os.path.join(CACHE_DIR, "jobs.sqlite3"),
+        run_summary_job,
+        max_workers=SUMMARY_WORKERS,
+        max_pending=SUMMARY_MAX_PENDING,
+        lease=SUMMARY_JOB_LEASE
+    )
+
+
+def enqueue_summary(title, authors, language='english', description='', slug=None, book_id=None, tier=None):
+    """Queue a summary generation and return the 202 Accepted response"""
+    slug = slug or make_slug(title)
+    params = {
+        'title': title,
+        'authors': authors,
+        'language': language,
+        'description': description,
+        'slug': slug,
+        'bookId': book_id,
+        'tier': tier
+    }
+    dedupe_key = prompt_hash(title=title, authors=authors, language=language,
+                             description=description, slug=slug, tier=tier)
+    summary_jobs = get_summary_jobs()
+    try:
+        job_id = summary_jobs.submit(params, dedupe_key=dedupe_key)
+    except QueueFull as e:
+        return jsonify({"error": f"Summary queue is full: {e}"}), 503
+    return jsonify({
+        "jobId": job_id,
+        "status": summary_jobs.get(job_id)['status'],
+        "statusUrl": f"/api/jobs/{job_id}",
+        "resultUrl": f"/api/jobs/{job_id}/result"
+    }), 202
+
 # API Endpoints
 
-@app.route('/api/book/search', methods=['GET'])
+@api.route('/api/book/search', methods=['GET'])
 def search_books_api():
     """Search for books using both Google Books and Open Library APIs"""
     query = request.args.get('query', '')
     max_results = int(request.args.get('limit', 10))
     if not query:
         return jsonify({"error": "No search query provided"}), 400
-    google_books = book_service.search_google_books(query, max_results // 2)
-    open_library_books = book_service.search_open_library(query, max_results // 2)
-    results = google_books + open_library_books
+    search = book_service.search(query, max_results)
     return jsonify({
         "query": query,
-        "results": results
+        "results": proxied_covers(search["results"], request.url_root),
+        "sources": search["sources"],
+        "partial": search["partial"]
     })
 
-@app.route('/api/book/details', methods=['GET'])
+@api.route('/api/summaries/search', methods=['GET'])
+def search_summaries_api():
+    """Full-text search over the generated summaries"""
+    query = request.args.get('q') or request.args.get('query', '')
+    if not query:
+        return jsonify({"error": "No search query provided"}), 400
+    page = int(request.args.get('page', 1))
+    limit = min(int(request.args.get('limit', 10)), 50)
+    result = book_service.summary_search.search(query, language=request.args.get('language'),
+                                                page=page, limit=limit)
+    return jsonify(dict(result, query=query))
+
+@api.route('/api/book/details', methods=['GET'])
 def get_book_details_api():
     """Get detailed information about a specific book"""
     book_id = request.args.get('id')
@@ -427,11 +1186,16 @@ def get_book_details_api():
     book_details = book_service.get_book_details(source, book_id, is_work)
     if book_details is None:
         return jsonify({"error": "Book not found"}), 404
-    return jsonify(book_details)
+    return jsonify(proxied_covers([book_details], request.url_root, 'detail')[0])
 
-@app.route('/api/book/summary', methods=['GET'])
+@api.route('/api/book/summary', methods=['GET'])
 def get_book_summary_api():
-    """Generate a summary for a book using GPT-3.5"""
+    """Generate a summary for a book using GPT-3.5
+
+    A missing summary is generated within the request, as the site's
+    summary page expects the markdown in the response; pass async=true to
+    get a 202 and a job to poll instead.
+    """
     title = request.args.get('title')
     authors = request.args.get('authors', 'Unknown')
     language = request.args.get('language', 'english')
@@ -440,68 +1204,125 @@ def get_book_summary_api():
         return jsonify({"error": "Book title or slug is required"}), 400
     if slug:
         try:
-            filename = f"{OUTPUT_DIR}/{slug}.md"
-            if language != "english":
-                filename = f"{OUTPUT_DIR}/{slug}-{language}.md"
-            if os.path.exists(filename):
-                with open(filename, 'r', encoding='utf-8') as f:
-                    return f.read()
+            if book_service.summary_index.has(slug, language):
+                return summary_bodies.get(summary_filename(slug, language)).send(request)
+        except FileNotFoundError:
+            book_service.summary_index.forget(slug, language)
         except Exception as e:
             logger.error(f"Error reading existing summary: {e}")
     if isinstance(authors, str) and ',' in authors:
         authors = [author.strip() for author in authors.split(',')]
     description = request.args.get('description', '')
+    tier = request.args.get('tier')
+    if request.args.get('async', 'false').lower() == 'true':
+        return enqueue_summary(title, authors, language, description,
+                               slug=slug, book_id=request.args.get('bookId'), tier=tier)
     try:
-        prompt = f"""
-You are a professional book summarizer. Create a comprehensive summary of "{title}" by {', '.join(authors) if isinstance(authors, list) else authors}.
-
-Generate the summary in these clear sections:
-## Short Summary (1–2 sentences introducing the book)
-## Detailed Summary (4–6 paragraphs exploring the book's content)
-## Key Takeaways (5–10 bullet points of core insights)
-
-The summary should be in {language}, focusing on the book's core message, key themes, and most important insights.
-"""
-        if description:
-            prompt += f"\n\nBook Description: {description}"
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are an expert book summarizer who creates engaging, insightful summaries."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7
+        result = generate_summary_result(
+            title, authors, language, description,
+            slug=slug, book_id=request.args.get('bookId'), tier=tier
         )
-        gpt_summary = response.choices[0].message.content
-        if not slug:
-            slug = ''.join(c if c.isalnum() or c.isspace() else '-' for c in title.lower())
-            slug = '-'.join(slug.split())
-            while '--' in slug:
-                slug = slug.replace('--', '-')
-            if len(slug) > 100:
-                slug = slug[:100]
-        formatted_summary = format_summary(title, authors, description, gpt_summary, language)
-        os.makedirs(OUTPUT_DIR, exist_ok=True)
-        filename = f"{OUTPUT_DIR}/{slug}.md"
-        if language != "english":
-            filename = f"{OUTPUT_DIR}/{slug}-{language}.md"
-        with open(filename, 'w', encoding='utf-8') as f:
-            f.write(formatted_summary)
-        book_id = request.args.get('bookId')
-        if book_id:
-            book_service.processed_books[book_id] = {
-                'title': title,
-                'author': authors if isinstance(authors, str) else ', '.join(authors),
-                'slug': slug,
-                'date_processed': datetime.now().isoformat()
-            }
-            book_service.save_processed_books()
-        return formatted_summary
+        return summary_bodies.get(summary_filename(result['slug'], language)).send(request)
     except Exception as e:
         logger.error(f"Error generating summary: {e}")
         return jsonify({"error": f"Failed to generate summary: {str(e)}"}), 500
 
-@app.route('/api/translate', methods=['POST'])
+@api.route('/api/book/summary/stream', methods=['GET'])
+def stream_book_summary_api():
+    """Stream a summary as Server-Sent Events while it is generated
+
+    Emits 'token' events for raw deltas, a 'section' event as each '## '
+    section completes, and a final 'done' event carrying the formatted
+    markdown once it has been written to OUTPUT_DIR.
+    """
+    title = request.args.get('title')
+    if not title:
+        return jsonify({"error": "Book title is required"}), 400
+    authors = request.args.get('authors', 'Unknown')
+    if isinstance(authors, str) and ',' in authors:
+        authors = [author.strip() for author in authors.split(',')]
+    language = request.args.get('language', 'english')
+    description = request.args.get('description', '')
+    slug = request.args.get('slug') or make_slug(title)
+    book_id = request.args.get('bookId')
+    prepared = prepare_summary(title, authors, language, description, request.args.get('tier'))
+    model = prepared['profile']['model']
+
+    def events():
+        if book_service.summary_index.has(slug, language):
+            with open(summary_filename(slug, language), 'r', encoding='utf-8') as f:
+                yield sse_event('done', {"slug": slug, "language": language, "summary": f.read()})
+            return
+        splitter = SectionSplitter()
+        try:
+            with generation_in_flight('stream'):
+                stream = get_llm_client().stream(
+                    model,
+                    prepared['messages'],
+                    key=prepared['key'],
+                    **prepared['options']
+                )
+                for delta in stream:
+                    yield sse_event('token', {"text": delta})
+                    for section in splitter.feed(delta):
+                        yield sse_event('section', section)
+                for section in splitter.flush():
+                    yield sse_event('section', section)
+                result = store_completion(title, authors, language, slug, prepared, stream.completion)
+            record_processed_book(book_id, title, authors, slug, model, result['usage'])
+            yield sse_event('done', {"slug": slug, "language": language, "summary": result['summary']})
+        except Exception as e:
+            logger.error(f"Error streaming summary: {e}")
+            yield sse_event('error', {"error": f"Failed to generate summary: {str(e)}"})
+
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@api.route('/api/book/summary/jobs', methods=['POST'])
+def submit_summary_job_api():
+    """Queue a summary generation and return a job id straight away"""
+    data = request.get_json(silent=True) or request.args
+    title = data.get('title')
+    if not title:
+        return jsonify({"error": "Book title is required"}), 400
+    authors = data.get('authors', 'Unknown')
+    if isinstance(authors, str) and ',' in authors:
+        authors = [author.strip() for author in authors.split(',')]
+    language = data.get('language', 'english')
+    slug = data.get('slug') or make_slug(title)
+    if book_service.summary_index.has(slug, language):
+        return jsonify({
+            "status": "done",
+            "summaryUrl": f"/api/book/summary?slug={slug}&language={language}"
+        })
+    return enqueue_summary(title, authors, language, data.get('description', ''),
+                           slug=slug, book_id=data.get('bookId'), tier=data.get('tier'))
+
+@api.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job_status_api(job_id):
+    """Get the status of a queued summary job"""
+    job = get_summary_jobs().get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    job['resultUrl'] = f"/api/jobs/{job_id}/result"
+    return jsonify(job)
+
+@api.route('/api/jobs/<job_id>/result', methods=['GET'])
+def get_job_result_api(job_id):
+    """Get the generated summary of a finished job"""
+    job = get_summary_jobs().get(job_id, with_result=True)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if job['status'] == 'failed':
+        return jsonify({"error": f"Failed to generate summary: {job['error']}"}), 500
+    if job['status'] != 'done':
+        return jsonify({"jobId": job_id, "status": job['status']}), 202
+    return job['result']
+
+@api.route('/api/translate', methods=['POST'])
 def translate_text_api():
     """Translate text using GPT-3.5"""
     data = request.json
@@ -512,16 +1333,7 @@ def translate_text_api():
     if not text:
         return jsonify({"error": "No text provided"}), 400
     try:
-        prompt = f"Translate the following text to {target_language}:\n\n{text}"
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a professional translator."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3
-        )
-        translated_text = response.choices[0].message.content
+        translated_text = get_translator().translate(text, target_language)
         return jsonify({
             "original": text,
             "translated": translated_text,
@@ -531,85 +1343,17 @@ def translate_text_api():
         logger.error(f"Error translating text: {e}")
         return jsonify({"error": f"Translation failed: {str(e)}"}), 500
 
-@app.route('/api/languages', methods=['GET'])
+@api.route('/api/languages', methods=['GET'])
 def get_languages_api():
     """Get available languages"""
-    return jsonify({
-        "languages": [
-            {"code": "english", "name": "English"},
-            {"code": "spanish", "name": "Spanish"},
-            {"code": "french", "name": "French"},
-            {"code": "hindi", "name": "Hindi"},
-            {"code": "german", "name": "German"},
-            {"code": "italian", "name": "Italian"},
-            {"code": "portuguese", "name": "Portuguese"},
-            {"code": "russian", "name": "Russian"},
-            {"code": "japanese", "name": "Japanese"},
-            {"code": "chinese", "name": "Chinese"},
-            {"code": "korean", "name": "Korean"},
-            {"code": "arabic", "name": "Arabic"},
-            {"code": "dutch", "name": "Dutch"},
-            {"code": "swedish", "name": "Swedish"},
-            {"code": "turkish", "name": "Turkish"},
-            {"code": "polish", "name": "Polish"},
-            {"code": "ukrainian", "name": "Ukrainian"},
-            {"code": "vietnamese", "name": "Vietnamese"},
-            {"code": "thai", "name": "Thai"},
-            {"code": "indonesian", "name": "Indonesian"},
-            {"code": "greek", "name": "Greek"},
-            {"code": "czech", "name": "Czech"},
-            {"code": "romanian", "name": "Romanian"},
-            {"code": "danish", "name": "Danish"},
-            {"code": "finnish", "name": "Finnish"},
-            {"code": "norwegian", "name": "Norwegian"},
-            {"code": "hebrew", "name": "Hebrew"},
-            {"code": "farsi", "name": "Farsi"},
-            {"code": "malay", "name": "Malay"},
-            {"code": "swahili", "name": "Swahili"}
-        ]
-    })
+    return catalog_body('languages').send(request)
 
-@app.route('/api/categories', methods=['GET'])
+@api.route('/api/categories', methods=['GET'])
 def get_categories_api():
     """Get categorized book structure for UI"""
-    categories = [
-        {
-            "name": "Fiction",
-            "code": "fiction",
-            "subcategories": [
-                {
-                    "name": "Literature",
-                    "code": "literary+fiction",
-                    "subcategories": [
-                        {"name": "Literary Fiction", "code": "literary+fiction"},
-                        {"name": "Classics", "code": "classic+literature"},
-                        {"name": "Historical Fiction", "code": "historical+fiction"},
-                        {"name": "Short Stories", "code": "short+stories"},
-                        {"name": "Women's Fiction", "code": "womens+fiction"},
-                        {"name": "Men's Fiction", "code": "mens+fiction"}
-                    ]
-                }
-            ]
-        },
-        {
-            "name": "Non-Fiction",
-            "code": "nonfiction",
-            "subcategories": [
-                {
-                    "name": "Self-Help",
-                    "code": "self-help",
-                    "subcategories": [
-                        {"name": "Personal Development", "code": "personal+development"},
-                        {"name": "Motivation", "code": "motivation+self-help"},
-                        {"name": "Mindfulness and Meditation", "code": "mindfulness+meditation"}
-                    ]
-                }
-            ]
-        }
-    ]
-    return jsonify(categories)
+    return catalog_body('categories').send(request)
 
-@app.route('/api/books/category', methods=['GET'])
+@api.route('/api/books/category', methods=['GET'])
 def get_books_by_category_api():
     """Get books by category from Google Books API"""
     category_code = request.args.get('code')
@@ -617,46 +1361,42 @@ def get_books_by_category_api():
     limit = min(int(request.args.get('limit', 12)), 40)
     if not category_code:
         return jsonify({"error": "Category code is required"}), 400
-    result = book_service.get_books_by_category(category_code, page, limit)
-    return jsonify(result)
+    result = get_category_browser().get_page(category_code, page, limit)
+    return jsonify(dict(result, results=proxied_covers(result.get('results', []), request.url_root)))
 
-@app.route('/api/book/available-languages', methods=['GET'])
+@api.route('/api/cover', methods=['GET'])
+def get_cover_api():
+    """Serve a book cover from the cover cache, resized for a list or detail view"""
+    from covers import VARIANTS, CoverNotFound
+    url = request.args.get('url', '')
+    variant = request.args.get('size', 'list')
+    if variant not in VARIANTS:
+        return jsonify({"error": f"Unknown cover size: {variant}"}), 400
+    if not book_service.covers.allows(url):
+        return jsonify({"error": "Cover URL not allowed"}), 400
+    try:
+        cover = book_service.covers.get(url, variant, request.headers.get('Accept', ''))
+    except CoverNotFound:
+        return jsonify({"error": "Cover not found"}), 404
+    except Exception as e:
+        logger.warning(f"Error fetching cover {url}: {e}")
+        return jsonify({"error": "Cover unavailable"}), 502
+    return cover.send(request)
+
+@api.route('/api/book/available-languages', methods=['GET'])
 def get_available_languages_for_book():
     """Get available languages for a specific book summary"""
     book_id = request.args.get('id')
     if not book_id:
         return jsonify({"error": "Book ID is required"}), 400
-    supported_languages = [
-        "english", "spanish", "french", "hindi", "german", 
-        "italian", "portuguese", "russian", "japanese", 
-        "chinese", "korean", "arabic", "dutch", "swedish", 
-        "turkish", "polish", "ukrainian", "vietnamese", 
-        "thai", "indonesian", "greek", "czech", "romanian", 
-        "danish", "finnish", "norwegian", "hebrew", "farsi", 
-        "malay", "swahili"
-    ]
     available_languages = []
-    book_slug = None
-    for id, book_data in book_service.processed_books.items():
-        if id == book_id:
-            title = book_data.get('title', '')
-            book_slug = ''.join(c if c.isalnum() or c.isspace() else '-' for c in title.lower())
-            book_slug = '-'.join(book_slug.split())
-            while '--' in book_slug:
-                book_slug = book_slug.replace('--', '-')
-            if len(book_slug) > 100:
-                book_slug = book_slug[:100]
-            break
+    book_slug = book_service.summary_index.slug_for_book(book_id)
     if book_slug:
-        for language in supported_languages:
-            filename = f"{OUTPUT_DIR}/{book_slug}.md"
-            if language != "english":
-                filename = f"{OUTPUT_DIR}/{book_slug}-{language}.md"
-            if os.path.exists(filename):
-                available_languages.append(language)
+        languages = book_service.summary_index.languages_for_slug(book_slug)
+        available_languages = [language for language in SUPPORTED_LANGUAGES if language in languages]
     return jsonify({"bookId": book_id, "languages": available_languages})
 
-@app.route('/api/book/submit-summary', methods=['POST'])
+@api.route('/api/book/submit-summary', methods=['POST'])
 def submit_book_summary():
     """Submit a user-generated book summary"""
     data = request.json
@@ -669,6 +1409,10 @@ def submit_book_summary():
     book_id = data.get('bookId')
     if not title or not authors or not summary or not book_id:
         return jsonify({"error": "Missing required fields"}), 400
+    if data.get('thumbnailUrl'):
+        # Store the upstream cover, not a link to this API's proxy
+        from covers import unproxied_url
+        data['thumbnailUrl'] = unproxied_url(data['thumbnailUrl'])
     try:
         book = {
             'id': book_id,
@@ -679,12 +1423,7 @@ def submit_book_summary():
         }
         pending_dir = f"{OUTPUT_DIR}/pending"
         os.makedirs(pending_dir, exist_ok=True)
-        slug = ''.join(c if c.isalnum() or c.isspace() else '-' for c in title.lower())
-        slug = '-'.join(slug.split())
-        while '--' in slug:
-            slug = slug.replace('--', '-')
-        if len(slug) > 100:
-            slug = slug[:100]
+        slug = make_slug(title)
         if language != "english":
             filename = f"{pending_dir}/{slug}-{language}.md"
         else:
@@ -715,32 +1454,228 @@ def submit_book_summary():
         md_content += f"---\n\n{summary}\n"
         with open(filename, "w", encoding="utf-8") as f:
             f.write(md_content)
+        book_service.summary_search.index_file(filename, status=PENDING)
+        submission = book_service.moderation.enqueue(filename, book_id)
         return jsonify({
             "success": True,
-            "message": "Summary submitted successfully. It will be reviewed before being published."
+            "message": "Summary submitted successfully. It will be reviewed before being published.",
+            "submissionId": submission['id'],
+            "possibleDuplicates": submission['duplicates']
         })
     except Exception as e:
         logger.error(f"Error submitting summary: {e}")
         return jsonify({"error": f"Error submitting summary: {str(e)}"}), 500
 
-@app.route('/')
+def moderation_denied():
+    """Error response unless the request carries the moderation token"""
+    if not MODERATION_TOKEN:
+        return jsonify({"error": "Moderation is disabled"}), 403
+    # Constant-time comparison; bytes, as compare_digest rejects non-ASCII str
+    if not hmac.compare_digest(request.headers.get('Authorization', '').encode('utf-8'),
+                               f"Bearer {MODERATION_TOKEN}".encode('utf-8')):
+        return jsonify({"error": "Unauthorized"}), 401
+    return None
+
+def publish_submission(submission):
+    """Update the indexes and the processed-books store for an approved submission"""
+    path = submission['publishedPath']
+    book_service.summary_search.remove(submission['path'])
+    book_service.summary_search.index_file(path)
+    book_service.summary_index.record(submission['slug'], submission['language'])
+    summary_bodies.discard(path)
+    if book_service.related_engine is not None:
+        book_service.related_engine.add_file(path)
+    record_processed_book(submission['bookId'], submission['title'], submission['author'], submission['slug'])
+
+def moderation_ids():
+    """(submission ids from the JSON body, the body); ids is None when missing or malformed"""
+    data = request.json or {}
+    ids = data.get('ids')
+    if not isinstance(ids, list) or not ids:
+        return None, data
+    try:
+        return [int(submission_id) for submission_id in ids], data
+    except (TypeError, ValueError):
+        return None, data
+
+@api.route('/api/moderation/queue', methods=['GET'])
+def moderation_queue_api():
+    """List submissions page by page, oldest first"""
+    denied = moderation_denied()
+    if denied:
+        return denied
+    from moderation import PENDING as QUEUE_PENDING
+    return jsonify(book_service.moderation.list(
+        status=request.args.get('status', QUEUE_PENDING),
+        page=request.args.get('page', 1, type=int),
+        limit=min(request.args.get('limit', 20, type=int), 100),
+        duplicates_only=request.args.get('duplicates', '').lower() in ('1', 'true', 'yes')
+    ))
+
+@api.route('/api/moderation/approve', methods=['POST'])
+def moderation_approve_api():
+    """Publish a batch of pending submissions"""
+    denied = moderation_denied()
+    if denied:
+        return denied
+    ids, data = moderation_ids()
+    if ids is None:
+        return jsonify({"error": "ids must be a non-empty list of submission ids"}), 400
+    approved, errors = book_service.moderation.approve(ids, replace=bool(data.get('replace')))
+    for submission in approved:
+        try:
+            publish_submission(submission)
+        except Exception as e:
+            logger.error(f"Error publishing submission {submission['id']}: {e}")
+    return jsonify({
+        "approved": [submission['id'] for submission in approved],
+        "errors": {str(submission_id): error for submission_id, error in errors.items()}
+    })
+
+@api.route('/api/moderation/reject', methods=['POST'])
+def moderation_reject_api():
+    """Reject a batch of pending submissions"""
+    denied = moderation_denied()
+    if denied:
+        return denied
+    ids, data = moderation_ids()
+    if ids is None:
+        return jsonify({"error": "ids must be a non-empty list of submission ids"}), 400
+    rejected, errors = book_service.moderation.reject(ids, data.get('reason'))
+    for submission in rejected:
+        try:
+            book_service.summary_search.remove(submission['path'])
+        except Exception as e:
+            logger.error(f"Error unindexing submission {submission['id']}: {e}")
+    return jsonify({
+        "rejected": [submission['id'] for submission in rejected],
+        "errors": {str(submission_id): error for submission_id, error in errors.items()}
+    })
+
+@api.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats_api():
+    """Get upstream response and cover cache counters"""
+    return jsonify({
+        "responses": book_service.response_cache.stats(),
+        "authors": book_service.author_resolver.cache.stats(),
+        "covers": book_service.covers.stats()
+    })
+
+@api.route('/api/health/upstreams', methods=['GET'])
+def get_upstream_health_api():
+    """Get circuit breaker state and call counters for each upstream"""
+    upstreams = {name: client.snapshot() for name, client in book_service.upstreams.items()}
+    degraded = any(u['breaker']['state'] != 'closed' for u in upstreams.values())
+    return jsonify({"status": "degraded" if degraded else "ok", "upstreams": upstreams})
+
+@api.route('/metrics', methods=['GET'])
+def metrics_api():
+    """Expose metrics in the Prometheus text format"""
+    return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
+@api.route('/')
 def home():
     return jsonify({
         "status": "API running",
         "endpoints": [
             "/api/book/search",
+            "/api/summaries/search",
             "/api/book/details",
             "/api/book/summary",
+            "/api/book/summary/stream",
+            "/api/book/summary/jobs",
+            "/api/jobs/<job_id>",
             "/api/translate",
             "/api/languages",
             "/api/categories",
             "/api/books/category",
+            "/api/cover",
             "/api/book/available-languages",
-            "/api/book/submit-summary"
+            "/api/book/submit-summary",
+            "/api/moderation/queue",
+            "/api/moderation/approve",
+            "/api/moderation/reject",
+            "/api/cache/stats",
+            "/api/health/upstreams",
+            "/metrics"
         ]
     })
 
-if __name__ == '__main__':
+def configure_logging():
+    handlers = [logging.StreamHandler()]
+    if LOG_FILE:
+        handlers.insert(0, logging.FileHandler(LOG_FILE))
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=handlers
+    )
+
+
+@lazy
+def start_background_tasks():
+    """Once per process, off the boot path: resume queued summary jobs, start
+    syncing the summary indexes and start the category warm-up"""
+    def start():
+        try:
+            get_summary_jobs()
+            for name in ('summary_search', 'moderation', 'related_engine'):
+                getattr(book_service, name)
+            if CATEGORY_WARMUP_INTERVAL > 0:
+                get_category_browser().start_warmup(leaf_codes(CATEGORIES), CATEGORY_WARMUP_INTERVAL)
+        except Exception as e:
+            logger.error(f"Error starting background tasks: {e}")
+
+    thread = threading.Thread(target=start, name="startup", daemon=True)
+    thread.start()
+    return thread
+
+
+def create_app(background_tasks=True):
+    """Build the Flask app
+
+    Only the summary index snapshot (when STARTUP_SNAPSHOT is set) is
+    loaded here. Background tasks start on their own thread, and anything
+    else is built by the first request that needs it.
+    """
+    configure_logging()
+    if not OPENAI_API_KEY:
+        logger.warning("OPENAI_API_KEY is not set; summaries can only be served from the completion cache")
     os.makedirs(OUTPUT_DIR, exist_ok=True)
+    flask_app = Flask(__name__)
+    CORS(flask_app)  # Enable cross-origin requests
+    flask_app.register_blueprint(api)
+    if STARTUP_SNAPSHOT and 'summary_index' not in book_service.__dict__:
+        if book_service.load_snapshot(STARTUP_SNAPSHOT):
+            logger.info(f"Restored the summary index from {STARTUP_SNAPSHOT}")
+    if background_tasks:
+        start_background_tasks()
+    return flask_app
+
+
+@lazy
+def get_app():
+    """The app served by the WSGI server and asgi.py"""
+    return create_app()
+
+
+# Built on first access, so that importing this module stays cheap
+LAZY_ATTRIBUTES = {
+    'app': get_app,
+    'llm_client': get_llm_client,
+    'translator': get_translator,
+    'summary_jobs': get_summary_jobs,
+    'category_browser': get_category_browser,
+    'related_engine': lambda: book_service.related_engine
+}
+
+
+def __getattr__(name):
+    if name in LAZY_ATTRIBUTES:
+        return LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+if __name__ == '__main__':
     os.makedirs(f"{OUTPUT_DIR}/pending", exist_ok=True)
-    app.run(host='0.0.0.0', port=8000, debug=True)
+    get_app().run(host='0.0.0.0', port=8000, debug=True)
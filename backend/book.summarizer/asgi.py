@@ -0,0 +1,269 @@
+"""ASGI entry point, next to the Flask app.
+
+    uvicorn asgi:application --host 0.0.0.0 --port 8000
+
+Book search, book details and summary generation are served as coroutines
+by AsyncBookService and LLMClient.acomplete(). Each process can therefore
+keep many upstream and OpenAI calls in flight on pooled keep-alive
+connections instead of holding a worker thread per call. Every other
+request, and every response built from a summary file, is handed to the
+Flask app on a thread pool. The API is the same whichever entry point
+serves it.
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+from io import BytesIO
+from urllib.parse import parse_qsl, urlencode
+from concurrent.futures import ThreadPoolExecutor
+
+import app as service
+from llm import AsyncSingleFlight
+from upstream import AsyncResilientSession
+from async_service import AsyncBookService
+
+logger = logging.getLogger(__name__)
+
+WSGI_THREADS = int(os.getenv("WSGI_THREADS", "32"))
+ASYNC_POOL_SIZE = int(os.getenv("ASYNC_POOL_SIZE", "100"))
+
+async_books = AsyncBookService(
+    service.book_service,
+    AsyncResilientSession(service.book_service.session.clients, service.book_service.session.default,
+                          pool_size=ASYNC_POOL_SIZE),
+    service.GOOGLE_BOOKS_API_URL,
+    service.OPEN_LIBRARY_URL,
+    service.GOOGLE_BOOKS_API_KEY,
+    search_deadline=service.SEARCH_DEADLINE
+)
+summary_flights = AsyncSingleFlight()
+
+
+class WSGIBridge:
+    """Serve a WSGI app to ASGI http requests, running it on a thread pool
+
+    Response bodies are forwarded chunk by chunk, so streamed responses
+    such as Server-Sent Events keep streaming.
+    """
+
+    def __init__(self, wsgi_app, max_workers=32):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="wsgi")
+
+    @staticmethod
+    def environ(scope, body):
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', ''),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': client[0],
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False
+        }
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                environ[name] = value
+                continue
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+    async def __call__(self, scope, receive, send, body=None):
+        if body is None:
+            body = await read_body(receive)
+        loop = asyncio.get_running_loop()
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+            return lambda data: None
+
+        result = await loop.run_in_executor(self.executor, self.wsgi_app, self.environ(scope, body), start_response)
+        chunks = iter(result)
+        try:
+            chunk = await loop.run_in_executor(self.executor, next, chunks, None)
+            await send({'type': 'http.response.start', 'status': started['status'], 'headers': started['headers']})
+            while chunk is not None:
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                chunk = await loop.run_in_executor(self.executor, next, chunks, None)
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(result, 'close'):
+                await loop.run_in_executor(self.executor, result.close)
+        return started['status']
+
+
+flask_bridge = WSGIBridge(service.app, max_workers=WSGI_THREADS)
+
+
+async def read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+def request_headers(scope):
+    return {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope.get('headers', [])}
+
+
+def host_url(scope):
+    """request.url_root for an ASGI scope"""
+    host = request_headers(scope).get('host')
+    if not host:
+        name, port = scope.get('server') or ('localhost', 80)
+        default_port = 443 if scope.get('scheme') == 'https' else 80
+        host = name if port == default_port else f"{name}:{port}"
+    return f"{scope.get('scheme', 'http')}://{host}{scope.get('root_path', '')}/"
+
+
+async def send_json(scope, send, payload, status=200):
+    """Send a JSON response byte-for-byte like Flask's jsonify() behind flask-cors"""
+    body = service.app.json.response(payload).get_data()
+    headers = [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+    origin = request_headers(scope).get('origin')
+    if origin:
+        headers += [(b'access-control-allow-origin', origin.encode('latin-1')), (b'vary', b'Origin')]
+    else:
+        headers.append((b'access-control-allow-origin', b'*'))
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+    return status
+
+
+# -- routes -----------------------------------------------------------------
+
+async def search_books(scope, receive, send, args):
+    query = args.get('query', '')
+    if not query:
+        return await send_json(scope, send, {"error": "No search query provided"}, 400)
+    search = await async_books.search(query, int(args.get('limit', 10)))
+    return await send_json(scope, send, {
+        "query": query,
+        "results": service.proxied_covers(search["results"], host_url(scope)),
+        "sources": search["sources"],
+        "partial": search["partial"]
+    })
+
+
+async def book_details(scope, receive, send, args):
+    book_id = args.get('id')
+    source = args.get('source')
+    if not book_id or not source:
+        return await send_json(scope, send, {"error": "Book ID and source are required"}, 400)
+    is_work = args.get('is_work', 'true').lower() == 'true'
+    book_details = await async_books.get_book_details(source, book_id, is_work)
+    if book_details is None:
+        return await send_json(scope, send, {"error": "Book not found"}, 404)
+    return await send_json(scope, send, service.proxied_covers([book_details], host_url(scope), 'detail')[0])
+
+
+async def generate_summary_result(title, authors, language='english', description='', slug=None, book_id=None,
+                                  tier=None):
+    """service.generate_summary_result() with the completion awaited on the event loop"""
+    prepared = service.prepare_summary(title, authors, language, description, tier)
+    model = prepared['profile']['model']
+    slug = slug or service.make_slug(title)
+
+    async def generate():
+        with service.generation_in_flight('async'):
+            completion = await service.llm_client.acomplete(
+                model,
+                prepared['messages'],
+                key=prepared['key'],
+                **prepared['options']
+            )
+        # File writes and index updates are short blocking calls; keep them off the loop
+        return await asyncio.to_thread(service.store_completion, title, authors, language, slug, prepared, completion)
+
+    result = await summary_flights.do(service.summary_flight_key(prepared, slug), generate)
+    await asyncio.to_thread(service.record_processed_book, book_id, title, authors, slug, model, result['usage'])
+    return result
+
+
+async def book_summary(scope, receive, send, args):
+    """Generate missing summaries here; existing ones (and queued requests) are served by Flask"""
+    title = args.get('title')
+    slug = args.get('slug')
+    language = args.get('language', 'english')
+    if not title or args.get('async', 'false').lower() == 'true' or (
+        slug and service.book_service.summary_index.has(slug, language)
+    ):
+        # Timed by the Flask app itself
+        await flask_bridge(scope, receive, send, body=b'')
+        return None
+    authors = args.get('authors', 'Unknown')
+    if ',' in authors:
+        authors = [author.strip() for author in authors.split(',')]
+    try:
+        result = await generate_summary_result(
+            title, authors, language, args.get('description', ''),
+            slug=slug, book_id=args.get('bookId'), tier=args.get('tier')
+        )
+    except Exception as e:
+        logger.error(f"Error generating summary: {e}")
+        return await send_json(scope, send, {"error": f"Failed to generate summary: {str(e)}"}, 500)
+    # Flask serves the file it would have served itself, with the same ETag and encodings
+    args = dict(args, slug=result['slug'])
+    scope = dict(scope, query_string=urlencode(args).encode('latin-1'))
+    return await flask_bridge(scope, receive, send, body=b'')
+
+
+ROUTES = {
+    '/api/book/search': search_books,
+    '/api/book/details': book_details,
+    '/api/book/summary': book_summary
+}
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            service.llm_client.aiosession = async_books.session.session
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await async_books.close()
+            service.llm_client.aiosession = None
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        raise RuntimeError(f"Unsupported ASGI scope type {scope['type']}")
+    handler = ROUTES.get(scope['path'])
+    if handler is None or scope['method'] != 'GET':
+        return await flask_bridge(scope, receive, send)
+    started = time.perf_counter()
+    args = {}
+    for name, value in parse_qsl(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True):
+        args.setdefault(name, value)  # first value wins, as with request.args.get()
+    status = 500
+    try:
+        status = await handler(scope, receive, send, args)
+    finally:
+        if status is not None:
+            service.request_latency.observe(time.perf_counter() - started, route=scope['path'],
+                                            method='GET', status=status)
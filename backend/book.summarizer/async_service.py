@@ -0,0 +1,172 @@
+"""asyncio counterpart of BookService for the ASGI entry point.
+
+Upstream calls go through an AsyncResilientSession (one pooled keep-alive
+aiohttp session) instead of a worker thread each, so a single process can
+keep many searches and detail lookups in flight. Caches, indexes and the
+per-upstream policies are shared with the synchronous BookService, and
+the responses are parsed by the same functions, so both entry points
+return the same data.
+"""
+import time
+import asyncio
+import logging
+
+from response_cache import cached_response
+from upstream import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncBookService:
+    """Search and detail lookups of a BookService, as coroutines"""
+
+    def __init__(self, service, session, google_books_url, open_library_url, google_books_key,
+                 search_deadline=4.0):
+        self.service = service
+        self.session = session
+        self.response_cache = service.response_cache
+        self.google_books_url = google_books_url
+        self.open_library_url = open_library_url
+        self.google_books_key = google_books_key
+        self.search_deadline = search_deadline
+        self.providers = [
+            ('googleBooks', self._search_google_books),
+            ('openLibrary', self._search_open_library)
+        ]
+
+    async def close(self):
+        await self.session.close()
+
+    # -- search -------------------------------------------------------------
+
+    async def search(self, query, max_results=10):
+        """BookService.search(): local summaries first, then every provider under the deadline"""
+        local_books = self.service.search_summaries(query, max_results)
+        if len(local_books) >= max_results:
+            return {"results": local_books, "sources": {"summaries": "ok"}, "partial": False, "elapsedMs": 0}
+        return self.service.merge_search(local_books, await self.search_providers(query, max_results))
+
+    async def search_providers(self, query, max_results=10):
+        """SearchEngine.search() on the event loop; providers that miss the deadline are cancelled"""
+        per_source = max(1, max_results // max(1, len(self.providers)))
+        started = time.monotonic()
+        tasks = [(name, asyncio.ensure_future(fn(query, per_source))) for name, fn in self.providers]
+        done, pending = await asyncio.wait([task for _, task in tasks], timeout=self.search_deadline)
+        results = []
+        sources = {}
+        for name, task in tasks:
+            if task in pending:
+                task.cancel()
+                sources[name] = "timeout"
+                logger.warning(f"Search provider {name} missed the {self.search_deadline}s deadline for '{query}'")
+                continue
+            try:
+                results.extend(task.result())
+                sources[name] = "ok"
+            except CircuitOpenError:
+                sources[name] = "unavailable"
+            except Exception as e:
+                sources[name] = "error"
+                logger.error(f"Search provider {name} failed for '{query}': {e}")
+        return {
+            "results": results,
+            "sources": sources,
+            "partial": any(status != "ok" for status in sources.values()),
+            "elapsedMs": int((time.monotonic() - started) * 1000)
+        }
+
+    @cached_response('search_google_books')
+    async def _search_google_books(self, query, max_results=10):
+        url = f"{self.google_books_url}/volumes?q={query}&maxResults={max_results}&key={self.google_books_key}"
+        response = await self.session.get(url, site='search_google_books')
+        if response.status_code != 200:
+            logger.warning(f"Google Books API returned {response.status_code}")
+            response.raise_for_status()
+            return []
+        return self.service.parse_google_books_search(response.json())
+
+    async def _search_open_library(self, query, max_results=10):
+        if self.service.catalog is not None:
+            books = await asyncio.to_thread(self.service.search_catalog, query, max_results)
+            if books:
+                return books
+        return await self._fetch_open_library_search(query, max_results)
+
+    @cached_response('search_open_library')
+    async def _fetch_open_library_search(self, query, max_results=10):
+        url = f"{self.open_library_url}/search.json?q={query}&limit={max_results}"
+        response = await self.session.get(url, site='search_open_library')
+        if response.status_code != 200:
+            logger.warning(f"Open Library API returned {response.status_code}")
+            response.raise_for_status()
+            return []
+        return self.service.parse_open_library_search(response.json())
+
+    # -- details ------------------------------------------------------------
+
+    async def get_book_details(self, source, book_id, is_work=True):
+        if source == 'Google Books':
+            return await self.get_book_details_google(book_id)
+        elif source == 'Open Library':
+            return await self.get_book_details_open_library(book_id, is_work)
+        elif source == 'Book Summaries':
+            return await asyncio.to_thread(self.service.get_book_details_summary, book_id)
+        logger.warning(f"Unknown source: {source}")
+        return None
+
+    async def get_book_details_open_library(self, book_id, is_work=True):
+        if self.service.catalog is not None:
+            book_details = await asyncio.to_thread(self.service.catalog_details, book_id, is_work)
+            if book_details is not None:
+                return book_details
+        return await self._fetch_book_details_open_library(book_id, is_work)
+
+    @cached_response('book_details_open_library')
+    async def _fetch_book_details_open_library(self, book_id, is_work=True):
+        try:
+            kind = 'works' if is_work else 'books'
+            url = f"{self.open_library_url}/{kind}/{book_id}.json"
+            response = await self.session.get(url, site='book_details_open_library')
+            if response.status_code != 200:
+                logger.warning(f"Open Library API returned {response.status_code} for {url}")
+                return None
+            data = response.json()
+            authors = await self.resolve_authors(data.get('authors', []))
+            return self.service.parse_open_library_details(data, book_id, is_work, authors)
+        except Exception as e:
+            logger.error(f"Error getting Open Library details for {book_id}: {e}")
+            return None
+
+    @cached_response('book_details_google')
+    async def get_book_details_google(self, book_id):
+        try:
+            url = f"{self.google_books_url}/volumes/{book_id}?key={self.google_books_key}"
+            response = await self.session.get(url, site='book_details_google')
+            if response.status_code != 200:
+                logger.warning(f"Google Books API returned {response.status_code} for {url}")
+                return None
+            return self.service.parse_google_books_details(response.json(), book_id)
+        except Exception as e:
+            logger.error(f"Error getting Google Books details for {book_id}: {e}")
+            return None
+
+    # -- authors ------------------------------------------------------------
+
+    async def resolve_authors(self, author_refs):
+        """AuthorResolver.resolve() with the missing authors fetched concurrently on the loop"""
+        resolver = self.service.author_resolver
+        # lookup() and merge() may touch the SQLite store, so they run off the loop
+        keys, names, missing = await asyncio.to_thread(resolver.lookup, author_refs)
+        fetched = await asyncio.gather(*(self._fetch_author(key) for key in missing))
+        return await asyncio.to_thread(resolver.merge, keys, names, dict(zip(missing, fetched)))
+
+    async def _fetch_author(self, key):
+        try:
+            response = await self.session.get(f"{self.open_library_url}/authors/{key}.json",
+                                              site='open_library_author')
+            if response.status_code != 200:
+                return None
+            return response.json().get('name', 'Unknown')
+        except Exception as e:
+            logger.warning(f"Error fetching Open Library author {key}: {e}")
+            return 'Unknown'
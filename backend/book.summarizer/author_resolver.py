@@ -0,0 +1,177 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+OPEN_LIBRARY_URL = "https://openlibrary.org"
+
+
+class AuthorResolver:
+    """Resolve Open Library author keys to names concurrently, with an LRU/TTL memo
+
+    With a persist_path, resolved names are also kept in a SQLite file
+    shared by all worker processes: each lookup writes only the names it
+    fetched, and a memo miss is looked up there before Open Library.
+    """
+
+    def __init__(self, session, base_url=OPEN_LIBRARY_URL, maxsize=5000, ttl=7 * 24 * 3600,
+                 persist_path=None, max_workers=8, negative_ttl=3600, legacy_json=None):
+        self.session = session
+        self.base_url = base_url
+        self.negative_ttl = negative_ttl
+        self.ttl = ttl
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.persist_path = persist_path
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="authors")
+        self._local = threading.local()
+        if persist_path:
+            os.makedirs(os.path.dirname(persist_path), exist_ok=True)
+            self._init_db()
+            self._load(legacy_json)
+
+    @staticmethod
+    def author_key(author_ref):
+        """Extract the bare author key from a work's author reference"""
+        if not isinstance(author_ref, dict):
+            return None
+        if 'author' in author_ref and isinstance(author_ref['author'], dict):
+            author_ref = author_ref['author']
+        key = author_ref.get('key')
+        return key.split('/')[-1] if key else None
+
+    def resolve(self, author_refs):
+        """Return author names for the given references, in order
+
+        References that the upstream does not know about are dropped and
+        failed lookups come back as 'Unknown', matching the old behaviour.
+        """
+        keys, names, missing = self.lookup(author_refs)
+        fetched = dict(zip(missing, self.executor.map(self._fetch, missing))) if missing else {}
+        return self.merge(keys, names, fetched)
+
+    def lookup(self, author_refs):
+        """Split references into (keys, {key: name} known locally, keys to fetch)
+
+        The memo is consulted first, then the store shared with other
+        processes. Used by resolve() and by the asyncio service, which
+        fetches the missing keys itself.
+        """
+        keys = [self.author_key(ref) for ref in author_refs]
+        keys = [key for key in keys if key]
+        names = {}
+        missing = []
+        for key in dict.fromkeys(keys):  # dedupe, keep order
+            name = self.cache.get(key)
+            if name is None:
+                missing.append(key)
+            else:
+                names[key] = name
+        if missing:
+            stored = self._lookup(missing)
+            names.update(stored)
+            missing = [key for key in missing if key not in stored]
+        return keys, names, missing
+
+    def merge(self, keys, names, fetched):
+        """Remember fetched {key: name} results and return the names for keys, in order
+
+        A fetched name of None means Open Library doesn't know the author;
+        'Unknown' means the fetch failed and is not remembered.
+        """
+        names = dict(names)
+        remembered = []
+        for key, name in fetched.items():
+            names[key] = name
+            if name is None:
+                # Unknown to Open Library: remember briefly so we stop asking
+                remembered.append((key, '', self.negative_ttl))
+            elif name != 'Unknown':
+                remembered.append((key, name, self.ttl))
+        self._remember(remembered)
+        return [names[key] for key in dict.fromkeys(keys) if names.get(key)]
+
+    def _fetch(self, key):
+        try:
+            response = self.session.get(f"{self.base_url}/authors/{key}.json", site='open_library_author')
+            if response.status_code != 200:
+                return None
+            return response.json().get('name', 'Unknown')
+        except Exception as e:
+            logger.warning(f"Error fetching Open Library author {key}: {e}")
+            return 'Unknown'
+
+    # -- SQLite store ---------------------------------------------------------
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.persist_path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS authors ("
+            " key TEXT PRIMARY KEY,"
+            " name TEXT NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+
+    def _load(self, legacy_json=None):
+        """Warm the memo with the most recently stored names, importing legacy_json once"""
+        try:
+            conn = self._conn()
+            conn.execute("DELETE FROM authors WHERE expires_at <= ?", (time.time(),))
+            if legacy_json and os.path.exists(legacy_json) and \
+                    conn.execute("SELECT COUNT(*) FROM authors").fetchone()[0] == 0:
+                with open(legacy_json, 'r', encoding='utf-8') as f:
+                    conn.executemany("INSERT OR REPLACE INTO authors (key, name, expires_at) VALUES (?, ?, ?)",
+                                     json.load(f))
+            rows = conn.execute(
+                "SELECT key, name, expires_at FROM authors WHERE expires_at > ? ORDER BY expires_at DESC LIMIT ?",
+                (time.time(), self.cache.maxsize)
+            ).fetchall()
+            for key, name, expires_at in reversed(rows):
+                self.cache.set(key, name, expires_at=expires_at)
+            logger.info(f"Loaded {len(self.cache)} cached authors")
+        except Exception as e:
+            logger.error(f"Error loading author cache: {e}")
+
+    def _lookup(self, keys):
+        """Names stored by any process for keys, added to the memo"""
+        if not self.persist_path:
+            return {}
+        try:
+            rows = self._conn().execute(
+                f"SELECT key, name, expires_at FROM authors WHERE key IN ({', '.join('?' * len(keys))})"
+                f" AND expires_at > ?",
+                (*keys, time.time())
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Author cache read failed: {e}")
+            return {}
+        for key, name, expires_at in rows:
+            self.cache.set(key, name, expires_at=expires_at)
+        return {key: name for key, name, _ in rows}
+
+    def _remember(self, entries):
+        """Memoize (key, name, ttl) entries and store them in one write"""
+        now = time.time()
+        rows = [(key, name, now + ttl) for key, name, ttl in entries]
+        for key, name, expires_at in rows:
+            self.cache.set(key, name, expires_at=expires_at)
+        if not self.persist_path or not rows:
+            return
+        try:
+            self._conn().executemany("INSERT OR REPLACE INTO authors (key, name, expires_at) VALUES (?, ?, ?)", rows)
+        except sqlite3.Error as e:
+            logger.error(f"Error saving author cache: {e}")
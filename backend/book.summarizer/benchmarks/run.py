@@ -0,0 +1,229 @@
+"""Offline benchmark of the book service against local stub upstreams.
+
+Starts stub Google Books, Open Library and OpenAI servers, points the app at
+them through its environment variables, serves the app on a local port and
+drives each route at fixed concurrency levels. Throughput and latency
+percentiles are printed and written to a JSON file.
+
+    python benchmarks/run.py
+    python benchmarks/run.py --concurrency 1,16 --requests 400 --upstream-latency 0.05,0.2
+    python benchmarks/run.py --output bench/new.json --compare bench/old.json
+
+Everything runs against a throwaway OUTPUT_DIR, so the site's content is
+never touched and no real API is called.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from stubs import StubBehaviour, start_stubs  # noqa: E402
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def scenarios(summary_slugs, book_ids):
+    """Map scenario name -> fn(i) returning (path, params) for the i-th request"""
+    categories = ['fiction', 'self-help', 'motivation+self-help', 'classic+literature', 'short+stories']
+    return {
+        'search_cold': lambda i: ('/api/book/search', {'query': f"cold query {i} {random.random()}"}),
+        'search_warm': lambda i: ('/api/book/search', {'query': f"warm query {i % 5}"}),
+        'details': lambda i: ('/api/book/details', {
+            'source': 'Open Library' if i % 2 else 'Google Books',
+            'id': f"OL{i % 50}W"
+        }),
+        'summary_cold': lambda i: ('/api/book/summary', {
+            'title': f"Benchmark Book {i} {random.random()}",
+            'authors': 'Stub Author'
+        }),
+        'summary_warm': lambda i: ('/api/book/summary', {
+            'title': 'Warm Book',
+            'slug': summary_slugs[i % len(summary_slugs)]
+        }),
+        'category': lambda i: ('/api/books/category', {
+            'code': categories[i % len(categories)],
+            'page': 1 + (i // len(categories)) % 3
+        }),
+        'available_languages': lambda i: ('/api/book/available-languages', {'id': book_ids[i % len(book_ids)]})
+    }
+
+
+def run_level(base_url, name, build_request, concurrency, total):
+    """Issue `total` requests with `concurrency` workers; return the result row"""
+    local = threading.local()
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def one(i):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        path, params = build_request(i)
+        started = time.perf_counter()
+        try:
+            ok = session.get(base_url + path, params=params, timeout=120).status_code < 400
+        except requests.RequestException:
+            ok = False
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            if not ok:
+                errors[0] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(total)))
+    duration = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'scenario': name,
+        'concurrency': concurrency,
+        'requests': total,
+        'errors': errors[0],
+        'durationSeconds': round(duration, 3),
+        'throughputRps': round(total / duration, 2) if duration else 0.0,
+        'p50Ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95Ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99Ms': round(percentile(latencies, 99) * 1000, 2)
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def compare(results, baseline_path):
+    """Print throughput and p95 changes against a previous results file"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {(row['scenario'], row['concurrency']): row for row in json.load(f)['results']}
+    print(f"\nCompared with {baseline_path}:")
+    for row in results:
+        old = baseline.get((row['scenario'], row['concurrency']))
+        if not old:
+            continue
+        rps_change = (row['throughputRps'] / old['throughputRps'] - 1) * 100 if old['throughputRps'] else 0.0
+        p95_change = (row['p95Ms'] / old['p95Ms'] - 1) * 100 if old['p95Ms'] else 0.0
+        print(f"  {row['scenario']:<20} c={row['concurrency']:<4} rps {rps_change:+7.1f}%   p95 {p95_change:+7.1f}%")
+
+
+def parse_range(value):
+    parts = [float(part) for part in value.split(',')]
+    return (parts[0], parts[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', default='1,8,32', help="comma-separated concurrency levels")
+    parser.add_argument('--requests', type=int, default=200, help="requests per scenario and level")
+    parser.add_argument('--scenarios', default=None, help="comma-separated subset of scenarios to run")
+    parser.add_argument('--upstream-latency', type=parse_range, default=(0.02, 0.08),
+                        help="min,max seconds of Google Books / Open Library stub latency")
+    parser.add_argument('--openai-latency', type=parse_range, default=(0.5, 1.5),
+                        help="min,max seconds of OpenAI stub latency")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of stub responses that are 503s")
+    parser.add_argument('--output', default=None, help="results JSON path (default benchmarks/results/<time>.json)")
+    parser.add_argument('--compare', default=None, help="previous results JSON to compare against")
+    args = parser.parse_args()
+
+    upstream = StubBehaviour(args.upstream_latency, args.error_rate)
+    stubs = start_stubs(google=upstream, open_library=upstream,
+                        openai=StubBehaviour(args.openai_latency, args.error_rate))
+    work_dir = tempfile.mkdtemp(prefix='book-bench-')
+    os.environ.update({
+        'OUTPUT_DIR': work_dir,
+        'GOOGLE_BOOKS_API_URL': stubs['googleBooks'].url + '/books/v1',
+        'OPEN_LIBRARY_URL': stubs['openLibrary'].url,
+        'OPENAI_API_BASE': stubs['openai'].url + '/v1',
+        'OPENAI_API_KEY': 'stub',
+        'GOOGLE_BOOKS_API_KEY': 'stub',
+        'CATEGORY_WARMUP_INTERVAL': '0',
+        'LOG_FILE': '',
+        # Measure the service, not our politeness towards the real upstreams
+        'GOOGLE_BOOKS_RPS': '10000',
+        'OPEN_LIBRARY_RPS': '10000',
+        'OPENAI_RPS': '10000'
+    })
+
+    import logging
+    from werkzeug.serving import make_server
+    import app as service
+    flask_app = service.app  # configures logging, so quieten it afterwards
+    for name in ('', 'werkzeug'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    server = make_server('127.0.0.1', 0, flask_app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    # Seed summaries for the warm and available-languages scenarios
+    book_ids = [f"bench-book-{i}" for i in range(20)]
+    summary_slugs = []
+    for book_id in book_ids:
+        response = requests.get(base_url + '/api/book/summary', params={
+            'title': f"Seed {book_id}", 'authors': 'Stub Author', 'bookId': book_id
+        }, timeout=120)
+        response.raise_for_status()
+        summary_slugs.append(service.book_service.summary_index.slug_for_book(book_id))
+
+    available = scenarios(summary_slugs, book_ids)
+    selected = args.scenarios.split(',') if args.scenarios else list(available)
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    results = []
+    print(f"{'scenario':<20} {'conc':>4} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for name in selected:
+        for concurrency in levels:
+            row = run_level(base_url, name, available[name], concurrency, args.requests)
+            results.append(row)
+            print(f"{name:<20} {concurrency:>4} {row['throughputRps']:>9} {row['p50Ms']:>9} "
+                  f"{row['p95Ms']:>9} {row['p99Ms']:>9} {row['errors']:>7}")
+
+    server.shutdown()
+    for stub in stubs.values():
+        stub.stop()
+
+    output = args.output or os.path.join(HERE, 'results', f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(),
+            'config': {
+                'requests': args.requests,
+                'concurrency': levels,
+                'upstreamLatency': args.upstream_latency,
+                'openaiLatency': args.openai_latency,
+                'errorRate': args.error_rate
+            },
+            'results': results
+        }, f, indent=2)
+    print(f"\nWrote {output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""Startup benchmark: import time, app creation and first-request latency.
+
+Each run is a fresh interpreter that imports app, creates the Flask app and
+serves one request through the test client, as a cold serverless instance
+would. OUTPUT_DIR is seeded with generated summaries and the upstreams are
+local stubs, so nothing real is touched. Runs are repeated with and without
+a STARTUP_SNAPSHOT of the summary index.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --runs 20 --summaries 5000 --output bench/startup.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+
+from run import percentile, git_commit  # noqa: E402
+from stubs import StubBehaviour, start_stubs  # noqa: E402
+
+ROUTES = {
+    'languages': '/api/languages',
+    'summary': '/api/book/summary?slug=seed-book-0',
+    'search': '/api/book/search?query=seed'
+}
+# Modules that should only be imported once a request needs them
+HEAVY_MODULES = ('openai', 'aiohttp', 'numpy', 'PIL')
+
+
+def child(path):
+    """Measure one cold start in this interpreter and print it as JSON"""
+    sys.path.insert(0, APP_DIR)
+    started = time.perf_counter()
+    import app as service
+    imported = time.perf_counter()
+    heavy_on_import = [name for name in HEAVY_MODULES if name in sys.modules]
+    client = service.app.test_client()
+    created = time.perf_counter()
+    status = client.get(path).status_code
+    served = time.perf_counter()
+    print(json.dumps({
+        'importMs': (imported - started) * 1000,
+        'createMs': (created - imported) * 1000,
+        'firstRequestMs': (served - created) * 1000,
+        'status': status,
+        'heavyOnImport': heavy_on_import
+    }))
+
+
+def seed_summaries(output_dir, count):
+    for i in range(count):
+        with open(os.path.join(output_dir, f"seed-book-{i}.md"), 'w', encoding='utf-8') as f:
+            f.write(f'---\ntitle: "Seed Book {i}"\nauthor: "Stub Author"\n'
+                    f'description: "A seeded summary"\nlanguage: "english"\n---\n\n'
+                    f'## Core Summary\nSeed summary number {i} for the startup benchmark.\n')
+
+
+def measure(env, path, runs):
+    rows = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', path], env=env,
+                                cwd=env['OUTPUT_DIR'], capture_output=True, text=True, check=True).stdout
+        rows.append(json.loads(output.strip().splitlines()[-1]))
+    return rows
+
+
+def summarize(name, snapshot, rows):
+    row = {'scenario': name, 'snapshot': snapshot, 'runs': len(rows),
+           'statuses': sorted({r['status'] for r in rows}),
+           'heavyOnImport': sorted({module for r in rows for module in r['heavyOnImport']})}
+    for key in ('importMs', 'createMs', 'firstRequestMs'):
+        values = sorted(r[key] for r in rows)
+        row[f"{key[:-2]}P50Ms"] = round(percentile(values, 50), 2)
+        row[f"{key[:-2]}P95Ms"] = round(percentile(values, 95), 2)
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--child', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--runs', type=int, default=10, help="cold starts per scenario")
+    parser.add_argument('--summaries', type=int, default=2000, help="summary files to seed OUTPUT_DIR with")
+    parser.add_argument('--scenarios', default=None, help="comma-separated subset of " + ','.join(ROUTES))
+    parser.add_argument('--output', default=None,
+                        help="results JSON path (default benchmarks/results/startup-<time>.json)")
+    args = parser.parse_args()
+    if args.child:
+        return child(args.child)
+
+    upstream = StubBehaviour((0.02, 0.08), 0.0)
+    stubs = start_stubs(google=upstream, open_library=upstream, openai=StubBehaviour((0.5, 1.5), 0.0))
+    work_dir = tempfile.mkdtemp(prefix='book-startup-')
+    seed_summaries(work_dir, args.summaries)
+    env = dict(os.environ, **{
+        'OUTPUT_DIR': work_dir,
+        'GOOGLE_BOOKS_API_URL': stubs['googleBooks'].url + '/books/v1',
+        'OPEN_LIBRARY_URL': stubs['openLibrary'].url,
+        'OPENAI_API_BASE': stubs['openai'].url + '/v1',
+        'OPENAI_API_KEY': 'stub',
+        'GOOGLE_BOOKS_API_KEY': 'stub',
+        'CATEGORY_WARMUP_INTERVAL': '0',
+        'LOG_FILE': ''
+    })
+    env.pop('STARTUP_SNAPSHOT', None)
+    snapshot_path = os.path.join(work_dir, '_cache', 'summary_index.json')
+    subprocess.run([sys.executable, os.path.join(APP_DIR, 'summary_index.py'), 'snapshot', snapshot_path],
+                   env=env, cwd=work_dir, capture_output=True, check=True)
+    # One throwaway start creates the stores and indexes a restarted instance would find
+    measure(env, ROUTES['languages'], 1)
+
+    selected = args.scenarios.split(',') if args.scenarios else list(ROUTES)
+    results = []
+    print(f"{'scenario':<12} {'snapshot':>8} {'import ms':>10} {'create ms':>10} {'first req ms':>13} "
+          f"{'p95 total':>10}  heavy modules on import")
+    for name in selected:
+        for snapshot in (False, True):
+            run_env = dict(env, STARTUP_SNAPSHOT=snapshot_path) if snapshot else env
+            rows = measure(run_env, ROUTES[name], args.runs)
+            row = summarize(name, snapshot, rows)
+            totals = sorted(r['importMs'] + r['createMs'] + r['firstRequestMs'] for r in rows)
+            row['totalP95Ms'] = round(percentile(totals, 95), 2)
+            results.append(row)
+            print(f"{name:<12} {str(snapshot):>8} {row['importP50Ms']:>10} {row['createP50Ms']:>10} "
+                  f"{row['firstRequestP50Ms']:>13} {row['totalP95Ms']:>10}  {','.join(row['heavyOnImport']) or '-'}")
+
+    for stub in stubs.values():
+        stub.stop()
+
+    output = args.output or os.path.join(HERE, 'results', f"startup-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(),
+            'config': {'runs': args.runs, 'summaries': args.summaries},
+            'results': results
+        }, f, indent=2)
+    print(f"\nWrote {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+"""Local stand-ins for the upstream APIs used by the book service.
+
+Each stub is a threaded HTTP server on 127.0.0.1 that answers with
+deterministic fake data after a configurable delay, and fails a
+configurable fraction of requests with HTTP 503.
+"""
+import json
+import time
+import random
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+
+class StubBehaviour:
+    """Latency (seconds, uniform in [min, max]) and error rate of a stub"""
+
+    def __init__(self, latency=(0.02, 0.05), error_rate=0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+
+    def delay(self):
+        low, high = self.latency
+        time.sleep(random.uniform(low, high))
+
+    def should_fail(self):
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+
+def _word(seed, index):
+    digest = hashlib.md5(f"{seed}:{index}".encode()).hexdigest()
+    return digest[:8]
+
+
+def google_volume(volume_id):
+    return {
+        'id': volume_id,
+        'volumeInfo': {
+            'title': f"Book {volume_id}",
+            'authors': [f"Author {_word(volume_id, 'a')}"],
+            'publishedDate': '2001',
+            'description': ' '.join(f"Sentence {i} about {_word(volume_id, i)}." for i in range(40)),
+            'pageCount': 320,
+            'categories': ['Fiction'],
+            'averageRating': 4.2,
+            'ratingsCount': 120,
+            'language': 'en',
+            'imageLinks': {'thumbnail': f"https://example.invalid/{volume_id}.jpg"}
+        }
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    behaviour = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _respond(self, route):
+        self.behaviour.delay()
+        if self.behaviour.should_fail():
+            self._send_json(503, {'error': 'stub failure'})
+            return
+        url = urlsplit(self.path)
+        status, payload = route(url.path, {k: v[0] for k, v in parse_qs(url.query).items()})
+        self._send_json(status, payload)
+
+    def do_GET(self):
+        self._respond(self.route_get)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.body = json.loads(self.rfile.read(length) or b'{}')
+        self._respond(self.route_post)
+
+    def route_get(self, path, query):
+        return 404, {'error': 'not found'}
+
+    def route_post(self, path, query):
+        return 404, {'error': 'not found'}
+
+
+class GoogleBooksHandler(_Handler):
+    def route_get(self, path, query):
+        if path == '/books/v1/volumes':
+            limit = int(query.get('maxResults', 10))
+            offset = int(query.get('startIndex', 0))
+            seed = query.get('q', '')
+            items = [google_volume(_word(seed, offset + i)) for i in range(limit)]
+            return 200, {'totalItems': 400, 'items': items}
+        if path.startswith('/books/v1/volumes/'):
+            return 200, google_volume(path.rsplit('/', 1)[-1])
+        return 404, {'error': 'not found'}
+
+
+class OpenLibraryHandler(_Handler):
+    def route_get(self, path, query):
+        if path == '/search.json':
+            seed = query.get('q', '')
+            limit = int(query.get('limit', 10))
+            docs = [{
+                'key': f"/works/OL{_word(seed, i)}W",
+                'title': f"Work {_word(seed, i)}",
+                'author_name': [f"Author {_word(seed, -i)}"],
+                'first_publish_year': 1990,
+                'number_of_pages_median': 250,
+                'subject': ['Fiction'],
+                'cover_i': 1000 + i
+            } for i in range(limit)]
+            return 200, {'numFound': limit, 'docs': docs}
+        if path.startswith('/works/') or path.startswith('/books/'):
+            work_id = path.rsplit('/', 1)[-1].replace('.json', '')
+            return 200, {
+                'title': f"Work {work_id}",
+                'description': {'value': f"Description of {work_id}."},
+                'subjects': ['Fiction'],
+                'covers': [1234],
+                'authors': [{'author': {'key': f"/authors/OL{_word(work_id, i)}A"}} for i in range(3)]
+            }
+        if path.startswith('/authors/'):
+            author_id = path.rsplit('/', 1)[-1].replace('.json', '')
+            return 200, {'name': f"Author {author_id}"}
+        return 404, {'error': 'not found'}
+
+
+SUMMARY_TEXT = """## Short Summary
+A stub summary used for benchmarking.
+
+## Detailed Summary
+""" + "\n\n".join("Paragraph %d of the detailed summary. " % i * 8 for i in range(5)) + """
+
+## Key Takeaways
+""" + "\n".join(f"- Takeaway number {i}" for i in range(8))
+
+
+class OpenAIHandler(_Handler):
+    def route_post(self, path, query):
+        if not path.endswith('/chat/completions'):
+            return 404, {'error': {'message': 'not found'}}
+        return 200, {
+            'id': 'chatcmpl-stub',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': self.body.get('model', 'gpt-3.5-turbo'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': SUMMARY_TEXT},
+                'finish_reason': 'stop'
+            }],
+            'usage': {'prompt_tokens': 350, 'completion_tokens': 600, 'total_tokens': 950}
+        }
+
+
+class StubServer:
+    """Run one stub handler on an ephemeral local port in a daemon thread"""
+
+    def __init__(self, handler, behaviour=None):
+        handler_class = type(handler.__name__, (handler,), {'behaviour': behaviour or StubBehaviour()})
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler_class)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def start_stubs(google=None, open_library=None, openai=None):
+    """Start all three stubs; arguments are StubBehaviour overrides"""
+    return {
+        'googleBooks': StubServer(GoogleBooksHandler, google).start(),
+        'openLibrary': StubServer(OpenLibraryHandler, open_library).start(),
+        'openai': StubServer(OpenAIHandler, openai).start()
+    }
@@ -0,0 +1,165 @@
+"""SQLite-backed store for processed books.
+
+Replaces the processed_books.json file that used to be rewritten in full
+after every summary. Each upsert is a single-row transaction in WAL mode,
+so writes are atomic, O(1), and visible to every worker process reading
+the same database file.
+
+One-shot import of an existing JSON file:
+
+    python book_store.py import path/to/processed_books.json path/to/books.sqlite3
+"""
+import os
+import sys
+import json
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ProcessedBookStore:
+    """Dict-like view of processed books keyed by book id"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS processed_books ("
+            " book_id TEXT PRIMARY KEY,"
+            " slug TEXT,"
+            " data TEXT NOT NULL)"
+        )
+        self._conn().execute("CREATE INDEX IF NOT EXISTS processed_books_slug ON processed_books (slug)")
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS summary_usage ("
+            " slug TEXT NOT NULL,"
+            " language TEXT NOT NULL,"
+            " model TEXT,"
+            " prompt_tokens INTEGER NOT NULL,"
+            " completion_tokens INTEGER NOT NULL,"
+            " cached INTEGER NOT NULL,"
+            " created_at TEXT NOT NULL)"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def upsert(self, book_id, entry):
+        """Insert or replace the entry for book_id"""
+        self._conn().execute(
+            "INSERT OR REPLACE INTO processed_books (book_id, slug, data) VALUES (?, ?, ?)",
+            (book_id, entry.get('slug'), json.dumps(entry, ensure_ascii=False))
+        )
+
+    def record_usage(self, slug, language, model, usage, cached=False):
+        """Append the token usage of one summary generation"""
+        self._conn().execute(
+            "INSERT INTO summary_usage (slug, language, model, prompt_tokens, completion_tokens, cached, created_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, datetime('now'))",
+            (slug, language, model, usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0), int(bool(cached)))
+        )
+
+    def usage_totals(self):
+        """Total generations and tokens per model"""
+        rows = self._conn().execute(
+            "SELECT model, COUNT(*), SUM(prompt_tokens), SUM(completion_tokens)"
+            " FROM summary_usage WHERE cached = 0 GROUP BY model"
+        ).fetchall()
+        return {
+            model: {'generations': count, 'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens}
+            for model, count, prompt_tokens, completion_tokens in rows
+        }
+
+    def get(self, book_id, default=None):
+        row = self._conn().execute("SELECT data FROM processed_books WHERE book_id = ?", (book_id,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def find_by_slug(self, slug):
+        """Return (book_id, entry) pairs recorded for a slug"""
+        rows = self._conn().execute("SELECT book_id, data FROM processed_books WHERE slug = ?", (slug,)).fetchall()
+        return [(book_id, json.loads(data)) for book_id, data in rows]
+
+    def contains_many(self, book_ids):
+        """Return the subset of book_ids that have an entry, in one query"""
+        book_ids = [book_id for book_id in book_ids if book_id]
+        if not book_ids:
+            return set()
+        placeholders = ','.join('?' * len(book_ids))
+        rows = self._conn().execute(
+            f"SELECT book_id FROM processed_books WHERE book_id IN ({placeholders})", book_ids
+        ).fetchall()
+        return {row[0] for row in rows}
+
+    def items(self):
+        for book_id, data in self._conn().execute("SELECT book_id, data FROM processed_books"):
+            yield book_id, json.loads(data)
+
+    def keys(self):
+        return [row[0] for row in self._conn().execute("SELECT book_id FROM processed_books")]
+
+    def __getitem__(self, book_id):
+        entry = self.get(book_id)
+        if entry is None:
+            raise KeyError(book_id)
+        return entry
+
+    def __setitem__(self, book_id, entry):
+        self.upsert(book_id, entry)
+
+    def __contains__(self, book_id):
+        return self._conn().execute(
+            "SELECT 1 FROM processed_books WHERE book_id = ?", (book_id,)
+        ).fetchone() is not None
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM processed_books").fetchone()[0]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def import_json(self, json_path):
+        """Import entries from a legacy processed_books.json in one transaction"""
+        with open(json_path, 'r', encoding='utf-8') as f:
+            books = json.load(f)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO processed_books (book_id, slug, data) VALUES (?, ?, ?)",
+                [(book_id, entry.get('slug'), json.dumps(entry, ensure_ascii=False)) for book_id, entry in books.items()]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        logger.info(f"Imported {len(books)} processed books from {json_path}")
+        return len(books)
+
+
+def open_store(db_path, legacy_json=None):
+    """Open the store, importing legacy_json once if the store is still empty"""
+    store = ProcessedBookStore(db_path)
+    if legacy_json and os.path.exists(legacy_json) and len(store) == 0:
+        try:
+            store.import_json(legacy_json)
+        except Exception as e:
+            logger.error(f"Error importing processed books from {legacy_json}: {e}")
+    return store
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 4 or sys.argv[1] != 'import':
+        print(__doc__)
+        sys.exit(1)
+    logging.basicConfig(level=logging.INFO)
+    count = ProcessedBookStore(sys.argv[3]).import_json(sys.argv[2])
+    print(f"Imported {count} processed books")
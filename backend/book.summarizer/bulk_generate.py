@@ -0,0 +1,197 @@
+"""Generate summaries for a list of books in bulk.
+
+    python bulk_generate.py books.jsonl --concurrency 8 --rpm 500 --tpm 160000
+
+The input is JSONL or CSV with title, authors, bookId and languages
+columns (authors and languages may be lists or comma-separated strings;
+languages defaults to english). Progress is checkpointed to a JSONL file
+next to the input, so re-running the same command resumes where a
+crashed or interrupted run stopped.
+"""
+import os
+import csv
+import json
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import app
+from upstream import TokenBucket
+from prompts import count_message_tokens
+
+logger = logging.getLogger(__name__)
+
+# Rough token estimate for a summary completion, used to reserve TPM budget
+# before the call; the real usage is settled afterwards.
+EXPECTED_COMPLETION_TOKENS = 1200
+
+
+def _split(value):
+    if isinstance(value, list):
+        return [str(v).strip() for v in value if str(v).strip()]
+    return [part.strip() for part in str(value or '').split(',') if part.strip()]
+
+
+def read_books(path):
+    """Yield one task dict per (book, language) from a JSONL or CSV file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.lower().endswith('.csv'):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for row in rows:
+            title = (row.get('title') or '').strip()
+            if not title:
+                continue
+            authors = _split(row.get('authors')) or ['Unknown']
+            for language in _split(row.get('languages')) or ['english']:
+                yield {
+                    'title': title,
+                    'authors': authors,
+                    'bookId': row.get('bookId') or row.get('id'),
+                    'language': language.lower(),
+                    'description': row.get('description', '')
+                }
+
+
+def task_key(task):
+    return f"{task['bookId'] or app.make_slug(task['title'])}:{task['language']}"
+
+
+def load_checkpoint(path):
+    """Return the keys of tasks already completed in earlier runs"""
+    done = set()
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn last line after a crash
+                if entry.get('status') in ('done', 'skipped'):
+                    done.add(entry['key'])
+    return done
+
+
+def already_generated(task):
+    """True if processed_books knows the book and its summary file exists"""
+    entry = app.book_service.processed_books.get(task['bookId']) if task['bookId'] else None
+    if not entry:
+        return False
+    slug = entry.get('slug') or app.make_slug(task['title'])
+    return app.book_service.summary_index.has(slug, task['language'])
+
+
+class BulkGenerator:
+    """Run summary generations with bounded concurrency under RPM/TPM budgets"""
+
+    def __init__(self, checkpoint_path, concurrency=4, rpm=60, tpm=60000,
+                 prompt_price=0.0005, completion_price=0.0015):
+        self.checkpoint_path = checkpoint_path
+        self.concurrency = concurrency
+        self.requests_budget = TokenBucket.per_minute(rpm)
+        self.tokens_budget = TokenBucket.per_minute(tpm)
+        self.prompt_price = prompt_price
+        self.completion_price = completion_price
+        self._lock = threading.Lock()
+        self.stats = {'done': 0, 'skipped': 0, 'failed': 0, 'cached': 0, 'resumed': 0,
+                      'prompt_tokens': 0, 'completion_tokens': 0}
+
+    def _checkpoint(self, key, status, **extra):
+        with self._lock:
+            with open(self.checkpoint_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(dict(extra, key=key, status=status)) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self.stats[status] += 1
+
+    def _run(self, task):
+        key = task_key(task)
+        prepared = app.prepare_summary(task['title'], task['authors'], task['language'], task['description'])
+        estimate = (count_message_tokens(prepared['messages'], prepared['profile']['model'])
+                    + (prepared['profile'].get('max_tokens') or EXPECTED_COMPLETION_TOKENS))
+        self.requests_budget.acquire()
+        self.tokens_budget.acquire(estimate)
+        try:
+            result = app.generate_summary_result(
+                task['title'], task['authors'], task['language'], task['description'],
+                book_id=task['bookId']
+            )
+        except Exception as e:
+            self.tokens_budget.adjust(-estimate)
+            logger.error(f"Failed to generate {key}: {e}")
+            self._checkpoint(key, 'failed', error=str(e))
+            return
+        usage = result['usage']
+        if result['cached']:
+            self.tokens_budget.adjust(-estimate)
+            with self._lock:
+                self.stats['cached'] += 1
+        else:
+            self.tokens_budget.adjust(usage.get('total_tokens', estimate) - estimate)
+            with self._lock:
+                self.stats['prompt_tokens'] += usage.get('prompt_tokens', 0)
+                self.stats['completion_tokens'] += usage.get('completion_tokens', 0)
+        self._checkpoint(key, 'done', slug=result['slug'], usage=usage, cached=result['cached'])
+
+    def run(self, tasks):
+        completed = load_checkpoint(self.checkpoint_path)
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = []
+            for task in tasks:
+                key = task_key(task)
+                if key in completed:
+                    self.stats['resumed'] += 1
+                    continue
+                if already_generated(task):
+                    self._checkpoint(key, 'skipped')
+                    continue
+                futures.append(executor.submit(self._run, task))
+            for future in as_completed(futures):
+                future.result()
+        return self.report(time.monotonic() - started)
+
+    def report(self, elapsed):
+        stats = dict(self.stats)
+        cost = (stats['prompt_tokens'] / 1000 * self.prompt_price
+                + stats['completion_tokens'] / 1000 * self.completion_price)
+        stats.update({
+            'elapsed_seconds': round(elapsed, 1),
+            'books_per_minute': round(stats['done'] / elapsed * 60, 2) if elapsed else 0.0,
+            'tokens_per_minute': round((stats['prompt_tokens'] + stats['completion_tokens']) / elapsed * 60) if elapsed else 0,
+            'estimated_cost_usd': round(cost, 4)
+        })
+        return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate book summaries in bulk")
+    parser.add_argument('input', help="JSONL or CSV file of books")
+    parser.add_argument('--checkpoint', help="Checkpoint file (default: <input>.checkpoint.jsonl)")
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--rpm', type=int, default=60, help="OpenAI requests per minute")
+    parser.add_argument('--tpm', type=int, default=60000, help="OpenAI tokens per minute")
+    parser.add_argument('--prompt-price', type=float, default=0.0005, help="USD per 1K prompt tokens")
+    parser.add_argument('--completion-price', type=float, default=0.0015, help="USD per 1K completion tokens")
+    args = parser.parse_args()
+    # Same handlers as the app, so per-book failures reach LOG_FILE too
+    app.configure_logging()
+
+    generator = BulkGenerator(
+        args.checkpoint or f"{args.input}.checkpoint.jsonl",
+        concurrency=args.concurrency,
+        rpm=args.rpm,
+        tpm=args.tpm,
+        prompt_price=args.prompt_price,
+        completion_price=args.completion_price
+    )
+    report = generator.run(read_books(args.input))
+    logger.info(f"Bulk generation finished: {json.dumps(report)}")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,516 @@
+"""Local catalog of Open Library works, authors and editions.
+
+Built from the Open Library data dumps (https://openlibrary.org/developers/dumps)
+so that search and book details can be answered without calling the API:
+
+    python catalog.py import ol_dump_authors_latest.txt.gz ol_dump_works_latest.txt.gz \\
+        ol_dump_editions_latest.txt.gz [--db PATH] [--full]
+
+Dumps are read line by line, gzipped or not, either in the dump's own
+tab-separated format (type, key, revision, last_modified, JSON) or as one
+JSON record per line, and written in batches, so memory stays flat however
+many gigabytes a dump is. The catalog keeps titles, normalized author
+names, ISBN-10/13, subjects and cover ids in SQLite, with an FTS5 index
+over titles, authors and subjects.
+
+Imports are incremental. Each record type remembers the newest
+last_modified it has applied, and later imports skip older lines without
+parsing them; a record only replaces a stored one with a higher revision.
+Importing next month's dumps therefore only writes what changed. Pass
+--full to ignore the watermarks, e.g. after having imported a partial
+dump. Authors are best imported before works: works imported first are
+re-indexed as their authors arrive, which costs time.
+
+The database defaults to OUTPUT_DIR/_data/catalog.sqlite3, with OUTPUT_DIR
+taken from the environment as for the app.
+"""
+import os
+import re
+import gzip
+import json
+import heapq
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+import unicodedata
+from datetime import datetime
+
+from summary_search import build_match_query
+
+logger = logging.getLogger(__name__)
+
+KINDS = {'/works/': 'work', '/authors/': 'author', '/books/': 'edition'}
+RECORD_TYPES = {'/type/work': 'work', '/type/author': 'author', '/type/edition': 'edition'}
+REMOVED_TYPES = ('/type/delete', '/type/redirect')
+
+# bm25() weights for the title, authors and subjects columns
+RANK_WEIGHTS = (10.0, 5.0, 1.0)
+# Subjects kept per work, and per row of the full-text index
+MAX_SUBJECTS = 50
+# Matches ranked per search pass; the rest of a very common query's matches are ignored
+MAX_CANDIDATES = 5000
+BATCH_SIZE = 5000
+
+YEAR_RE = re.compile(r'\b(\d{4})\b')
+ISBN_CHARS_RE = re.compile(r'[^0-9Xx]')
+ISBN_QUERY_RE = re.compile(r'^(?:\d{9}[\dXx]|\d{13})$')
+NON_WORD_RE = re.compile(r'[^\w]+', re.UNICODE)
+
+
+def normalize_author(name):
+    """Lowercase, accent-free, punctuation-free 'first last' form of an author name"""
+    name = (name or '').strip()
+    if name.count(',') == 1:
+        last, first = (part.strip() for part in name.split(','))
+        if first and last:
+            name = f"{first} {last}"
+    name = ''.join(c for c in unicodedata.normalize('NFKD', name) if not unicodedata.combining(c))
+    return ' '.join(NON_WORD_RE.sub(' ', name.lower()).split())
+
+
+def normalize_isbn(value):
+    isbn = ISBN_CHARS_RE.sub('', str(value or '')).upper()
+    return isbn if len(isbn) in (10, 13) else None
+
+
+def text_value(value):
+    """Open Library text fields are either strings or {'type': '/type/text', 'value': ...}"""
+    if isinstance(value, dict):
+        return value.get('value', '')
+    return value if isinstance(value, str) else ''
+
+
+def first_year(*values):
+    for value in values:
+        match = YEAR_RE.search(text_value(value) or '')
+        if match:
+            return int(match.group(1))
+    return None
+
+
+def author_keys(refs):
+    """Author keys from a work's [{'author': {'key': ...}}] or an edition's [{'key': ...}]"""
+    keys = []
+    for ref in refs or []:
+        if isinstance(ref, dict):
+            ref = ref.get('author', ref)
+            ref = ref.get('key') if isinstance(ref, dict) else ref
+        if isinstance(ref, str) and ref.startswith('/authors/') and ref not in keys:
+            keys.append(ref)
+    return keys
+
+
+def open_dump(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', errors='replace')
+    return open(path, 'r', encoding='utf-8', errors='replace')
+
+
+def parse_line(line):
+    """(kind, type, key, revision, last_modified, raw JSON or record) for a dump line, or None
+
+    The JSON of tab-separated lines is left unparsed, so lines that turn
+    out to be skipped cost no parsing.
+    """
+    line = line.rstrip('\n')
+    if not line:
+        return None
+    if line.startswith('{'):
+        record = json.loads(line)
+        key = record.get('key', '')
+        record_type = record.get('type')
+        record_type = record_type.get('key') if isinstance(record_type, dict) else record_type
+        last_modified = text_value(record.get('last_modified')) or ''
+        revision = record.get('revision') or 0
+        data = record
+    else:
+        parts = line.split('\t', 4)
+        if len(parts) != 5:
+            return None
+        record_type, key, revision, last_modified, data = parts
+    kind = next((kind for prefix, kind in KINDS.items() if key.startswith(prefix)), None)
+    if kind is None:
+        return None
+    return kind, record_type, key, int(revision or 0), last_modified, data
+
+
+class Catalog:
+    """SQLite catalog of Open Library records, with full-text search over works"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._init_db()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS authors ("
+            " key TEXT PRIMARY KEY,"
+            " name TEXT NOT NULL,"
+            " normalized TEXT NOT NULL,"
+            " revision INTEGER NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS works ("
+            " id INTEGER PRIMARY KEY,"
+            " key TEXT NOT NULL UNIQUE,"
+            " title TEXT NOT NULL,"
+            " subtitle TEXT,"
+            " description TEXT,"
+            " subjects TEXT NOT NULL,"
+            " covers TEXT NOT NULL,"
+            " first_publish_year INTEGER,"
+            " revision INTEGER NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS work_authors ("
+            " work_key TEXT NOT NULL,"
+            " position INTEGER NOT NULL,"
+            " author_key TEXT NOT NULL,"
+            " PRIMARY KEY (work_key, position)) WITHOUT ROWID"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS work_authors_author ON work_authors (author_key)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS editions ("
+            " key TEXT PRIMARY KEY,"
+            " work_key TEXT,"
+            " data TEXT NOT NULL,"
+            " revision INTEGER NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS isbns ("
+            " isbn TEXT PRIMARY KEY,"
+            " edition_key TEXT NOT NULL) WITHOUT ROWID"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS isbns_edition ON isbns (edition_key)")
+        conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS works_fts USING fts5("
+            " title, authors, subjects,"
+            " tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS imports ("
+            " kind TEXT PRIMARY KEY,"
+            " last_modified TEXT NOT NULL,"
+            " imported_at TEXT NOT NULL)"
+        )
+
+    # -- import -------------------------------------------------------------
+
+    def watermarks(self):
+        return dict(self._conn().execute("SELECT kind, last_modified FROM imports"))
+
+    def import_dump(self, path, full=False, batch_size=BATCH_SIZE):
+        """Apply one dump file; returns {'read', 'skipped', 'written', 'removed'} counts"""
+        conn = self._conn()
+        watermarks = {} if full else self.watermarks()
+        newest = {}
+        counts = {'read': 0, 'skipped': 0, 'written': 0, 'removed': 0}
+        pending = 0
+        started = time.monotonic()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            with open_dump(path) as f:
+                for line in f:
+                    counts['read'] += 1
+                    try:
+                        parsed = parse_line(line)
+                    except ValueError as e:
+                        logger.warning(f"Skipping unreadable line {counts['read']} of {path}: {e}")
+                        continue
+                    if parsed is None:
+                        continue
+                    kind, record_type, key, revision, last_modified, data = parsed
+                    if last_modified and last_modified <= watermarks.get(kind, ''):
+                        counts['skipped'] += 1
+                        continue
+                    if last_modified > newest.get(kind, ''):
+                        newest[kind] = last_modified
+                    if record_type in REMOVED_TYPES:
+                        if self._remove(conn, kind, key):
+                            counts['removed'] += 1
+                    elif RECORD_TYPES.get(record_type) == kind:
+                        record = json.loads(data) if isinstance(data, str) else data
+                        if getattr(self, f"_upsert_{kind}")(conn, key, revision, record):
+                            counts['written'] += 1
+                    pending += 1
+                    if pending >= batch_size:
+                        conn.execute("COMMIT")
+                        conn.execute("BEGIN IMMEDIATE")
+                        pending = 0
+                    if counts['read'] % 1000000 == 0:
+                        logger.info(f"{path}: {counts['read']} lines read, {counts['written']} records written"
+                                    f" ({time.monotonic() - started:.0f}s)")
+            # Watermarks only move once the whole file is in
+            for kind, last_modified in newest.items():
+                conn.execute(
+                    "INSERT INTO imports (kind, last_modified, imported_at) VALUES (?, ?, ?)"
+                    " ON CONFLICT(kind) DO UPDATE SET last_modified = excluded.last_modified,"
+                    " imported_at = excluded.imported_at WHERE excluded.last_modified > imports.last_modified",
+                    (kind, last_modified, datetime.now().isoformat())
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return counts
+
+    def _upsert_author(self, conn, key, revision, record):
+        name = (record.get('name') or record.get('personal_name') or '').strip()
+        if not name:
+            return False
+        cursor = conn.execute(
+            "INSERT INTO authors (key, name, normalized, revision) VALUES (?, ?, ?, ?)"
+            " ON CONFLICT(key) DO UPDATE SET name = excluded.name, normalized = excluded.normalized,"
+            " revision = excluded.revision WHERE excluded.revision > authors.revision",
+            (key, name, normalize_author(name), revision)
+        )
+        if not cursor.rowcount:
+            return False
+        for (work_key,) in conn.execute("SELECT work_key FROM work_authors WHERE author_key = ?", (key,)).fetchall():
+            self._index_work(conn, work_key)
+        return True
+
+    def _upsert_work(self, conn, key, revision, record):
+        title = (record.get('title') or '').strip()
+        if not title:
+            return False
+        subjects = [subject for subject in record.get('subjects') or [] if isinstance(subject, str)][:MAX_SUBJECTS]
+        covers = [cover for cover in record.get('covers') or [] if isinstance(cover, int) and cover > 0]
+        cursor = conn.execute(
+            "INSERT INTO works (key, title, subtitle, description, subjects, covers, first_publish_year, revision)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT(key) DO UPDATE SET title = excluded.title, subtitle = excluded.subtitle,"
+            " description = excluded.description, subjects = excluded.subjects, covers = excluded.covers,"
+            " first_publish_year = COALESCE(excluded.first_publish_year, works.first_publish_year),"
+            " revision = excluded.revision WHERE excluded.revision > works.revision",
+            (key, title, record.get('subtitle') or '', text_value(record.get('description')),
+             json.dumps(subjects, ensure_ascii=False), json.dumps(covers),
+             first_year(record.get('first_publish_date')), revision)
+        )
+        if not cursor.rowcount:
+            return False
+        conn.execute("DELETE FROM work_authors WHERE work_key = ?", (key,))
+        conn.executemany(
+            "INSERT INTO work_authors (work_key, position, author_key) VALUES (?, ?, ?)",
+            [(key, position, author_key) for position, author_key in enumerate(author_keys(record.get('authors')))]
+        )
+        self._index_work(conn, key)
+        return True
+
+    def _upsert_edition(self, conn, key, revision, record):
+        works = [ref.get('key') for ref in record.get('works') or [] if isinstance(ref, dict)]
+        work_key = works[0] if works else None
+        isbns = {
+            'isbn_10': [isbn for isbn in map(normalize_isbn, record.get('isbn_10') or []) if isbn],
+            'isbn_13': [isbn for isbn in map(normalize_isbn, record.get('isbn_13') or []) if isbn]
+        }
+        data = dict(isbns, **{
+            'title': record.get('title') or '',
+            'subtitle': record.get('subtitle') or '',
+            'description': text_value(record.get('description')),
+            'subjects': [subject for subject in record.get('subjects') or [] if isinstance(subject, str)],
+            'covers': [cover for cover in record.get('covers') or [] if isinstance(cover, int) and cover > 0],
+            'authors': author_keys(record.get('authors')),
+            'publish_date': text_value(record.get('publish_date')),
+            'publishers': record.get('publishers') or [],
+            'number_of_pages': record.get('number_of_pages'),
+            'physical_format': record.get('physical_format') or ''
+        })
+        cursor = conn.execute(
+            "INSERT INTO editions (key, work_key, data, revision) VALUES (?, ?, ?, ?)"
+            " ON CONFLICT(key) DO UPDATE SET work_key = excluded.work_key, data = excluded.data,"
+            " revision = excluded.revision WHERE excluded.revision > editions.revision",
+            (key, work_key, json.dumps(data, ensure_ascii=False), revision)
+        )
+        if not cursor.rowcount:
+            return False
+        conn.execute("DELETE FROM isbns WHERE edition_key = ?", (key,))
+        conn.executemany("INSERT OR REPLACE INTO isbns (isbn, edition_key) VALUES (?, ?)",
+                         [(isbn, key) for isbn in isbns['isbn_10'] + isbns['isbn_13']])
+        year = first_year(data['publish_date'])
+        if work_key and year:
+            conn.execute("UPDATE works SET first_publish_year = ? WHERE key = ?"
+                         " AND (first_publish_year IS NULL OR first_publish_year > ?)", (year, work_key, year))
+        return True
+
+    def _remove(self, conn, kind, key):
+        if kind == 'author':
+            removed = conn.execute("DELETE FROM authors WHERE key = ?", (key,)).rowcount
+            for (work_key,) in conn.execute("SELECT work_key FROM work_authors WHERE author_key = ?",
+                                            (key,)).fetchall():
+                self._index_work(conn, work_key)
+        elif kind == 'work':
+            row = conn.execute("SELECT id FROM works WHERE key = ?", (key,)).fetchone()
+            if row:
+                conn.execute("DELETE FROM works_fts WHERE rowid = ?", row)
+            removed = conn.execute("DELETE FROM works WHERE key = ?", (key,)).rowcount
+            conn.execute("DELETE FROM work_authors WHERE work_key = ?", (key,))
+        else:
+            removed = conn.execute("DELETE FROM editions WHERE key = ?", (key,)).rowcount
+            conn.execute("DELETE FROM isbns WHERE edition_key = ?", (key,))
+        return bool(removed)
+
+    def _index_work(self, conn, work_key):
+        row = conn.execute("SELECT id, title, subtitle, subjects FROM works WHERE key = ?", (work_key,)).fetchone()
+        if row is None:
+            return
+        work_id, title, subtitle, subjects = row
+        names = conn.execute(
+            "SELECT a.name, a.normalized FROM work_authors wa JOIN authors a ON a.key = wa.author_key"
+            " WHERE wa.work_key = ? ORDER BY wa.position", (work_key,)
+        ).fetchall()
+        conn.execute("DELETE FROM works_fts WHERE rowid = ?", (work_id,))
+        conn.execute(
+            "INSERT INTO works_fts (rowid, title, authors, subjects) VALUES (?, ?, ?, ?)",
+            (work_id, f"{title} {subtitle}".strip(), ' '.join(f"{name} {normalized}" for name, normalized in names),
+             ' '.join(json.loads(subjects)))
+        )
+
+    # -- lookups ------------------------------------------------------------
+
+    def _author_names(self, keys):
+        if not keys:
+            return []
+        placeholders = ', '.join('?' for _ in keys)
+        names = dict(self._conn().execute(f"SELECT key, name FROM authors WHERE key IN ({placeholders})", keys))
+        return [names[key] for key in keys if key in names]
+
+    def _work_authors(self, work_key):
+        return [key for (key,) in self._conn().execute(
+            "SELECT author_key FROM work_authors WHERE work_key = ? ORDER BY position", (work_key,))]
+
+    def _search_doc(self, key, title, subjects, covers, year):
+        covers = json.loads(covers)
+        doc = {
+            'key': key,
+            'title': title,
+            'author_name': self._author_names(self._work_authors(key)),
+            'subject': json.loads(subjects)
+        }
+        if year:
+            doc['first_publish_year'] = year
+        if covers:
+            doc['cover_i'] = covers[0]
+        return doc
+
+    def search(self, query, limit=10):
+        """Works matching a query (or an ISBN), as Open Library search.json docs"""
+        isbn = normalize_isbn(query) if ISBN_QUERY_RE.match(re.sub(r'[\s-]', '', query or '')) else None
+        if isbn:
+            return self._search_isbn(isbn)
+        match = build_match_query(query)
+        if match is None:
+            return []
+        # Title matches first: far fewer rows match a title than any column, so the canonical
+        # work is among the ranked candidates even for common words. Authors and subjects
+        # only fill the results up to limit.
+        title_matches = self._candidates(build_match_query(query, ('title',)))
+        ranked = heapq.nsmallest(limit, title_matches, key=lambda candidate: candidate[1])
+        if len(ranked) < limit:
+            seen = {work_id for work_id, _ in title_matches}
+            others = [candidate for candidate in self._candidates(match) if candidate[0] not in seen]
+            ranked += heapq.nsmallest(limit - len(ranked), others, key=lambda candidate: candidate[1])
+        conn = self._conn()
+        docs = []
+        for work_id, _ in ranked:
+            row = conn.execute("SELECT key, title, subjects, covers, first_publish_year FROM works WHERE id = ?",
+                               (work_id,)).fetchone()
+            if row:
+                docs.append(self._search_doc(*row))
+        return docs
+
+    def _candidates(self, match):
+        """(rowid, bm25) of the first MAX_CANDIDATES rows matching an FTS query
+
+        ORDER BY bm25() would score every match, which takes seconds for common
+        words in a full dump.
+        """
+        return self._conn().execute(
+            f"SELECT rowid, bm25(works_fts, {', '.join(str(weight) for weight in RANK_WEIGHTS)})"
+            f" FROM works_fts WHERE works_fts MATCH ? LIMIT ?", (match, MAX_CANDIDATES)
+        ).fetchall()
+
+    def _search_isbn(self, isbn):
+        row = self._conn().execute(
+            "SELECT e.data, w.key, w.title, w.subjects, w.covers, w.first_publish_year FROM isbns i"
+            " JOIN editions e ON e.key = i.edition_key JOIN works w ON w.key = e.work_key WHERE i.isbn = ?",
+            (isbn,)
+        ).fetchone()
+        if row is None:
+            return []
+        doc = self._search_doc(*row[1:])
+        covers = json.loads(row[0])['covers']
+        if covers:
+            doc['cover_i'] = covers[0]
+        return [doc]
+
+    def get_work(self, work_id):
+        """(work JSON, author names) for an id like 'OL45883W', or None"""
+        key = f"/works/{work_id}"
+        row = self._conn().execute(
+            "SELECT title, subtitle, description, subjects, covers FROM works WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        title, subtitle, description, subjects, covers = row
+        data = {'key': key, 'title': title, 'subtitle': subtitle, 'description': description,
+                'subjects': json.loads(subjects), 'covers': json.loads(covers)}
+        return data, self._author_names(self._work_authors(key))
+
+    def get_edition(self, edition_id):
+        """(edition JSON, author names) for an id like 'OL7353617M', or None"""
+        key = f"/books/{edition_id}"
+        row = self._conn().execute("SELECT work_key, data FROM editions WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        work_key, data = row
+        data = dict(json.loads(data), key=key)
+        authors = data.pop('authors') or (self._work_authors(work_key) if work_key else [])
+        return data, self._author_names(authors)
+
+    def stats(self):
+        conn = self._conn()
+        return {
+            table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ('works', 'authors', 'editions', 'isbns')
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['import', 'stats'])
+    parser.add_argument('dumps', nargs='*', help="dump files, applied in the order given")
+    parser.add_argument('--db', default=None, help="catalog database (default OUTPUT_DIR/_data/catalog.sqlite3)")
+    parser.add_argument('--full', action='store_true', help="apply every line, ignoring the import watermarks")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    db_path = args.db
+    if db_path is None:
+        import app
+        db_path = app.CATALOG_DB
+    catalog = Catalog(db_path)
+    for path in args.dumps if args.command == 'import' else []:
+        started = time.perf_counter()
+        counts = catalog.import_dump(path, full=args.full)
+        print(f"{path}: {counts['written']} written, {counts['removed']} removed,"
+              f" {counts['skipped']} unchanged of {counts['read']} lines in {time.perf_counter() - started:.1f}s")
+    print(json.dumps(catalog.stats()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+def leaf_codes(categories):
+    """Return the codes of every leaf in a category tree, without duplicates"""
+    codes = []
+    for category in categories:
+        subcategories = category.get('subcategories')
+        if subcategories:
+            codes.extend(leaf_codes(subcategories))
+        else:
+            codes.append(category['code'])
+    return list(dict.fromkeys(codes))
+
+
+class CategoryBrowser:
+    """Serve category pages from the response cache, prefetching ahead of the reader
+
+    fetch_page(code, page, limit) is expected to be cached (BookService's
+    get_books_by_category is), so a prefetched or warmed page costs a cache
+    lookup when it is finally requested.
+    """
+
+    def __init__(self, fetch_page, has_summaries, max_workers=4):
+        self.fetch_page = fetch_page
+        self.has_summaries = has_summaries
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="category")
+        self._inflight = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def get_page(self, code, page=1, limit=12):
+        """Return a category page and prefetch the next one in the background"""
+        result = self.fetch_page(code, page, limit)
+        if result.get('hasMore'):
+            self.prefetch(code, page + 1, limit)
+        # Cached pages are shared, so annotate a copy. hasSummary is resolved
+        # per request because new summaries appear between cache refreshes.
+        books = result.get('results', [])
+        with_summary = self.has_summaries([book['id'] for book in books])
+        return dict(result, results=[dict(book, hasSummary=book['id'] in with_summary) for book in books])
+
+    def prefetch(self, code, page, limit):
+        key = (code, page, limit)
+        with self._lock:
+            if key in self._inflight:
+                return
+            self._inflight.add(key)
+
+        def run():
+            try:
+                self.fetch_page(code, page, limit)
+            except Exception as e:
+                logger.warning(f"Prefetch of {code} page {page} failed: {e}")
+            finally:
+                with self._lock:
+                    self._inflight.discard(key)
+
+        self.executor.submit(run)
+
+    def warm(self, codes, limit=12):
+        """Fetch the first page of every code"""
+        for code in codes:
+            if self._stop.is_set():
+                return
+            try:
+                self.fetch_page(code, 1, limit)
+            except Exception as e:
+                logger.warning(f"Warm-up of category {code} failed: {e}")
+        logger.info(f"Warmed {len(codes)} categories")
+
+    def start_warmup(self, codes, interval, limit=12):
+        """Warm every code now and then every `interval` seconds on a daemon thread"""
+        def loop():
+            while not self._stop.is_set():
+                self.warm(codes, limit)
+                self._stop.wait(interval)
+
+        thread = threading.Thread(target=loop, name="category-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stop.set()
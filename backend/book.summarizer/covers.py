@@ -0,0 +1,370 @@
+"""Cover image proxy: a content-addressed disk cache of covers and their resized variants.
+
+Each upstream cover is fetched once. Originals and variants are stored
+under the SHA-256 of their bytes, so an image reached through several URLs,
+or a variant that came out no smaller than its original, is kept once.
+A SQLite index maps a source URL to its original and to each rendered
+(size, format) variant, and records when each blob was last served; once
+the blobs outgrow max_bytes the least recently served ones are deleted.
+
+Variants are scaled down and recompressed with Pillow, as WebP for
+clients that accept it and as JPEG otherwise. Without the optional Pillow
+package every size is served as the original image.
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from io import BytesIO
+from urllib.parse import urlsplit, urlencode, parse_qs
+
+from flask import Response
+
+from llm import SingleFlight
+
+try:
+    from PIL import Image, features
+except ImportError:  # optional: serve originals at every size
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Bounding box (width, height) of each variant; images are only scaled down
+VARIANTS = {
+    'list': (160, 240),
+    'detail': (400, 600)
+}
+QUALITY = {'webp': 80, 'jpeg': 82}
+# Open Library cover size to fetch for each variant, so a variant is never
+# rendered from a smaller image than it is meant to be
+OPEN_LIBRARY_SIZES = {'list': 'M', 'detail': 'L'}
+# Access times are only rewritten when older than this, so most hits don't write
+ACCESS_RESOLUTION = 3600
+# How long an upstream 404 or a body that isn't an image is remembered
+NEGATIVE_TTL = 24 * 3600
+MAX_SOURCE_BYTES = 5 * 1024 * 1024
+# Eviction deletes down to this fraction of max_bytes, so it doesn't run on every store
+EVICT_TO = 0.9
+
+SIGNATURES = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif')
+]
+EXTENSIONS = {'image/jpeg': 'jpg', 'image/png': 'png', 'image/gif': 'gif', 'image/webp': 'webp'}
+
+
+class CoverNotFound(Exception):
+    """The upstream has no usable image at this URL"""
+
+
+def sniff_type(data):
+    """The image MIME type of data from its magic bytes, or None
+
+    Upstream Content-Type headers are not trusted: anything that isn't a
+    raster image (an HTML error page, an SVG) is never served.
+    """
+    for signature, content_type in SIGNATURES:
+        if data.startswith(signature):
+            return content_type
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def source_url(url, variant):
+    """The upstream URL to fetch a variant from
+
+    Open Library serves covers in three sizes; the detail variant is
+    rendered from the large one whatever size the API response linked.
+    """
+    parts = urlsplit(url)
+    if parts.hostname == 'covers.openlibrary.org' and variant in OPEN_LIBRARY_SIZES:
+        stem, dash, suffix = parts.path.rpartition('-')
+        if dash and suffix in ('S.jpg', 'M.jpg', 'L.jpg'):
+            return parts._replace(path=f"{stem}-{OPEN_LIBRARY_SIZES[variant]}.jpg").geturl()
+    return url
+
+
+def proxy_url(base, url, variant='list'):
+    """URL of the cover proxy under base serving url at a variant size"""
+    return f"{base}/api/cover?{urlencode({'size': variant, 'url': url})}"
+
+
+def unproxied_url(url):
+    """The upstream URL behind a proxy_url(), or url unchanged"""
+    parts = urlsplit(url or '')
+    if parts.path.endswith('/api/cover'):
+        return parse_qs(parts.query).get('url', [url])[0]
+    return url
+
+
+class Cover:
+    """A cached image ready to be sent"""
+
+    def __init__(self, body, digest, content_type, cache_control):
+        self.body = body
+        self.etag = digest[:32]
+        self.content_type = content_type
+        self.cache_control = cache_control
+
+    def send(self, request):
+        """Build the Flask response for a request, honouring If-None-Match"""
+        headers = {
+            'ETag': f'"{self.etag}"',
+            'Cache-Control': self.cache_control,
+            # The format depends on whether the client accepts WebP
+            'Vary': 'Accept'
+        }
+        if self.etag in request.if_none_match:
+            return Response(status=304, headers=headers)
+        return Response(self.body, mimetype=self.content_type, headers=headers)
+
+
+class CoverStore:
+    """Fetch-once cover cache with resized variants and size-based LRU eviction
+
+    fetch(url) returns a requests-style response. Only http(s) URLs on
+    allowed_hosts are fetched, so the proxy can't be pointed elsewhere.
+    """
+
+    def __init__(self, cache_dir, fetch, allowed_hosts, max_bytes=512 * 1024 * 1024,
+                 cache_control='public, max-age=31536000, immutable'):
+        self.cache_dir = cache_dir
+        self.blob_dir = os.path.join(cache_dir, 'blobs')
+        self.db_path = os.path.join(cache_dir, 'covers.sqlite3')
+        self.fetch = fetch
+        self.allowed_hosts = set(allowed_hosts)
+        self.max_bytes = max_bytes
+        self.cache_control = cache_control
+        self.webp = Image is not None and features.check('webp')
+        self.flights = SingleFlight()
+        self._local = threading.local()
+        self._evict_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.counters = {
+            'hits': 0,
+            'fetches': 0,
+            'renders': 0,
+            'not_found': 0,
+            'evictions': 0
+        }
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self._init_db()
+
+    # -- SQLite index -------------------------------------------------------
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        self._conn().executescript(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            " digest TEXT PRIMARY KEY,"
+            " content_type TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_access REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS blobs_last_access ON blobs (last_access);"
+            # digest is NULL while the upstream is known to have no image
+            "CREATE TABLE IF NOT EXISTS sources ("
+            " url TEXT PRIMARY KEY,"
+            " digest TEXT,"
+            " fetched_at REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS variants ("
+            " url TEXT NOT NULL,"
+            " variant TEXT NOT NULL,"
+            " format TEXT NOT NULL,"
+            " digest TEXT NOT NULL,"
+            " PRIMARY KEY (url, variant, format));"
+            "CREATE INDEX IF NOT EXISTS variants_digest ON variants (digest);"
+        )
+
+    def _count(self, name):
+        with self._stats_lock:
+            self.counters[name] += 1
+
+    # -- blobs --------------------------------------------------------------
+
+    def _path(self, digest, content_type):
+        return os.path.join(self.blob_dir, digest[:2], f"{digest}.{EXTENSIONS[content_type]}")
+
+    def _read(self, digest, content_type, last_access):
+        """The blob's bytes, or None if it has been evicted; refreshes its access time"""
+        try:
+            with open(self._path(digest, content_type), 'rb') as f:
+                body = f.read()
+        except FileNotFoundError:
+            return None
+        now = time.time()
+        if last_access < now - ACCESS_RESOLUTION:
+            self._conn().execute("UPDATE blobs SET last_access = ? WHERE digest = ?", (now, digest))
+        return body
+
+    def _write(self, body, content_type):
+        """Store body under its digest and return the digest"""
+        digest = hashlib.sha256(body).hexdigest()
+        path = self._path(digest, content_type)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(body)
+            os.replace(tmp_path, path)
+        self._conn().execute(
+            "INSERT INTO blobs (digest, content_type, size, last_access) VALUES (?, ?, ?, ?)"
+            " ON CONFLICT (digest) DO UPDATE SET last_access = excluded.last_access",
+            (digest, content_type, len(body), time.time())
+        )
+        return digest
+
+    def _evict(self):
+        """Delete the least recently served blobs until they fit in max_bytes again"""
+        with self._evict_lock:
+            conn = self._conn()
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            target = self.max_bytes * EVICT_TO
+            for digest, content_type, size in conn.execute(
+                "SELECT digest, content_type, size FROM blobs ORDER BY last_access"
+            ).fetchall():
+                if total <= target:
+                    break
+                conn.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+                conn.execute("DELETE FROM sources WHERE digest = ?", (digest,))
+                conn.execute("DELETE FROM variants WHERE digest = ?", (digest,))
+                try:
+                    os.remove(self._path(digest, content_type))
+                except FileNotFoundError:
+                    pass
+                total -= size
+                self._count('evictions')
+
+    # -- lookups ------------------------------------------------------------
+
+    def allows(self, url):
+        parts = urlsplit(url or '')
+        return parts.scheme in ('http', 'https') and parts.hostname in self.allowed_hosts
+
+    def format_for(self, accept):
+        """Variant format for a request's Accept header; 'original' without Pillow"""
+        if Image is None:
+            return 'original'
+        # Only an explicit mention counts: */* doesn't mean the browser decodes WebP
+        return 'webp' if self.webp and 'image/webp' in (accept or '') else 'jpeg'
+
+    def get(self, url, variant='list', accept=''):
+        """The Cover for url at a variant size, fetched and rendered on a miss
+
+        Raises CoverNotFound when the upstream has no usable image, and
+        lets upstream errors propagate.
+        """
+        fmt = self.format_for(accept)
+        cover = self._lookup(url, variant, fmt)
+        if cover is not None:
+            self._count('hits')
+            return cover
+        return self.flights.do(f"{url}\n{variant}\n{fmt}", lambda: self._build(url, variant, fmt))
+
+    def _lookup(self, url, variant, fmt):
+        row = self._conn().execute(
+            "SELECT b.digest, b.content_type, b.last_access FROM variants v JOIN blobs b ON b.digest = v.digest"
+            " WHERE v.url = ? AND v.variant = ? AND v.format = ?",
+            (url, variant, fmt)
+        ).fetchone()
+        if row is None:
+            return None
+        body = self._read(*row)
+        if body is None:
+            return None
+        return Cover(body, row[0], row[1], self.cache_control)
+
+    def _build(self, url, variant, fmt):
+        # A leader that lost the race to a finished flight finds it here
+        cover = self._lookup(url, variant, fmt)
+        if cover is not None:
+            return cover
+        body, digest, content_type = self._original(source_url(url, variant))
+        if fmt != 'original':
+            rendered = self._render(body, VARIANTS[variant], fmt)
+            # A small original is served as it is, unless it's WebP and the client can't take that
+            if rendered is not None and (len(rendered) < len(body) or (content_type == 'image/webp' and fmt != 'webp')):
+                body, content_type = rendered, f"image/{fmt}"
+                digest = self._write(body, content_type)
+                self._count('renders')
+        self._conn().execute(
+            "INSERT OR REPLACE INTO variants (url, variant, format, digest) VALUES (?, ?, ?, ?)",
+            (url, variant, fmt, digest)
+        )
+        self._evict()
+        return Cover(body, digest, content_type, self.cache_control)
+
+    def _original(self, url):
+        """(body, digest, content_type) of the upstream image, fetched only if it isn't stored"""
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT s.digest, s.fetched_at, b.content_type, b.last_access FROM sources s"
+            " LEFT JOIN blobs b ON b.digest = s.digest WHERE s.url = ?",
+            (url,)
+        ).fetchone()
+        if row is not None:
+            digest, fetched_at, content_type, last_access = row
+            if digest is None and fetched_at > time.time() - NEGATIVE_TTL:
+                raise CoverNotFound(url)
+            if content_type is not None:
+                body = self._read(digest, content_type, last_access)
+                if body is not None:
+                    return body, digest, content_type
+
+        self._count('fetches')
+        response = self.fetch(url)
+        content_type = None
+        if response.status_code == 200 and len(response.content) <= MAX_SOURCE_BYTES:
+            content_type = sniff_type(response.content)
+        elif response.status_code not in (404, 410):
+            response.raise_for_status()
+            raise CoverNotFound(f"{url} returned {response.status_code}")
+        if content_type is None:
+            conn.execute("INSERT OR REPLACE INTO sources (url, digest, fetched_at) VALUES (?, NULL, ?)",
+                         (url, time.time()))
+            self._count('not_found')
+            raise CoverNotFound(url)
+        body = response.content
+        digest = self._write(body, content_type)
+        conn.execute("INSERT OR REPLACE INTO sources (url, digest, fetched_at) VALUES (?, ?, ?)",
+                     (url, digest, time.time()))
+        return body, digest, content_type
+
+    @staticmethod
+    def _render(body, box, fmt):
+        """body scaled down to fit box and recompressed as fmt, or None if it can't be decoded"""
+        try:
+            image = Image.open(BytesIO(body))
+            # Let the JPEG decoder skip straight to a nearby scale
+            image.draft('RGB', box)
+            image = image.convert('RGB')
+            image.thumbnail(box, Image.LANCZOS)
+            output = BytesIO()
+            if fmt == 'webp':
+                image.save(output, 'WEBP', quality=QUALITY['webp'], method=6)
+            else:
+                image.save(output, 'JPEG', quality=QUALITY['jpeg'], optimize=True, progressive=True)
+            return output.getvalue()
+        except Exception as e:
+            logger.warning(f"Could not resize cover image: {e}")
+            return None
+
+    def stats(self):
+        blobs, size = self._conn().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        with self._stats_lock:
+            return dict(self.counters, blobs=blobs, bytes=size, max_bytes=self.max_bytes,
+                        resizing=Image is not None, webp=self.webp)
@@ -0,0 +1,101 @@
+"""Pre-serialized, pre-compressed response bodies with strong ETags.
+
+A PreparedBody holds a response body together with its gzip and (when the
+optional brotli package is installed) brotli encodings, so a hit costs a
+dict lookup instead of a file read and a compression pass. send() answers
+If-None-Match with 304 and picks the smallest encoding the client accepts.
+"""
+import os
+import gzip
+import hashlib
+import logging
+
+from flask import Response
+
+from cache import TTLCache
+
+try:
+    import brotli
+except ImportError:  # optional: serve gzip only
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 256
+
+
+class PreparedBody:
+    """A response body in every encoding we serve, with a strong ETag"""
+
+    def __init__(self, body, mimetype, cache_control='public, max-age=300'):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.encodings = {'identity': body}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            self.encodings['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.encodings['br'] = brotli.compress(body, quality=11)
+
+    def send(self, request, status=200):
+        """Build the Flask response for a request, honouring If-None-Match and Accept-Encoding"""
+        headers = {
+            'ETag': f'"{self.etag}"',
+            'Cache-Control': self.cache_control,
+            'Vary': 'Accept-Encoding'
+        }
+        if status == 200 and self.etag in request.if_none_match:
+            return Response(status=304, headers=headers)
+        encoding = 'identity'
+        for candidate in ('br', 'gzip'):
+            if candidate in self.encodings and request.accept_encodings[candidate] > 0:
+                encoding = candidate
+                break
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        response = Response(self.encodings[encoding], status=status, mimetype=self.mimetype, headers=headers)
+        # Compressed bytes must not be re-encoded by middleware further down
+        response.direct_passthrough = True
+        return response
+
+
+class FileBodyCache:
+    """PreparedBody per file, revalidated against the file's mtime and size
+
+    Revalidation is a single stat() call, so a hit never reads the file or
+    compresses it again; files rewritten by other worker processes are
+    picked up on the next request.
+    """
+
+    def __init__(self, mimetype, cache_control='public, max-age=300', maxsize=1024):
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        self.cache = TTLCache(maxsize=maxsize, ttl=24 * 3600)
+
+    def get(self, path):
+        """Return the PreparedBody for path; raises FileNotFoundError if it is gone"""
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        entry = self.cache.get(path)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        with open(path, 'rb') as f:
+            prepared = PreparedBody(f.read(), self.mimetype, self.cache_control)
+        self.cache.set(path, (version, prepared))
+        return prepared
+
+    def put(self, path, body):
+        """Prepare a body that was just written to path"""
+        prepared = PreparedBody(body, self.mimetype, self.cache_control)
+        try:
+            stat = os.stat(path)
+            self.cache.set(path, ((stat.st_mtime_ns, stat.st_size), prepared))
+        except OSError as e:
+            logger.warning(f"Could not stat {path}: {e}")
+        return prepared
+
+    def discard(self, path):
+        self.cache.pop(path)
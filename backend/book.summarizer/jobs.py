@@ -0,0 +1,196 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class QueueFull(Exception):
+    """Raised when the job queue already holds max_pending unfinished jobs"""
+
+
+class JobQueue:
+    """Persistent background job queue run by a bounded worker pool
+
+    Jobs are stored in SQLite, so several processes can share one queue.
+    A running job is leased to the process running it, which renews the
+    lease while it is alive. Queued jobs, and running jobs whose lease
+    has run out because their process died, are claimed again by
+    whichever process gets to them first, so a job that is still running
+    somewhere is never started twice.
+    """
+
+    def __init__(self, db_path, handler, max_workers=2, max_pending=200, lease=60.0):
+        self.db_path = db_path
+        self.handler = handler
+        self.max_pending = max_pending
+        self.lease = lease
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="jobs")
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Jobs handed to this process's executor and not finished yet
+        self._scheduled = set()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._init_db()
+        self._recover(startup=True)
+        threading.Thread(target=self._heartbeat, name="jobs-heartbeat", daemon=True).start()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " dedupe_key TEXT,"
+            " params TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " result TEXT,"
+            " error TEXT,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        columns = {row['name'] for row in self._conn().execute("PRAGMA table_info(jobs)")}
+        # Queues created before leases were added
+        if 'worker' not in columns:
+            self._conn().execute("ALTER TABLE jobs ADD COLUMN worker TEXT")
+        if 'heartbeat' not in columns:
+            self._conn().execute("ALTER TABLE jobs ADD COLUMN heartbeat REAL")
+        self._conn().execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+        self._conn().execute("CREATE INDEX IF NOT EXISTS jobs_dedupe ON jobs (dedupe_key, status)")
+
+    def _recover(self, startup=False):
+        """Run jobs whose lease has expired, and queued jobs no process has picked up
+
+        At startup every queued job is taken over; later only those that
+        have waited longer than a lease, so busy processes keep their own.
+        """
+        expired = time.time() - self.lease
+        rows = self._conn().execute(
+            "SELECT id FROM jobs WHERE (status = ? AND updated_at < ?)"
+            " OR (status = ? AND (heartbeat IS NULL OR heartbeat < ?)) ORDER BY created_at",
+            (QUEUED, time.time() if startup else expired, RUNNING, expired)
+        ).fetchall()
+        recovered = [row['id'] for row in rows if self._schedule(row['id'])]
+        if recovered:
+            logger.info(f"Recovered {len(recovered)} unfinished jobs")
+
+    def _heartbeat(self):
+        """Renew the leases of this process's running jobs and recover abandoned ones"""
+        while True:
+            time.sleep(self.lease / 3)
+            try:
+                self._conn().execute(
+                    "UPDATE jobs SET heartbeat = ? WHERE worker = ? AND status = ?",
+                    (time.time(), self.worker_id, RUNNING)
+                )
+                self._recover()
+            except sqlite3.Error as e:
+                logger.warning(f"Job lease renewal failed: {e}")
+
+    def _set_status(self, job_id, status, result=None, error=None):
+        """Finish a job, unless its lease was lost to another process"""
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ? AND worker = ?",
+            (status, result, error, time.time(), job_id, self.worker_id)
+        )
+
+    def pending(self):
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+        ).fetchone()[0]
+
+    def counts(self):
+        """Number of jobs in each status"""
+        rows = self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def submit(self, params, dedupe_key=None):
+        """Queue a job and return its id; an unfinished job with the same dedupe_key is reused"""
+        with self._lock:
+            if dedupe_key:
+                row = self._conn().execute(
+                    "SELECT id FROM jobs WHERE dedupe_key = ? AND status IN (?, ?)",
+                    (dedupe_key, QUEUED, RUNNING)
+                ).fetchone()
+                if row:
+                    return row['id']
+            if self.pending() >= self.max_pending:
+                raise QueueFull(f"{self.max_pending} jobs already pending")
+            job_id = uuid.uuid4().hex
+            now = time.time()
+            self._conn().execute(
+                "INSERT INTO jobs (id, dedupe_key, params, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, dedupe_key, json.dumps(params), QUEUED, now, now)
+            )
+        self._schedule(job_id)
+        return job_id
+
+    def _schedule(self, job_id):
+        """Hand a job to the executor unless it is already waiting there"""
+        with self._lock:
+            if job_id in self._scheduled:
+                return False
+            self._scheduled.add(job_id)
+        self.executor.submit(self._run, job_id)
+        return True
+
+    def _claim(self, job_id):
+        """Atomically lease a queued or abandoned job; False if another worker has it"""
+        now = time.time()
+        cursor = self._conn().execute(
+            "UPDATE jobs SET status = ?, worker = ?, heartbeat = ?, updated_at = ? WHERE id = ?"
+            " AND (status = ? OR (status = ? AND (heartbeat IS NULL OR heartbeat < ?)))",
+            (RUNNING, self.worker_id, now, now, job_id, QUEUED, RUNNING, now - self.lease)
+        )
+        return cursor.rowcount == 1
+
+    def _run(self, job_id):
+        try:
+            if not self._claim(job_id):
+                return
+            job = self.get(job_id)
+            try:
+                result = self.handler(job['params'])
+                self._set_status(job_id, DONE, result=result)
+            except Exception as e:
+                logger.error(f"Job {job_id} failed: {e}")
+                self._set_status(job_id, FAILED, error=str(e))
+        finally:
+            with self._lock:
+                self._scheduled.discard(job_id)
+
+    def get(self, job_id, with_result=False):
+        """Return a job as a dict, or None if it does not exist"""
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = {
+            'id': row['id'],
+            'status': row['status'],
+            'params': json.loads(row['params']),
+            'error': row['error'],
+            'createdAt': row['created_at'],
+            'updatedAt': row['updated_at']
+        }
+        if with_result:
+            job['result'] = row['result']
+        return job
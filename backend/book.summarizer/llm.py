@@ -0,0 +1,305 @@
+import os
+import json
+import asyncio
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future
+from datetime import datetime
+
+import metrics
+from prompts import count_message_tokens, count_tokens
+
+logger = logging.getLogger(__name__)
+
+completion_lookups = metrics.registry.counter(
+    'llm_completion_cache_total', 'Completion cache lookups by outcome', labels=('outcome',)
+)
+
+
+class ReplayMiss(Exception):
+    """Raised in replay mode when a completion is not in the cache"""
+
+
+def prompt_hash(**fields):
+    """Content hash of the fields that determine a completion"""
+    payload = json.dumps(fields, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one execution"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def inflight(self):
+        with self._lock:
+            return len(self._inflight)
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines running on one event loop"""
+
+    def __init__(self):
+        self._inflight = {}
+
+    async def do(self, key, fn):
+        future = self._inflight.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            # Nobody may be waiting on the future; don't warn about an unretrieved exception
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def inflight(self):
+        return len(self._inflight)
+
+
+class CompletionCache:
+    """Content-addressed on-disk store of chat completions"""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Unreadable cached completion {key}: {e}")
+            return None
+
+    def put(self, key, record):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(record, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+class CompletionStream:
+    """Content deltas of a streamed completion
+
+    Once the deltas are exhausted, `completion` holds the same
+    {'content', 'usage', 'model', 'cached'} dict complete() returns.
+    """
+
+    def __init__(self, deltas):
+        self.completion = None
+        self._deltas = deltas
+
+    def __iter__(self):
+        self.completion = yield from self._deltas
+
+
+def is_retryable_openai_error(error):
+    """True for OpenAI errors that signal an unhealthy or overloaded upstream"""
+    import openai
+    retryable = tuple(
+        getattr(openai.error, name) for name in
+        ('RateLimitError', 'APIConnectionError', 'Timeout', 'ServiceUnavailableError', 'APIError')
+        if hasattr(openai.error, name)
+    )
+    return isinstance(error, retryable)
+
+
+class LLMClient:
+    """OpenAI chat completions with single-flight coalescing and a content-addressed cache
+
+    In replay mode only cached completions are served; a miss raises
+    ReplayMiss instead of calling OpenAI, which keeps load tests
+    deterministic and free.
+    """
+
+    def __init__(self, cache_dir, replay=False, upstream=None, api_key=None):
+        self.cache = CompletionCache(cache_dir)
+        self.replay = replay
+        # Passed with each call; openai itself is imported on the first one
+        self.api_key = api_key
+        self.flights = SingleFlight()
+        self.async_flights = AsyncSingleFlight()
+        # Pooled aiohttp.ClientSession for acomplete(), set by the ASGI entry point
+        self.aiosession = None
+        # Optional upstream.UpstreamClient adding timeouts, rate limiting,
+        # retries and a circuit breaker around every OpenAI call
+        self.upstream = upstream
+
+    def _create_completion(self, **kwargs):
+        import openai
+        if self.api_key:
+            kwargs.setdefault('api_key', self.api_key)
+        site = 'openai_stream' if kwargs.get('stream') else 'openai_completion'
+        with metrics.call_site(site):
+            if self.upstream is None:
+                return openai.ChatCompletion.create(**kwargs)
+            kwargs.setdefault('request_timeout', self.upstream.timeout)
+            return self.upstream.call(
+                lambda: openai.ChatCompletion.create(**kwargs),
+                retryable=is_retryable_openai_error
+            )
+
+    def complete(self, model, messages, temperature=0.7, key=None, **kwargs):
+        """Return {'content', 'usage', 'model', 'cached'} for a chat completion"""
+        key = key or prompt_hash(model=model, messages=messages, temperature=temperature)
+        record = self.cache.get(key)
+        if record is not None:
+            completion_lookups.inc(outcome='hit')
+            return dict(record, cached=True)
+        completion_lookups.inc(outcome='miss')
+        if self.replay:
+            raise ReplayMiss(f"No cached completion for {key}")
+        return self.flights.do(key, lambda: self._create(key, model, messages, temperature, **kwargs))
+
+    def _create(self, key, model, messages, temperature, **kwargs):
+        # A leader that lost the race to a finished flight finds it here
+        record = self.cache.get(key)
+        if record is not None:
+            return dict(record, cached=True)
+        response = self._create_completion(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            **kwargs
+        )
+        record = self._store(key, response.get('model', model),
+                             response.choices[0].message.content,
+                             response.get('usage'))
+        return dict(record, cached=False)
+
+    async def _create_completion_async(self, **kwargs):
+        import openai
+        if self.api_key:
+            kwargs.setdefault('api_key', self.api_key)
+        if self.aiosession is not None:
+            openai.aiosession.set(self.aiosession)
+        with metrics.call_site('openai_completion'):
+            if self.upstream is None:
+                return await openai.ChatCompletion.acreate(**kwargs)
+            kwargs.setdefault('request_timeout', self.upstream.timeout)
+            return await self.upstream.call_async(
+                lambda: openai.ChatCompletion.acreate(**kwargs),
+                retryable=is_retryable_openai_error
+            )
+
+    async def acomplete(self, model, messages, temperature=0.7, key=None, **kwargs):
+        """complete() for asyncio, on the pooled aiohttp session"""
+        key = key or prompt_hash(model=model, messages=messages, temperature=temperature)
+        record = self.cache.get(key)
+        if record is not None:
+            completion_lookups.inc(outcome='hit')
+            return dict(record, cached=True)
+        completion_lookups.inc(outcome='miss')
+        if self.replay:
+            raise ReplayMiss(f"No cached completion for {key}")
+        return await self.async_flights.do(key, lambda: self._acreate(key, model, messages, temperature, **kwargs))
+
+    async def _acreate(self, key, model, messages, temperature, **kwargs):
+        record = self.cache.get(key)
+        if record is not None:
+            return dict(record, cached=True)
+        response = await self._create_completion_async(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            **kwargs
+        )
+        record = self._store(key, response.get('model', model),
+                             response.choices[0].message.content,
+                             response.get('usage'))
+        return dict(record, cached=False)
+
+    def stream(self, model, messages, temperature=0.7, key=None, **kwargs):
+        """A CompletionStream of the content deltas of a chat completion
+
+        A cached completion is yielded as a single delta. The full text is
+        cached once the stream has been consumed to the end.
+        """
+        return CompletionStream(self._stream(model, messages, temperature, key, **kwargs))
+
+    def _stream(self, model, messages, temperature, key, **kwargs):
+        key = key or prompt_hash(model=model, messages=messages, temperature=temperature)
+        record = self.cache.get(key)
+        if record is not None:
+            completion_lookups.inc(outcome='hit')
+            yield record['content']
+            return dict(record, cached=True)
+        completion_lookups.inc(outcome='miss')
+        if self.replay:
+            raise ReplayMiss(f"No cached completion for {key}")
+        parts = []
+        for chunk in self._create_completion(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            stream=True,
+            **kwargs
+        ):
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].get('delta', {}).get('content')
+            if delta:
+                parts.append(delta)
+                yield delta
+        content = ''.join(parts)
+        # The streaming API reports no usage, so the tokens are counted locally
+        usage = {
+            'prompt_tokens': count_message_tokens(messages, model),
+            'completion_tokens': count_tokens(content, model)
+        }
+        usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+        return dict(self._store(key, model, content, usage), cached=False)
+
+    def _store(self, key, model, content, usage):
+        usage = usage or {}
+        record = {
+            'key': key,
+            'model': model,
+            'content': content,
+            'usage': {
+                'prompt_tokens': usage.get('prompt_tokens', 0),
+                'completion_tokens': usage.get('completion_tokens', 0),
+                'total_tokens': usage.get('total_tokens', 0)
+            },
+            'created': datetime.now().isoformat()
+        }
+        self.cache.put(key, record)
+        return record
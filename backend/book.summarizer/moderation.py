@@ -0,0 +1,444 @@
+"""Moderation queue for user-submitted summaries.
+
+Submissions in OUTPUT_DIR/pending are tracked in a SQLite table so they can
+be listed page by page and approved or rejected in bulk. Every summary,
+published or pending, gets a MinHash signature of its word shingles, and
+the signature is cut into LSH bands whose hashes are stored in an indexed
+table. A new submission is compared only with the summaries sharing a
+band bucket with it, which catches near-copies (estimated Jaccard
+similarity above SIMILARITY_THRESHOLD) without scanning the corpus.
+"""
+import os
+import re
+import json
+import struct
+import sqlite3
+import hashlib
+import logging
+import threading
+from datetime import datetime
+
+try:
+    import numpy as np
+except ImportError:  # optional: compute signatures in pure Python
+    np = None
+
+from summary_index import summary_slug
+from summary_search import parse_frontmatter
+from related_books import SECTION_RE, IGNORED_SECTIONS
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+APPROVED = 'approved'
+REJECTED = 'rejected'
+SUPERSEDED = 'superseded'
+
+WORD_RE = re.compile(r"[^\W\d_]+", re.UNICODE)
+SHINGLE_SIZE = 3
+NUM_PERM = 128
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+# Pairs above this estimated Jaccard similarity are reported as near-duplicates.
+# With 32 bands of 4 rows, pairs at 0.5 share a bucket with probability ~0.87.
+SIMILARITY_THRESHOLD = 0.5
+
+_MASK64 = (1 << 64) - 1
+# Multiply-shift hash functions (a * x + b) mod 2^64 >> 32, with odd multipliers
+_SEEDS = [int.from_bytes(hashlib.blake2b(f"minhash-{i}".encode(), digest_size=16).digest(), 'big')
+          for i in range(NUM_PERM)]
+_A = [(seed >> 64) | 1 for seed in _SEEDS]
+_B = [seed & _MASK64 for seed in _SEEDS]
+
+
+def fingerprint_text(body):
+    """The book-specific text of a summary body, without headings or template sections"""
+    pieces = SECTION_RE.split(body)
+    parts = [pieces[0]]
+    for heading, content in zip(pieces[1::2], pieces[2::2]):
+        if heading.strip() not in IGNORED_SECTIONS:
+            parts.append(content)
+    return '\n'.join(parts)
+
+
+def shingles(text):
+    words = [word.lower() for word in WORD_RE.findall(text)]
+    if len(words) <= SHINGLE_SIZE:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def minhash(text):
+    """MinHash signature of a text's word shingles, as NUM_PERM 32-bit ints"""
+    values = [int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=4).digest(), 'big')
+              for shingle in shingles(text)]
+    if not values:
+        return [0] * NUM_PERM
+    if np is not None:
+        x = np.array(values, dtype=np.uint64)
+        a = np.array(_A, dtype=np.uint64)[:, None]
+        b = np.array(_B, dtype=np.uint64)[:, None]
+        with np.errstate(over='ignore'):
+            return ((a * x + b) >> np.uint64(32)).min(axis=1).astype(np.uint32).tolist()
+    return [min(((a * x + b) & _MASK64) >> 32 for x in values) for a, b in zip(_A, _B)]
+
+
+def similarity(signature, other):
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(1 for x, y in zip(signature, other) if x == y) / NUM_PERM
+
+
+def band_buckets(signature):
+    """One signed 64-bit bucket key per LSH band"""
+    buckets = []
+    for band in range(BANDS):
+        rows = struct.pack(f'<H{ROWS}I', band, *signature[band * ROWS:(band + 1) * ROWS])
+        buckets.append(int.from_bytes(hashlib.blake2b(rows, digest_size=8).digest(), 'big', signed=True))
+    return buckets
+
+
+def _pack(signature):
+    return struct.pack(f'<{NUM_PERM}I', *signature)
+
+
+def _unpack(blob):
+    return list(struct.unpack(f'<{NUM_PERM}I', blob))
+
+
+def set_frontmatter_field(text, key, value):
+    """Replace or add a `key: value` line in a markdown file's frontmatter"""
+    if not text.startswith('---'):
+        return text
+    end = text.find('\n---', 3)
+    if end == -1:
+        return text
+    pattern = re.compile(rf'^{re.escape(key)}:.*$', re.MULTILINE)
+    head = text[:end]
+    if pattern.search(head):
+        head = pattern.sub(lambda _: f'{key}: {value}', head, count=1)
+    else:
+        head += f'\n{key}: {value}'
+    return head + text[end:]
+
+
+class ModerationQueue:
+    """Pending submissions and MinHash fingerprints of every summary"""
+
+    def __init__(self, db_path, output_dir, languages):
+        self.db_path = db_path
+        self.output_dir = output_dir
+        self.pending_dir = os.path.join(output_dir, 'pending')
+        self.languages = set(languages)
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._init_db()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS submissions ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " path TEXT NOT NULL,"
+            " slug TEXT NOT NULL,"
+            " language TEXT NOT NULL,"
+            " book_id TEXT,"
+            " title TEXT,"
+            " author TEXT,"
+            " status TEXT NOT NULL,"
+            " matches TEXT NOT NULL DEFAULT '[]',"
+            " submitted_at TEXT NOT NULL,"
+            " decided_at TEXT,"
+            " reason TEXT)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS submissions_status ON submissions (status, id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS submissions_path ON submissions (path)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS fingerprints ("
+            " path TEXT PRIMARY KEY,"
+            " slug TEXT NOT NULL,"
+            " language TEXT NOT NULL,"
+            " title TEXT,"
+            " published INTEGER NOT NULL,"
+            " signature BLOB NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " size INTEGER NOT NULL)"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS fingerprint_buckets (bucket INTEGER NOT NULL, path TEXT NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS fingerprint_buckets_bucket ON fingerprint_buckets (bucket)")
+        conn.execute("CREATE INDEX IF NOT EXISTS fingerprint_buckets_path ON fingerprint_buckets (path)")
+
+    # -- fingerprints -------------------------------------------------------
+
+    def _read(self, path):
+        stat = os.stat(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            meta, body = parse_frontmatter(f.read())
+        return meta, minhash(fingerprint_text(body)), stat
+
+    def fingerprint_file(self, path, published=True):
+        """(Re)compute the signature of one summary file; returns (meta, signature)"""
+        meta, signature, stat = self._read(path)
+        language = meta.get('language', 'english')
+        slug = summary_slug(os.path.basename(path), language)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO fingerprints (path, slug, language, title, published, signature, mtime_ns, size)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (path, slug, language, meta.get('title', slug), int(published),
+                 _pack(signature), stat.st_mtime_ns, stat.st_size)
+            )
+            conn.execute("DELETE FROM fingerprint_buckets WHERE path = ?", (path,))
+            conn.executemany("INSERT INTO fingerprint_buckets (bucket, path) VALUES (?, ?)",
+                             [(bucket, path) for bucket in band_buckets(signature)])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return meta, signature
+
+    def forget_file(self, path):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM fingerprints WHERE path = ?", (path,))
+            conn.execute("DELETE FROM fingerprint_buckets WHERE path = ?", (path,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def near_duplicates(self, signature, exclude_path=None, limit=5):
+        """Summaries sharing an LSH bucket with signature and above SIMILARITY_THRESHOLD, closest first"""
+        buckets = band_buckets(signature)
+        rows = self._conn().execute(
+            "SELECT path, slug, language, title, published, signature FROM fingerprints WHERE path IN"
+            f" (SELECT path FROM fingerprint_buckets WHERE bucket IN ({','.join('?' * len(buckets))}))",
+            buckets
+        ).fetchall()
+        matches = []
+        for path, slug, language, title, published, other in rows:
+            if path == exclude_path:
+                continue
+            score = similarity(signature, _unpack(other))
+            if score >= SIMILARITY_THRESHOLD:
+                matches.append({
+                    'slug': slug,
+                    'language': language,
+                    'title': title,
+                    'published': bool(published),
+                    'similarity': round(score, 4)
+                })
+        matches.sort(key=lambda match: (-match['similarity'], not match['published']))
+        return matches[:limit]
+
+    # -- queue --------------------------------------------------------------
+
+    def enqueue(self, path, book_id=None):
+        """Add a pending file to the queue and check it for duplicates; returns the submission"""
+        meta, signature = self.fingerprint_file(path, published=False)
+        language = meta.get('language', 'english')
+        slug = summary_slug(os.path.basename(path), language)
+        matches = self.near_duplicates(signature, exclude_path=path)
+        published_path = os.path.join(self.output_dir, os.path.basename(path))
+        if os.path.exists(published_path) and not any(
+            match['published'] and match['slug'] == slug and match['language'] == language for match in matches
+        ):
+            matches.insert(0, {'slug': slug, 'language': language, 'title': meta.get('title', slug),
+                               'published': True, 'similarity': None})
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # A resubmission overwrites the pending file, so it replaces the earlier entry
+            conn.execute("UPDATE submissions SET status = ?, decided_at = datetime('now')"
+                         " WHERE path = ? AND status = ?", (SUPERSEDED, path, PENDING))
+            cursor = conn.execute(
+                "INSERT INTO submissions (path, slug, language, book_id, title, author, status, matches, submitted_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (path, slug, meta.get('language', language), book_id or meta.get('bookId'), meta.get('title', slug),
+                 meta.get('author', ''), PENDING, json.dumps(matches, ensure_ascii=False),
+                 datetime.now().isoformat())
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if matches:
+            logger.info(f"Submission {path} resembles {', '.join(match['slug'] for match in matches)}")
+        return self.get(cursor.lastrowid)
+
+    @staticmethod
+    def _row_to_dict(row):
+        (submission_id, path, slug, language, book_id, title, author, status, matches,
+         submitted_at, decided_at, reason) = row
+        return {
+            'id': submission_id,
+            'path': path,
+            'slug': slug,
+            'language': language,
+            'bookId': book_id,
+            'title': title,
+            'author': author,
+            'status': status,
+            'duplicates': json.loads(matches),
+            'submittedAt': submitted_at,
+            'decidedAt': decided_at,
+            'reason': reason
+        }
+
+    _COLUMNS = ("id, path, slug, language, book_id, title, author, status, matches,"
+                " submitted_at, decided_at, reason")
+
+    def get(self, submission_id):
+        row = self._conn().execute(
+            f"SELECT {self._COLUMNS} FROM submissions WHERE id = ?", (submission_id,)
+        ).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def list(self, status=PENDING, page=1, limit=20, duplicates_only=False):
+        """One page of submissions, oldest first"""
+        page = max(1, page)
+        where = "status = ?"
+        if duplicates_only:
+            where += " AND matches != '[]'"
+        conn = self._conn()
+        total = conn.execute(f"SELECT COUNT(*) FROM submissions WHERE {where}", (status,)).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT {self._COLUMNS} FROM submissions WHERE {where} ORDER BY id LIMIT ? OFFSET ?",
+            (status, limit, (page - 1) * limit)
+        ).fetchall()
+        return {
+            "results": [self._row_to_dict(row) for row in rows],
+            "total": total,
+            "page": page,
+            "hasMore": page * limit < total
+        }
+
+    def _pending(self, submission_ids):
+        submission_ids = [int(submission_id) for submission_id in submission_ids]
+        if not submission_ids:
+            return []
+        rows = self._conn().execute(
+            f"SELECT {self._COLUMNS} FROM submissions WHERE status = ? AND id IN ({','.join('?' * len(submission_ids))})",
+            [PENDING] + submission_ids
+        ).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def _decide(self, decided, status, reason=None):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "UPDATE submissions SET status = ?, decided_at = datetime('now'), reason = ? WHERE id = ?",
+                [(status, reason, submission['id']) for submission in decided]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def approve(self, submission_ids, replace=False):
+        """Publish pending submissions; returns (approved submissions, {id: error})
+
+        Each file gets its pending markers removed and is moved into the
+        content directory with an atomic rename.
+        """
+        approved, errors = [], {}
+        for submission in self._pending(submission_ids):
+            source = submission['path']
+            target = os.path.join(self.output_dir, os.path.basename(source))
+            if os.path.exists(target) and not replace:
+                errors[submission['id']] = "A published summary already exists for this book"
+                continue
+            try:
+                with open(source, 'r', encoding='utf-8') as f:
+                    content = f.read()
+                content = set_frontmatter_field(content, 'status', '"published"')
+                content = content.replace(', "pending-review"', '')
+                tmp_path = f"{target}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(content)
+                os.replace(tmp_path, target)
+                os.remove(source)
+            except OSError as e:
+                errors[submission['id']] = str(e)
+                continue
+            self.forget_file(source)
+            self.fingerprint_file(target, published=True)
+            submission.update(status=APPROVED, publishedPath=target)
+            approved.append(submission)
+        if approved:
+            self._decide(approved, APPROVED)
+        return approved, errors
+
+    def reject(self, submission_ids, reason=None):
+        """Reject pending submissions, moving their files to pending/rejected"""
+        rejected, errors = [], {}
+        rejected_dir = os.path.join(self.pending_dir, 'rejected')
+        for submission in self._pending(submission_ids):
+            source = submission['path']
+            try:
+                os.makedirs(rejected_dir, exist_ok=True)
+                if os.path.exists(source):
+                    os.replace(source, os.path.join(rejected_dir, f"{submission['id']}-{os.path.basename(source)}"))
+            except OSError as e:
+                errors[submission['id']] = str(e)
+                continue
+            self.forget_file(source)
+            submission.update(status=REJECTED, reason=reason)
+            rejected.append(submission)
+        if rejected:
+            self._decide(rejected, REJECTED, reason)
+        return rejected, errors
+
+    # -- reconciliation -----------------------------------------------------
+
+    def _scan(self):
+        for directory, published in ((self.output_dir, True), (self.pending_dir, False)):
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.name.endswith('.md') and entry.is_file():
+                            yield entry.path, published, entry.stat()
+            except FileNotFoundError:
+                continue
+
+    def sync(self):
+        """Fingerprint new and changed files, drop deleted ones and queue untracked pending files"""
+        conn = self._conn()
+        known = {path: (mtime_ns, size) for path, mtime_ns, size in
+                 conn.execute("SELECT path, mtime_ns, size FROM fingerprints")}
+        queued = {path for (path,) in conn.execute("SELECT path FROM submissions WHERE status = ?", (PENDING,))}
+        fingerprinted = 0
+        for path, published, stat in self._scan():
+            if not published and path not in queued:
+                try:
+                    self.enqueue(path)
+                except (OSError, UnicodeDecodeError) as e:
+                    logger.warning(f"Could not queue {path}: {e}")
+                known.pop(path, None)
+                continue
+            if known.pop(path, None) != (stat.st_mtime_ns, stat.st_size):
+                try:
+                    self.fingerprint_file(path, published)
+                    fingerprinted += 1
+                except (OSError, UnicodeDecodeError) as e:
+                    logger.warning(f"Could not fingerprint {path}: {e}")
+        for path in known:
+            self.forget_file(path)
+        logger.info(f"Moderation: {fingerprinted} summaries fingerprinted, {len(known)} removed")
+
+    def start_sync(self):
+        thread = threading.Thread(target=self.sync, name="moderation-sync", daemon=True)
+        thread.start()
+        return thread
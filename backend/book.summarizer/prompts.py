@@ -0,0 +1,140 @@
+import re
+import html
+import math
+from collections import Counter
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to a character-based estimate
+    tiktoken = None
+
+TAG_RE = re.compile(r'<[^>]+>')
+SENTENCE_RE = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9"“‘(])')
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+SYSTEM_PROMPT = "You are an expert book summarizer who creates engaging, insightful summaries."
+
+DEFAULT_PROFILE = {
+    'model': 'gpt-3.5-turbo',
+    'max_tokens': None,
+    'temperature': 0.7,
+    'description_budget': 512
+}
+
+_encodings = {}
+
+
+def _encoding(model):
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encodings[model] = tiktoken.get_encoding('cl100k_base')
+    return _encodings[model]
+
+
+def count_tokens(text, model='gpt-3.5-turbo'):
+    """Count tokens with tiktoken when installed, otherwise estimate ~4 chars per token"""
+    if not text:
+        return 0
+    if tiktoken is not None:
+        return len(_encoding(model).encode(text))
+    return math.ceil(len(text) / 4)
+
+
+def count_message_tokens(messages, model='gpt-3.5-turbo'):
+    """Token count of a chat prompt, including the per-message framing overhead"""
+    return sum(count_tokens(message['content'], model) + 4 for message in messages) + 3
+
+
+def strip_markup(text):
+    """Remove HTML tags and entities and collapse whitespace"""
+    if not text:
+        return ''
+    text = TAG_RE.sub(' ', text)
+    text = html.unescape(text)
+    return ' '.join(text.split())
+
+
+def compress_text(text, budget, model='gpt-3.5-turbo'):
+    """Extractively shorten text to at most `budget` tokens
+
+    Sentences are scored by the document frequency of their words, with a
+    bonus for appearing early, and the best ones are kept in their original
+    order. A hard truncation is the last resort.
+    """
+    if count_tokens(text, model) <= budget:
+        return text
+    sentences = [s.strip() for s in SENTENCE_RE.split(text) if s.strip()]
+    if len(sentences) > 1:
+        frequencies = Counter(word.lower() for word in WORD_RE.findall(text))
+        scored = []
+        for position, sentence in enumerate(sentences):
+            words = [word.lower() for word in WORD_RE.findall(sentence)]
+            if not words:
+                continue
+            score = sum(frequencies[word] for word in words) / len(words)
+            score *= 1.0 + 1.0 / (1 + position)
+            scored.append((score, position, sentence))
+        chosen = []
+        used = 0
+        for score, position, sentence in sorted(scored, reverse=True):
+            tokens = count_tokens(sentence, model) + 1
+            if used + tokens > budget:
+                continue
+            chosen.append((position, sentence))
+            used += tokens
+        if chosen:
+            return ' '.join(sentence for _, sentence in sorted(chosen))
+    # One huge sentence, or nothing fits: truncate on a word boundary
+    approx_chars = budget * 4
+    return text[:approx_chars].rsplit(' ', 1)[0]
+
+
+class PromptBuilder:
+    """Build summary prompts within a token budget, with per-language and per-tier profiles
+
+    profiles looks like:
+        {"default": {...}, "languages": {"japanese": {...}}, "tiers": {"premium": {...}}}
+    where each profile may set model, max_tokens, temperature and
+    description_budget. Tier settings override language settings, which
+    override the defaults.
+    """
+
+    def __init__(self, profiles=None):
+        profiles = profiles or {}
+        self.default = dict(DEFAULT_PROFILE, **profiles.get('default', {}))
+        self.languages = profiles.get('languages', {})
+        self.tiers = profiles.get('tiers', {})
+
+    def profile(self, language='english', tier=None):
+        profile = dict(self.default)
+        profile.update(self.languages.get(language, {}))
+        if tier:
+            profile.update(self.tiers.get(tier, {}))
+        return profile
+
+    def compact_description(self, description, profile):
+        return compress_text(strip_markup(description), profile['description_budget'], profile['model'])
+
+    def build(self, title, authors, language, description='', tier=None):
+        """Return (messages, profile, compacted description) for a summary request"""
+        profile = self.profile(language, tier)
+        description = self.compact_description(description, profile)
+        prompt = f"""
+You are a professional book summarizer. Create a comprehensive summary of "{title}" by {', '.join(authors) if isinstance(authors, list) else authors}.
+
+Generate the summary in these clear sections:
+## Short Summary (1–2 sentences introducing the book)
+## Detailed Summary (4–6 paragraphs exploring the book's content)
+## Key Takeaways (5–10 bullet points of core insights)
+
+The summary should be in {language}, focusing on the book's core message, key themes, and most important insights.
+"""
+        if description:
+            prompt += f"\n\nBook Description: {description}"
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+        return messages, profile, description
@@ -0,0 +1,190 @@
+"""Pick quotable sentences from a summary with TextRank.
+
+Sentences become TF-IDF vectors over the summary's own vocabulary, the
+cosine similarity matrix is the graph, and PageRank over it ranks the
+sentences. A summary has a few dozen sentences, so this takes a few
+milliseconds and needs no extra OpenAI call.
+
+Rewrite the "Quotes to Remember" section of existing summaries, from the
+raw completion under _data/raw when there is one, as at generation time:
+
+    python quotes.py rewrite path/to/content/books
+"""
+import os
+import re
+import sys
+import math
+import logging
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:  # optional: fall back to word-frequency scoring
+    np = None
+
+from summary_search import parse_frontmatter
+
+logger = logging.getLogger(__name__)
+
+SENTENCE_RE = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9"“‘(])')
+WORD_RE = re.compile(r"[^\W\d_]{2,}", re.UNICODE)
+MARKUP_RE = re.compile(r'[*_`#>]|\[([^\]]*)\]\([^)]*\)')
+# Markdown list markers, and the template's Key Takeaways bullet
+LIST_ITEM_RE = re.compile(r'^\s*(?:[-*+]|\d+[.)]|🔑)\s+')
+
+PLACEHOLDER_QUOTES = [
+    "A powerful quote capturing the book's essence",
+    "An insightful line that resonates with the book's theme",
+    "A thought-provoking statement from the text"
+]
+MIN_WORDS = 6
+MAX_WORDS = 40
+DAMPING = 0.85
+# Skip a sentence sharing more than this fraction of its words with one already chosen
+MAX_OVERLAP = 0.5
+
+
+def split_sentences(text):
+    """Sentences of a markdown text, with headings dropped and inline markup removed"""
+    sentences = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#') or line.startswith('---'):
+            continue
+        line = LIST_ITEM_RE.sub('', line)
+        line = MARKUP_RE.sub(lambda match: match.group(1) or '', line).strip()
+        sentences.extend(part.strip() for part in SENTENCE_RE.split(line) if part.strip())
+    return sentences
+
+
+def _quotable(sentence):
+    return MIN_WORDS <= len(sentence.split()) <= MAX_WORDS and sentence[-1] in '.!?'
+
+
+def _textrank_scores(token_lists, iterations=50, tolerance=1e-6):
+    vocabulary = {}
+    for tokens in token_lists:
+        for token in tokens:
+            vocabulary.setdefault(token, len(vocabulary))
+    counts = np.zeros((len(token_lists), len(vocabulary)), dtype=np.float32)
+    for row, tokens in enumerate(token_lists):
+        for token, count in Counter(tokens).items():
+            counts[row, vocabulary[token]] = 1.0 + math.log(count)
+    doc_freq = (counts > 0).sum(axis=0)
+    vectors = counts * (np.log((1.0 + len(token_lists)) / (1.0 + doc_freq)) + 1.0)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    vectors /= norms
+    similarity = vectors @ vectors.T
+    np.fill_diagonal(similarity, 0.0)
+    out_weight = similarity.sum(axis=1, keepdims=True)
+    out_weight[out_weight == 0] = 1.0
+    transition = (similarity / out_weight).T
+    size = len(token_lists)
+    scores = np.full(size, 1.0 / size, dtype=np.float32)
+    for _ in range(iterations):
+        updated = (1 - DAMPING) / size + DAMPING * (transition @ scores)
+        if np.abs(updated - scores).sum() < tolerance:
+            return updated
+        scores = updated
+    return scores
+
+
+def _frequency_scores(token_lists):
+    frequencies = Counter(token for tokens in token_lists for token in tokens)
+    return [sum(frequencies[token] for token in tokens) / len(tokens) if tokens else 0.0
+            for tokens in token_lists]
+
+
+def rank_sentences(text, count=3):
+    """The `count` best quotable sentences of text, best first"""
+    sentences = split_sentences(text)
+    token_lists = [[word.lower() for word in WORD_RE.findall(sentence)] for sentence in sentences]
+    if not sentences:
+        return []
+    # Rank over every sentence so the graph sees the whole text, then keep quotable ones
+    if np is not None and len(sentences) > 1:
+        scores = _textrank_scores(token_lists)
+    else:
+        scores = _frequency_scores(token_lists)
+    ranked = sorted(range(len(sentences)), key=lambda index: -scores[index])
+    chosen = []
+    chosen_words = []
+    for index in ranked:
+        sentence = sentences[index]
+        words = set(token_lists[index])
+        if not _quotable(sentence) or any(
+            len(words & other) > MAX_OVERLAP * min(len(words), len(other)) for other in chosen_words
+        ):
+            continue
+        chosen.append(sentence)
+        chosen_words.append(words)
+        if len(chosen) == count:
+            break
+    return chosen
+
+
+def extract_quotes(summary, count=3):
+    """Quotes for the "Quotes to Remember" section, padded with placeholders if the summary is short"""
+    try:
+        quotes = rank_sentences(summary, count)
+    except Exception as e:
+        logger.error(f"Error ranking quotes: {e}")
+        quotes = []
+    # The template wraps each quote in double quotes
+    quotes = [quote.replace('"', '”') for quote in quotes]
+    return quotes + PLACEHOLDER_QUOTES[len(quotes):count]
+
+
+def format_quotes(quotes):
+    return ''.join(f'{number}. "{quote}"\n' for number, quote in enumerate(quotes, 1))
+
+
+QUOTES_SECTION_RE = re.compile(r'(## Quotes to Remember\n)(?:\d+\. .*\n?)*')
+SOURCE_SECTIONS_RE = re.compile(r'## (?:Core Summary|Key Takeaways)\n(.*?)(?=\n## |\Z)', re.DOTALL)
+
+
+def quote_source(path, content, raw_dir=None):
+    """The raw completion of a summary file if raw_dir has its record, else its summary sections"""
+    if raw_dir:
+        from rerender import raw_path, load_raw
+        record_path = raw_path(raw_dir, path)
+        if os.path.exists(record_path):
+            try:
+                return load_raw(record_path)['raw']
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Could not read raw record {record_path}: {e}")
+    _, body = parse_frontmatter(content)
+    return '\n'.join(SOURCE_SECTIONS_RE.findall(body))
+
+
+def rewrite_quotes(path, raw_dir=None):
+    """Recompute the quotes of one summary file, from its raw completion when raw_dir has it"""
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    if not QUOTES_SECTION_RE.search(content):
+        return False
+    source = quote_source(path, content, raw_dir)
+    updated = QUOTES_SECTION_RE.sub(lambda match: match.group(1) + format_quotes(extract_quotes(source)),
+                                    content, count=1)
+    if updated == content:
+        return False
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(updated)
+    os.replace(tmp_path, path)
+    return True
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3 or sys.argv[1] != 'rewrite':
+        print(__doc__)
+        sys.exit(1)
+    logging.basicConfig(level=logging.INFO)
+    directory = sys.argv[2]
+    raw_dir = os.path.join(directory, '_data', 'raw')  # the app's RAW_DIR for this OUTPUT_DIR
+    rewritten = 0
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.md') and rewrite_quotes(os.path.join(directory, name), raw_dir):
+            rewritten += 1
+    print(f"Rewrote the quotes of {rewritten} summaries")
@@ -0,0 +1,343 @@
+"""Related-book suggestions from TF-IDF similarity over the summary corpus.
+
+Every English summary is turned into a vector of hashed word unigrams and
+bigrams (sublinear term frequency) stored as one row of a float16 NumPy
+matrix. IDF weights come from the per-bucket document frequencies, so a
+new summary is added by appending a row and bumping the counts. Top-k
+cosine neighbours for the whole catalog are computed in matrix blocks.
+
+Rebuild the index from every summary, optionally rewriting the "Pair With"
+section of each file:
+
+    python related_books.py rebuild [--rewrite]
+
+(OUTPUT_DIR is taken from the environment, as for the app.)
+"""
+import os
+import re
+import sys
+import json
+import zlib
+import time
+import logging
+import threading
+
+try:
+    import numpy as np
+except ImportError:  # optional: suggestions fall back to the static list
+    np = None
+
+from summary_index import summary_slug, summary_language
+from summary_search import parse_frontmatter
+
+logger = logging.getLogger(__name__)
+
+NUMPY_AVAILABLE = np is not None
+
+WORD_RE = re.compile(r"[^\W\d_]{2,}", re.UNICODE)
+SECTION_RE = re.compile(r'^## (.+)$', re.MULTILINE)
+# Template sections that are the same in every summary, or derived from this index
+IGNORED_SECTIONS = {'The Big Idea', 'Apply This Now', 'Quotes to Remember', 'Get this Book Now',
+                    'Pair With', 'About the Author'}
+TITLE_WEIGHT = 3
+
+
+def summary_text(meta, body):
+    """Title (weighted), author, description and the book-specific sections of a summary"""
+    parts = [meta.get('title', '')] * TITLE_WEIGHT + [meta.get('author', ''), meta.get('description', '')]
+    pieces = SECTION_RE.split(body)
+    parts.append(pieces[0])
+    for heading, content in zip(pieces[1::2], pieces[2::2]):
+        if heading.strip() not in IGNORED_SECTIONS:
+            parts.append(content)
+    return '\n'.join(parts)
+
+
+def hashed_features(text, dim):
+    """Sublinear term frequencies of hashed unigrams and bigrams, as a dense float32 vector"""
+    words = [word.lower() for word in WORD_RE.findall(text)]
+    terms = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    counts = np.zeros(dim, dtype=np.float32)
+    if terms:
+        buckets = np.fromiter((zlib.crc32(term.encode('utf-8')) % dim for term in terms),
+                              dtype=np.int64, count=len(terms))
+        np.add.at(counts, buckets, 1.0)
+        nonzero = counts > 0
+        counts[nonzero] = 1.0 + np.log(counts[nonzero])
+    return counts
+
+
+class RelatedBooks:
+    """Hashed TF-IDF vectors for the English summaries in output_dir"""
+
+    def __init__(self, output_dir, index_dir, languages, dim=4096, save_interval=60.0):
+        self.output_dir = output_dir
+        self.index_dir = index_dir
+        self.languages = set(languages)
+        self.dim = dim
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self.books = []  # [{'slug', 'title', 'author'}], one per matrix row
+        self._rows = {}  # slug -> row
+        # Rows beyond len(self.books) are spare capacity for cheap appends
+        self._matrix = np.zeros((0, dim), dtype=np.float16)
+        self.doc_freq = np.zeros(dim, dtype=np.int32)
+        self._saved_at = 0.0
+        self._dirty = False
+
+    @property
+    def matrix(self):
+        return self._matrix[:len(self.books)]
+
+    def _append_row(self, vector):
+        if len(self.books) == self._matrix.shape[0]:
+            grown = np.zeros((max(64, 2 * self._matrix.shape[0]), self.dim), dtype=np.float16)
+            grown[:len(self.books)] = self.matrix
+            self._matrix = grown
+        self._matrix[len(self.books)] = vector
+
+    # -- persistence --------------------------------------------------------
+
+    def _path(self):
+        return os.path.join(self.index_dir, 'index.npz')
+
+    def load(self):
+        path = self._path()
+        if not os.path.exists(path):
+            return False
+        try:
+            with np.load(path, allow_pickle=False) as saved:
+                matrix, doc_freq = saved['vectors'], saved['doc_freq']
+                books = json.loads(saved['books'].tobytes().decode('utf-8'))
+        except Exception as e:
+            logger.error(f"Error loading related-books index: {e}")
+            return False
+        if matrix.shape != (len(books), self.dim):
+            logger.warning("Related-books index does not match the configured dimension; rebuilding")
+            return False
+        with self._lock:
+            self._matrix, self.doc_freq, self.books = matrix, doc_freq, books
+            self._rows = {book['slug']: row for row, book in enumerate(books)}
+        return True
+
+    def save(self):
+        """Write the vectors, document frequencies and books as one file, replaced atomically"""
+        os.makedirs(self.index_dir, exist_ok=True)
+        path = self._path()
+        with self._save_lock:
+            with self._lock:
+                matrix, doc_freq, books = self.matrix.copy(), self.doc_freq.copy(), list(self.books)
+                self._dirty = False
+                self._saved_at = time.monotonic()
+            books = np.frombuffer(json.dumps(books, ensure_ascii=False).encode('utf-8'), dtype=np.uint8)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, vectors=matrix, doc_freq=doc_freq, books=books)
+            os.replace(tmp_path, path)
+
+    def _maybe_save(self):
+        if self._dirty and time.monotonic() - self._saved_at >= self.save_interval:
+            try:
+                self.save()
+            except Exception as e:
+                logger.error(f"Error saving related-books index: {e}")
+
+    # -- corpus -------------------------------------------------------------
+
+    def _english_files(self, known=()):
+        """(slug, path) of each English summary, by the language in its front matter
+
+        Slugs in known are English already and their files aren't opened.
+        """
+        try:
+            with os.scandir(self.output_dir) as entries:
+                for entry in entries:
+                    if not entry.name.endswith('.md') or not entry.is_file():
+                        continue
+                    slug = summary_slug(entry.name)
+                    if slug in known:
+                        yield slug, entry.path
+                        continue
+                    try:
+                        language = summary_language(entry.path)
+                    except OSError as e:
+                        logger.warning(f"Could not read {entry.path} for related books: {e}")
+                        continue
+                    if language == 'english':
+                        yield slug, entry.path
+        except FileNotFoundError:
+            return
+
+    def _read(self, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            meta, body = parse_frontmatter(f.read())
+        return meta, hashed_features(summary_text(meta, body), self.dim)
+
+    def add_file(self, path):
+        """Add or replace the vector for one English summary file; other languages are ignored"""
+        try:
+            meta, vector = self._read(path)
+        except OSError as e:
+            logger.warning(f"Could not read {path} for related books: {e}")
+            return
+        if meta.get('language', 'english') != 'english':
+            return
+        slug = summary_slug(os.path.basename(path))
+        book = {'slug': slug, 'title': meta.get('title', slug), 'author': meta.get('author', '')}
+        with self._lock:
+            row = self._rows.get(slug)
+            present = vector > 0
+            if row is None:
+                self._append_row(vector)
+                self._rows[slug] = len(self.books)
+                self.books.append(book)
+            else:
+                self.doc_freq -= self._matrix[row] > 0
+                self.books[row] = book
+                self._matrix[row] = vector
+            self.doc_freq += present
+            self._dirty = True
+        self._maybe_save()
+
+    def build(self):
+        """Recompute every vector from the summary files"""
+        books, rows = [], []
+        for slug, path in self._english_files():
+            try:
+                meta, vector = self._read(path)
+            except OSError as e:
+                logger.warning(f"Could not read {path} for related books: {e}")
+                continue
+            books.append({'slug': slug, 'title': meta.get('title', slug), 'author': meta.get('author', '')})
+            rows.append(vector.astype(np.float16))
+        matrix = np.vstack(rows) if rows else np.zeros((0, self.dim), dtype=np.float16)
+        with self._lock:
+            self.books = books
+            self._rows = {book['slug']: row for row, book in enumerate(books)}
+            self._matrix = matrix
+            self.doc_freq = (matrix > 0).sum(axis=0).astype(np.int32)
+            self._dirty = True
+        self.save()
+        logger.info(f"Built related-books index over {len(books)} summaries")
+
+    def sync(self):
+        """Load the saved index, or build it, and add summaries written since it was saved"""
+        if not self.load():
+            self.build()
+            return
+        for slug, path in self._english_files(known=self._rows):
+            if slug not in self._rows:
+                self.add_file(path)
+        self._maybe_save()
+
+    def start_sync(self):
+        thread = threading.Thread(target=self.sync, name="related-books-sync", daemon=True)
+        thread.start()
+        return thread
+
+    # -- queries ------------------------------------------------------------
+
+    def _idf(self, count):
+        return np.log((1.0 + count) / (1.0 + self.doc_freq.astype(np.float32))) + 1.0
+
+    @staticmethod
+    def _normalize(vectors):
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _weighted_blocks(self, matrix, idf, block_size):
+        """Yield (start, L2-normalised TF-IDF rows) one block at a time"""
+        for start in range(0, matrix.shape[0], block_size):
+            yield start, self._normalize(matrix[start:start + block_size].astype(np.float32) * idf)
+
+    def related(self, text, k=3, exclude=None, block_size=4096):
+        """Top-k books most similar to a piece of text, as dicts with a 'score'"""
+        with self._lock:
+            matrix, books, idf = self.matrix, list(self.books), self._idf(len(self.books))
+        if not books:
+            return []
+        query = self._normalize((hashed_features(text, self.dim) * idf)[None, :])[0]
+        scores = np.concatenate([block @ query for _, block in self._weighted_blocks(matrix, idf, block_size)])
+        results = []
+        for row in np.argsort(-scores):
+            if scores[row] <= 0:
+                break
+            if books[row]['slug'] == exclude:
+                continue
+            results.append(dict(books[row], score=round(float(scores[row]), 4)))
+            if len(results) == k:
+                break
+        return results
+
+    def related_all(self, k=3, block_size=1024):
+        """Top-k neighbours of every book, {slug: [book, ...]}, computed block by block"""
+        with self._lock:
+            matrix, books, idf = self.matrix, list(self.books), self._idf(len(self.books))
+        if not books:
+            return {}
+        corpus = self._normalize(matrix.astype(np.float32) * idf)
+        k = min(k, len(books) - 1)
+        neighbours = {}
+        for start in range(0, len(books), block_size):
+            scores = corpus[start:start + block_size] @ corpus.T
+            rows = np.arange(scores.shape[0])
+            scores[rows, start + rows] = -1.0  # never suggest a book for itself
+            if k <= 0:
+                top = np.zeros((scores.shape[0], 0), dtype=np.int64)
+            else:
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            for offset, candidates in enumerate(top):
+                ranked = sorted(candidates, key=lambda row: -scores[offset, row])
+                neighbours[books[start + offset]['slug']] = [
+                    dict(books[row], score=round(float(scores[offset, row]), 4))
+                    for row in ranked if scores[offset, row] > 0
+                ]
+        return neighbours
+
+
+def format_related_book(book):
+    """Markdown line item for a suggested book"""
+    return f"[{book['title']}](/books/{book['slug']}) by {book['author']}"
+
+
+def format_pair_with(books):
+    return ''.join(f"{number}. {format_related_book(book)}\n" for number, book in enumerate(books, 1))
+
+
+def rewrite_pair_with(path, books):
+    """Replace the numbered list under '## Pair With' in a summary file; False if it has none"""
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    pattern = re.compile(r'(## Pair With\n)(?:\d+\. .*\n?)*')
+    if not pattern.search(content):
+        return False
+    updated = pattern.sub(lambda match: match.group(1) + format_pair_with(books), content, count=1)
+    if updated != content:
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(updated)
+        os.replace(tmp_path, path)
+    return True
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] != 'rebuild':
+        print(__doc__)
+        sys.exit(1)
+    if not NUMPY_AVAILABLE:
+        print("numpy is required to build the related-books index")
+        sys.exit(1)
+    import app
+    engine = app.open_related_engine()
+    started = time.perf_counter()
+    engine.build()
+    neighbours = engine.related_all()
+    print(f"Ranked {len(neighbours)} books in {time.perf_counter() - started:.2f}s")
+    if '--rewrite' in sys.argv:
+        rewritten = 0
+        for slug, path in engine._english_files():
+            if neighbours.get(slug) and rewrite_pair_with(path, neighbours[slug]):
+                rewritten += 1
+        print(f"Rewrote the Pair With section of {rewritten} summaries")
@@ -0,0 +1,156 @@
+"""Raw completions and incremental re-rendering of the summary files.
+
+write_summary() keeps the raw completion of every summary, with the
+inputs and generation metadata, in a JSON record under DATA_DIR/raw. Each
+record also notes the TEMPLATE_VERSION and a hash of the inputs its .md
+file was last rendered from, so a template change only rebuilds the files
+it affects and never calls OpenAI again:
+
+    python rerender.py [--force] [--workers N] [--dry-run]
+
+The "Pair With" suggestions are not part of that hash, since they change
+whenever the corpus does; refresh them with
+`python related_books.py rebuild --rewrite`.
+
+Rendering runs in a process pool and each file is replaced atomically.
+(OUTPUT_DIR is taken from the environment, as for the app.)
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from summary_template import TEMPLATE_VERSION, render_summary
+
+logger = logging.getLogger(__name__)
+
+
+def raw_path(raw_dir, filename):
+    """Path of the raw record for a summary file"""
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    return os.path.join(raw_dir, f"{stem}.json")
+
+
+def _write_atomic(path, content):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def save_raw(path, record):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    _write_atomic(path, json.dumps(record, ensure_ascii=False, indent=2))
+
+
+def load_raw(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def inputs_hash(record):
+    """Hash of everything render_summary reads from a record"""
+    fields = [record['title'], record['authors'], record.get('description', ''), record['language'],
+              record['raw'], record.get('pubDate')]
+    return hashlib.sha256(json.dumps(fields, ensure_ascii=False).encode('utf-8')).hexdigest()[:32]
+
+
+def render_record(record, related_books):
+    """Render a raw record to markdown; returns (content, rendered info for the record)"""
+    content = render_summary(record['title'], record['authors'], record.get('description', ''),
+                             record['raw'], record['language'], related_books, record.get('pubDate'))
+    return content, {'templateVersion': TEMPLATE_VERSION, 'inputsHash': inputs_hash(record)}
+
+
+def is_stale(record, filename):
+    rendered = record.get('rendered') or {}
+    return (rendered.get('templateVersion') != TEMPLATE_VERSION
+            or rendered.get('inputsHash') != inputs_hash(record)
+            or not os.path.exists(filename))
+
+
+def render_job(job):
+    """Worker: render one record and write both files; returns the summary path"""
+    record_path, filename, related_books = job
+    record = load_raw(record_path)
+    content, rendered = render_record(record, related_books)
+    _write_atomic(filename, content)
+    record['rendered'] = rendered
+    save_raw(record_path, record)
+    return filename
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--force', action='store_true', help="re-render every summary with a raw record")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="rendering processes")
+    parser.add_argument('--dry-run', action='store_true', help="only list the summaries that would change")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    import app
+    from related_books import format_related_book
+    # Not app.book_service.related_engine, which would sync in a background thread as well
+    related_engine = app.open_related_engine()
+    neighbours = {}
+    if related_engine is not None:
+        related_engine.sync()
+        neighbours = related_engine.related_all()
+
+    jobs = []
+    records = 0
+    try:
+        names = sorted(name for name in os.listdir(app.RAW_DIR) if name.endswith('.json'))
+    except FileNotFoundError:
+        names = []
+    for name in names:
+        record_path = os.path.join(app.RAW_DIR, name)
+        try:
+            record = load_raw(record_path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping unreadable raw record {record_path}: {e}")
+            continue
+        records += 1
+        filename = app.summary_filename(record['slug'], record['language'])
+        if not (args.force or is_stale(record, filename)):
+            continue
+        if record['slug'] in neighbours:
+            related_books = app.with_fallback_books(
+                record['title'], [format_related_book(book) for book in neighbours[record['slug']]])
+        else:
+            related_books = app.suggest_related_books(record['title'], record['authors'],
+                                                      record.get('description', ''), record['raw'],
+                                                      related_engine=related_engine)
+        jobs.append((record_path, filename, related_books))
+
+    try:
+        summaries = sum(1 for name in os.listdir(app.OUTPUT_DIR) if name.endswith('.md'))
+    except FileNotFoundError:
+        summaries = 0
+    print(f"{len(jobs)} of {records} summaries need re-rendering"
+          f" ({max(0, summaries - records)} summaries have no raw output and are left as they are)")
+    if args.dry_run or not jobs:
+        for _, filename, _ in jobs:
+            print(f"  {filename}")
+        return
+
+    started = time.perf_counter()
+    rendered = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        futures = {executor.submit(render_job, job): job for job in jobs}
+        for future in as_completed(futures):
+            try:
+                filename = future.result()
+            except Exception as e:
+                logger.error(f"Error re-rendering {futures[future][0]}: {e}")
+                continue
+            rendered += 1
+            app.book_service.summary_search.index_file(filename)
+    print(f"Re-rendered {rendered} summaries in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
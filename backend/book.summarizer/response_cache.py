@@ -0,0 +1,304 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import inspect
+import logging
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# endpoint -> (fresh seconds, stale seconds). Within the fresh window a cached
+# response is served as-is; within the stale window it is served immediately
+# and refreshed in the background; after that it is refetched inline.
+DEFAULT_TTLS = {
+    'search_google_books': (3600, 24 * 3600),
+    'search_open_library': (3600, 24 * 3600),
+    'book_details_google': (24 * 3600, 7 * 24 * 3600),
+    'book_details_open_library': (24 * 3600, 7 * 24 * 3600),
+    'books_by_category': (6 * 3600, 48 * 3600),
+}
+DEFAULT_TTL = (3600, 24 * 3600)
+# How long past its stale window a row is kept on disk to be served when
+# the upstream is failing (stale-if-error)
+ERROR_GRACE = 7 * 24 * 3600
+
+
+# Free-text parameters that upstreams treat case-insensitively. Everything
+# else (notably volume and work ids) keeps its case.
+CASE_INSENSITIVE_PARAMS = {'query', 'category_code'}
+
+
+def _normalize(name, value):
+    if isinstance(value, str):
+        value = ' '.join(value.split())
+        return value.lower() if name in CASE_INSENSITIVE_PARAMS else value
+    return value
+
+
+def make_key(endpoint, params):
+    """Build a stable cache key from an endpoint name and its normalized parameters"""
+    normalized = {name: _normalize(name, value) for name, value in params.items()}
+    payload = json.dumps(normalized, sort_keys=True, default=str)
+    return f"{endpoint}:{hashlib.sha1(payload.encode('utf-8')).hexdigest()}"
+
+
+class ResponseCache:
+    """Two-tier upstream response cache: in-process LRU in front of a shared SQLite file"""
+
+    def __init__(self, db_path=None, ttls=None, maxsize=2048, refresh_workers=4):
+        self.ttls = dict(DEFAULT_TTLS)
+        self.ttls.update(ttls or {})
+        self.memory = TTLCache(maxsize=maxsize)
+        self.db_path = db_path
+        self._local = threading.local()
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="cache-refresh")
+        self.counters = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'stale_hits': 0,
+            'misses': 0,
+            'refreshes': 0,
+            'refresh_errors': 0,
+            'stale_if_error': 0,
+        }
+        if db_path:
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+            self._init_db()
+            self.purge_expired()
+
+    # -- SQLite tier -------------------------------------------------------
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " endpoint TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " fresh_until REAL NOT NULL,"
+            " stale_until REAL NOT NULL)"
+        )
+
+    def _disk_get(self, key, include_expired=False):
+        if not self.db_path:
+            return None
+        try:
+            row = self._conn().execute(
+                "SELECT value, fresh_until, stale_until FROM responses WHERE key = ? AND stale_until > ?",
+                (key, time.time() - (ERROR_GRACE if include_expired else 0))
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Response cache read failed: {e}")
+            return None
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1], row[2]
+
+    def _disk_set(self, key, endpoint, value, fresh_until, stale_until):
+        if not self.db_path:
+            return
+        try:
+            self._conn().execute(
+                "INSERT OR REPLACE INTO responses (key, endpoint, value, fresh_until, stale_until) VALUES (?, ?, ?, ?, ?)",
+                (key, endpoint, json.dumps(value), fresh_until, stale_until)
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"Response cache write failed: {e}")
+
+    def purge_expired(self):
+        """Delete rows that are past their stale window and the error grace period"""
+        if self.db_path:
+            self._conn().execute("DELETE FROM responses WHERE stale_until <= ?", (time.time() - ERROR_GRACE,))
+
+    # -- public API ---------------------------------------------------------
+
+    def _count(self, name):
+        with self._stats_lock:
+            self.counters[name] += 1
+
+    def _store(self, key, endpoint, value):
+        fresh, stale = self.ttls.get(endpoint, DEFAULT_TTL)
+        now = time.time()
+        fresh_until, stale_until = now + fresh, now + stale
+        self.memory.set(key, (value, fresh_until), expires_at=stale_until)
+        self._disk_set(key, endpoint, value, fresh_until, stale_until)
+
+    def _lookup(self, key):
+        entry = self.memory.get(key)
+        if entry is not None:
+            self._count('memory_hits')
+            return entry
+        disk_entry = self._disk_get(key)
+        if disk_entry is not None:
+            value, fresh_until, stale_until = disk_entry
+            self.memory.set(key, (value, fresh_until), expires_at=stale_until)
+            self._count('disk_hits')
+            return value, fresh_until
+        return None
+
+    def get_or_fetch(self, endpoint, params, fetch, cacheable=None):
+        """Return the cached response for (endpoint, params), calling fetch() on a miss
+
+        Values returned from the cache are shared between callers and must
+        not be mutated. If fetch() fails (raises or returns an uncacheable
+        value) an expired copy still within the error grace period is
+        served instead.
+        """
+        cacheable = cacheable or (lambda value: value is not None)
+        key = make_key(endpoint, params)
+        entry = self._lookup(key)
+        if entry is not None:
+            value, fresh_until = entry
+            if fresh_until <= time.time():
+                self._count('stale_hits')
+                self._schedule_refresh(key, endpoint, fetch, cacheable)
+            return value
+
+        self._count('misses')
+        try:
+            value = fetch()
+        except Exception:
+            fallback = self._disk_get(key, include_expired=True)
+            if fallback is None:
+                raise
+            self._count('stale_if_error')
+            return fallback[0]
+        if cacheable(value):
+            self._store(key, endpoint, value)
+            return value
+        fallback = self._disk_get(key, include_expired=True)
+        if fallback is not None:
+            self._count('stale_if_error')
+            return fallback[0]
+        return value
+
+    def _schedule_refresh(self, key, endpoint, fetch, cacheable):
+        with self._refresh_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                value = fetch()
+                if cacheable(value):
+                    self._store(key, endpoint, value)
+                self._count('refreshes')
+            except Exception as e:
+                self._count('refresh_errors')
+                logger.warning(f"Background refresh of {endpoint} failed: {e}")
+            finally:
+                with self._refresh_lock:
+                    self._refreshing.discard(key)
+
+        self.executor.submit(refresh)
+
+    async def get_or_fetch_async(self, endpoint, params, fetch, cacheable=None):
+        """get_or_fetch() for a coroutine function fetch; stale entries are refreshed in a task"""
+        cacheable = cacheable or (lambda value: value is not None)
+        key = make_key(endpoint, params)
+        entry = self._lookup(key)
+        if entry is not None:
+            value, fresh_until = entry
+            if fresh_until <= time.time():
+                self._count('stale_hits')
+                self._schedule_refresh_async(key, endpoint, fetch, cacheable)
+            return value
+
+        self._count('misses')
+        try:
+            value = await fetch()
+        except Exception:
+            fallback = self._disk_get(key, include_expired=True)
+            if fallback is None:
+                raise
+            self._count('stale_if_error')
+            return fallback[0]
+        if cacheable(value):
+            self._store(key, endpoint, value)
+            return value
+        fallback = self._disk_get(key, include_expired=True)
+        if fallback is not None:
+            self._count('stale_if_error')
+            return fallback[0]
+        return value
+
+    def _schedule_refresh_async(self, key, endpoint, fetch, cacheable):
+        with self._refresh_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        async def refresh():
+            try:
+                value = await fetch()
+                if cacheable(value):
+                    self._store(key, endpoint, value)
+                self._count('refreshes')
+            except Exception as e:
+                self._count('refresh_errors')
+                logger.warning(f"Background refresh of {endpoint} failed: {e}")
+            finally:
+                with self._refresh_lock:
+                    self._refreshing.discard(key)
+
+        asyncio.get_running_loop().create_task(refresh())
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self.counters)
+        stats['evictions'] = self.memory.evictions
+        stats['memory_size'] = len(self.memory)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+def cached_response(endpoint, cacheable=None):
+    """Cache a BookService method through its instance's response_cache"""
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        def cache_params(self, args, kwargs):
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            return {name: value for name, value in bound.arguments.items() if name != 'self'}
+
+        if inspect.iscoroutinefunction(fn):
+            # Coroutine methods share entries with synchronous methods of the same endpoint
+            @functools.wraps(fn)
+            async def wrapper(self, *args, **kwargs):
+                cache = getattr(self, 'response_cache', None)
+                if cache is None:
+                    return await fn(self, *args, **kwargs)
+                return await cache.get_or_fetch_async(endpoint, cache_params(self, args, kwargs),
+                                                      lambda: fn(self, *args, **kwargs), cacheable)
+        else:
+            @functools.wraps(fn)
+            def wrapper(self, *args, **kwargs):
+                cache = getattr(self, 'response_cache', None)
+                if cache is None:
+                    return fn(self, *args, **kwargs)
+                return cache.get_or_fetch(endpoint, cache_params(self, args, kwargs),
+                                          lambda: fn(self, *args, **kwargs), cacheable)
+        wrapper.uncached = fn
+        return wrapper
+    return decorator
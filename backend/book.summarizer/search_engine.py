@@ -0,0 +1,56 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from upstream import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+
+class SearchEngine:
+    """Fan a search out to every provider at once under a shared deadline"""
+
+    def __init__(self, providers, deadline=4.0, max_workers=16):
+        # providers: list of (name, fn(query, max_results) -> list of books);
+        # the provider functions are expected to raise on upstream failure
+        self.providers = providers
+        self.deadline = deadline
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="search")
+
+    def search(self, query, max_results=10, deadline=None):
+        """Query all providers concurrently and return whatever arrived in time"""
+        deadline = self.deadline if deadline is None else deadline
+        per_source = max(1, max_results // max(1, len(self.providers)))
+        started = time.monotonic()
+        futures = [
+            (name, self.executor.submit(fn, query, per_source))
+            for name, fn in self.providers
+        ]
+        done, _ = wait([future for _, future in futures], timeout=deadline)
+
+        results = []
+        sources = {}
+        for name, future in futures:
+            if future not in done:
+                # The worker keeps running until its own socket timeout fires,
+                # but the caller no longer waits for it.
+                future.cancel()
+                sources[name] = "timeout"
+                logger.warning(f"Search provider {name} missed the {deadline}s deadline for '{query}'")
+                continue
+            try:
+                results.extend(future.result())
+                sources[name] = "ok"
+            except CircuitOpenError:
+                sources[name] = "unavailable"
+            except Exception as e:
+                sources[name] = "error"
+                logger.error(f"Search provider {name} failed for '{query}': {e}")
+
+        elapsed_ms = int((time.monotonic() - started) * 1000)
+        return {
+            "results": results,
+            "sources": sources,
+            "partial": any(status != "ok" for status in sources.values()),
+            "elapsedMs": elapsed_ms
+        }
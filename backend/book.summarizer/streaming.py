@@ -0,0 +1,45 @@
+import json
+
+
+def sse_event(event, data):
+    """Encode one Server-Sent Events message with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class SectionSplitter:
+    """Split streamed markdown into '## ' sections as soon as each one is complete
+
+    A section is complete once the next '## ' heading starts, or when the
+    stream ends.
+    """
+
+    def __init__(self):
+        self._buffer = ''
+
+    def feed(self, text):
+        """Add streamed text and return the sections it completed"""
+        self._buffer += text
+        sections = []
+        while True:
+            # Look for a heading that starts a *new* section
+            start = 1 if self._buffer.startswith('## ') else 0
+            boundary = self._buffer.find('\n## ', start)
+            if boundary == -1:
+                return sections
+            section = self._buffer[:boundary].strip()
+            self._buffer = self._buffer[boundary + 1:]
+            if section:
+                sections.append(self._parse(section))
+
+    def flush(self):
+        """Return the final, still-open section, if any"""
+        section = self._buffer.strip()
+        self._buffer = ''
+        return [self._parse(section)] if section else []
+
+    @staticmethod
+    def _parse(section):
+        if section.startswith('## '):
+            heading, _, body = section[3:].partition('\n')
+            return {'heading': heading.strip(), 'content': body.strip()}
+        return {'heading': '', 'content': section}
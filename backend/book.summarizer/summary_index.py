@@ -0,0 +1,198 @@
+"""In-memory index of the summary files, with an optional startup snapshot.
+
+Building the index lists OUTPUT_DIR, stats every summary and reads every
+processed book. A snapshot of the result lets the app restore it at boot
+(see STARTUP_SNAPSHOT in app.py) at the cost of a single listing:
+
+    python summary_index.py snapshot PATH
+
+A snapshot is only used while OUTPUT_DIR holds exactly the summaries it
+was taken from; otherwise the index is built as usual.
+"""
+import os
+import re
+import sys
+import json
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+LANGUAGE_LINE_RE = re.compile(r'^language:\s*"?([A-Za-z_-]+)"?\s*$', re.MULTILINE)
+
+
+def summary_stem(slug, language='english'):
+    """File name, without '.md', of the summary for a slug and language"""
+    return slug if language == 'english' else f"{slug}-{language}"
+
+
+def summary_slug(name, language='english'):
+    """Slug of a summary file, given the language its front matter declares
+
+    The language can't be read off the file name: 'zorba-the-greek.md' is
+    the English summary of "Zorba the Greek", not a Greek 'zorba-the'.
+    """
+    stem = name[:-3] if name.endswith('.md') else name
+    suffix = f"-{language}"
+    if language != 'english' and stem.endswith(suffix):
+        return stem[:-len(suffix)]
+    return stem
+
+
+def summary_language(path):
+    """The language declared in a summary's front matter, 'english' if it has none"""
+    with open(path, 'r', encoding='utf-8') as f:
+        head = f.read(2048)
+    end = head.find('\n---', 3) if head.startswith('---') else -1
+    match = LANGUAGE_LINE_RE.search(head[3:end]) if end != -1 else None
+    return match.group(1).lower() if match else 'english'
+
+
+class SummaryIndex:
+    """In-memory index of the summary files in OUTPUT_DIR
+
+    Holds the stem of every summary file with its mtime, and bookId -> slug.
+    Whether a slug has a summary in a language is answered by looking up
+    summary_stem(slug, language), so nothing is inferred from the names.
+    It is built once from a directory listing, updated directly by the code paths
+    that write summaries, and rescanned when the directory's mtime changes
+    (which catches files written by other worker processes).
+    """
+
+    SNAPSHOT_VERSION = 2
+
+    def __init__(self, output_dir, languages, book_store=None, rescan_interval=30.0, snapshot=None):
+        self.output_dir = output_dir
+        self.languages = set(languages)
+        self.book_store = book_store
+        self.rescan_interval = rescan_interval
+        self._lock = threading.Lock()
+        self._mtime_by_stem = {}
+        self._slug_by_book = {}
+        self._dir_mtime = None
+        self._checked_at = 0.0
+        self.restored = snapshot is not None and self.restore(snapshot)
+        if not self.restored:
+            self.build()
+
+    def build(self):
+        """Rebuild the tables from a single directory listing"""
+        mtime_by_stem = {}
+        try:
+            dir_mtime = os.stat(self.output_dir).st_mtime
+            with os.scandir(self.output_dir) as entries:
+                for entry in entries:
+                    if not entry.name.endswith('.md') or not entry.is_file():
+                        continue
+                    mtime_by_stem[entry.name[:-3]] = entry.stat().st_mtime
+        except FileNotFoundError:
+            dir_mtime = None
+        slug_by_book = {}
+        if self.book_store is not None:
+            for book_id, entry in self.book_store.items():
+                if entry.get('slug'):
+                    slug_by_book[book_id] = entry['slug']
+        with self._lock:
+            self._mtime_by_stem = mtime_by_stem
+            self._slug_by_book = slug_by_book
+            self._dir_mtime = dir_mtime
+            self._checked_at = time.monotonic()
+        logger.info(f"Indexed {len(mtime_by_stem)} summaries in {self.output_dir}")
+
+    def snapshot(self):
+        """The index as a JSON-serializable dict, for restore()"""
+        self._maybe_rescan()
+        with self._lock:
+            return {
+                'version': self.SNAPSHOT_VERSION,
+                'files': sorted(f"{stem}.md" for stem in self._mtime_by_stem),
+                'mtimes': dict(self._mtime_by_stem),
+                'books': dict(self._slug_by_book)
+            }
+
+    def restore(self, snapshot):
+        """Load a snapshot if OUTPUT_DIR still holds the same summaries; returns whether it did"""
+        if snapshot.get('version') != self.SNAPSHOT_VERSION:
+            logger.warning("Ignoring summary index snapshot with an unknown version")
+            return False
+        try:
+            dir_mtime = os.stat(self.output_dir).st_mtime
+            names = sorted(name for name in os.listdir(self.output_dir) if name.endswith('.md'))
+        except FileNotFoundError:
+            return False
+        if names != snapshot['files']:
+            logger.warning(f"Summary index snapshot is out of date for {self.output_dir}; rebuilding")
+            return False
+        with self._lock:
+            self._mtime_by_stem = dict(snapshot['mtimes'])
+            self._slug_by_book = dict(snapshot['books'])
+            self._dir_mtime = dir_mtime
+            self._checked_at = time.monotonic()
+        logger.info(f"Restored {len(names)} summaries in {self.output_dir} from a snapshot")
+        return True
+
+    def _maybe_rescan(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.rescan_interval:
+            return
+        self._checked_at = now
+        try:
+            dir_mtime = os.stat(self.output_dir).st_mtime
+        except FileNotFoundError:
+            return
+        if dir_mtime != self._dir_mtime:
+            self.build()
+
+    def record(self, slug, language='english', mtime=None):
+        """Note that a summary file was written"""
+        with self._lock:
+            self._mtime_by_stem[summary_stem(slug, language)] = mtime or time.time()
+
+    def forget(self, slug, language='english'):
+        """Note that a summary file was removed"""
+        with self._lock:
+            self._mtime_by_stem.pop(summary_stem(slug, language), None)
+
+    def record_book(self, book_id, slug):
+        with self._lock:
+            self._slug_by_book[book_id] = slug
+
+    def slug_for_book(self, book_id):
+        """Return the slug recorded for a book id, or None"""
+        slug = self._slug_by_book.get(book_id)
+        if slug is None and self.book_store is not None:
+            # Possibly recorded by another worker process since the last build
+            entry = self.book_store.get(book_id)
+            if entry and entry.get('slug'):
+                slug = entry['slug']
+                self.record_book(book_id, slug)
+        return slug
+
+    def has(self, slug, language='english'):
+        self._maybe_rescan()
+        return summary_stem(slug, language) in self._mtime_by_stem
+
+    def languages_for_slug(self, slug):
+        self._maybe_rescan()
+        return {language for language in self.languages if summary_stem(slug, language) in self._mtime_by_stem}
+
+    def mtime(self, slug):
+        """Latest mtime of the slug's summaries in any language, or None"""
+        mtimes = [self._mtime_by_stem.get(summary_stem(slug, language)) for language in self.languages_for_slug(slug)]
+        return max((mtime for mtime in mtimes if mtime is not None), default=None)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3 or sys.argv[1] != 'snapshot':
+        print(__doc__)
+        sys.exit(1)
+    logging.basicConfig(level=logging.INFO)
+    import app
+    snapshot = SummaryIndex(app.OUTPUT_DIR, app.SUPPORTED_LANGUAGES, app.book_service.processed_books).snapshot()
+    os.makedirs(os.path.dirname(os.path.abspath(sys.argv[2])), exist_ok=True)
+    tmp_path = f"{sys.argv[2]}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f, ensure_ascii=False)
+    os.replace(tmp_path, sys.argv[2])
+    print(f"Wrote a snapshot of {len(snapshot['files'])} summaries to {sys.argv[2]}")
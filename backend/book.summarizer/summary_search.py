@@ -0,0 +1,221 @@
+"""Full-text search over the generated summary files.
+
+The .md files in OUTPUT_DIR (and OUTPUT_DIR/pending for user submissions)
+are indexed into a SQLite FTS5 table: title, author, description and body,
+ranked with BM25. Writers call index_file() right after writing a summary;
+sync() reconciles the index with the directory using each file's mtime and
+size, so only new or changed files are read.
+"""
+import os
+import re
+import html
+import sqlite3
+import logging
+import threading
+
+from summary_index import summary_slug
+
+logger = logging.getLogger(__name__)
+
+PUBLISHED = 'published'
+PENDING = 'pending'
+
+FRONTMATTER_LINE_RE = re.compile(r'^([A-Za-z_][\w-]*):\s*(.*)$')
+QUERY_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# bm25() weights for the title, author, description and body columns
+RANK_WEIGHTS = (10.0, 5.0, 2.0, 1.0)
+# snippet() wraps matches in these private-use characters; the text around
+# them is HTML-escaped before they are turned into <mark> tags. They are
+# stripped from summaries when indexed, so only snippet() can insert them.
+MARK_START = '\ue000'
+MARK_END = '\ue001'
+
+
+def parse_frontmatter(text):
+    """Split a markdown file into (frontmatter dict, body)
+
+    Only the flat `key: "value"` lines our summaries use are understood.
+    """
+    if not text.startswith('---'):
+        return {}, text
+    end = text.find('\n---', 3)
+    if end == -1:
+        return {}, text
+    meta = {}
+    for line in text[3:end].splitlines():
+        match = FRONTMATTER_LINE_RE.match(line.strip())
+        if match:
+            value = match.group(2).strip()
+            if len(value) >= 2 and value[0] == value[-1] == '"':
+                value = value[1:-1]
+            meta[match.group(1)] = value
+    return meta, text[end + 4:].lstrip('\n')
+
+
+def build_match_query(query, columns=None):
+    """Turn free text into a safe FTS5 query: every word must match, the last as a prefix"""
+    tokens = QUERY_TOKEN_RE.findall(query or '')
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens[:-1]]
+    terms.append(f'"{tokens[-1]}"*')
+    match = ' '.join(terms)
+    if columns:
+        match = f"{{{' '.join(columns)}}} : ({match})"
+    return match
+
+
+def highlight(snippet):
+    """An FTS5 snippet as HTML: the summary text escaped, matches in <mark> tags"""
+    return html.escape(snippet or '').replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+class SummarySearch:
+    """SQLite FTS5 index of summary markdown files"""
+
+    def __init__(self, db_path, output_dir, languages):
+        self.db_path = db_path
+        self.output_dir = output_dir
+        self.languages = set(languages)
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._init_db()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        conn = self._conn()
+        conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS summaries USING fts5("
+            " title, author, description, body,"
+            " path UNINDEXED, slug UNINDEXED, language UNINDEXED, status UNINDEXED,"
+            " tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS indexed_files ("
+            " path TEXT PRIMARY KEY,"
+            " mtime_ns INTEGER NOT NULL,"
+            " size INTEGER NOT NULL)"
+        )
+
+    def index_file(self, path, status=PUBLISHED):
+        """(Re)index one summary file"""
+        try:
+            stat = os.stat(path)
+            with open(path, 'r', encoding='utf-8') as f:
+                meta, body = parse_frontmatter(f.read())
+        except OSError as e:
+            logger.warning(f"Could not index {path}: {e}")
+            return False
+        language = meta.get('language', 'english')
+        slug = summary_slug(os.path.basename(path), language)
+        body = body.replace(MARK_START, '').replace(MARK_END, '')
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM summaries WHERE path = ?", (path,))
+            conn.execute(
+                "INSERT INTO summaries (title, author, description, body, path, slug, language, status)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (meta.get('title', ''), meta.get('author', ''), meta.get('description', ''), body,
+                 path, slug, language, status)
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO indexed_files (path, mtime_ns, size) VALUES (?, ?, ?)",
+                (path, stat.st_mtime_ns, stat.st_size)
+            )
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            conn.execute("ROLLBACK")
+            logger.error(f"Error indexing {path}: {e}")
+            return False
+        return True
+
+    def remove(self, path):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM summaries WHERE path = ?", (path,))
+            conn.execute("DELETE FROM indexed_files WHERE path = ?", (path,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _scan(self):
+        """Yield (path, status, stat) for every summary file on disk"""
+        for directory, status in ((self.output_dir, PUBLISHED), (os.path.join(self.output_dir, 'pending'), PENDING)):
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.name.endswith('.md') and entry.is_file():
+                            yield os.path.join(directory, entry.name), status, entry.stat()
+            except FileNotFoundError:
+                continue
+
+    def sync(self):
+        """Index new and changed files and drop deleted ones"""
+        known = {path: (mtime_ns, size) for path, mtime_ns, size in
+                 self._conn().execute("SELECT path, mtime_ns, size FROM indexed_files")}
+        indexed = 0
+        for path, status, stat in self._scan():
+            if known.pop(path, None) != (stat.st_mtime_ns, stat.st_size):
+                if self.index_file(path, status):
+                    indexed += 1
+        for path in known:
+            self.remove(path)
+        logger.info(f"Summary search index: {indexed} files indexed, {len(known)} removed")
+        return indexed
+
+    def start_sync(self):
+        """Run sync() on a daemon thread so startup is not blocked by a large corpus"""
+        thread = threading.Thread(target=self.sync, name="summary-search-sync", daemon=True)
+        thread.start()
+        return thread
+
+    def search(self, query, language=None, page=1, limit=10, include_pending=False, columns=None):
+        """Return ranked, paginated hits for a free-text query
+
+        columns restricts matching to some of title, author, description
+        and body.
+        """
+        match = build_match_query(query, columns)
+        page = max(1, page)
+        if match is None:
+            return {"results": [], "total": 0, "page": page, "hasMore": False}
+        where = "summaries MATCH ?"
+        params = [match]
+        if language:
+            where += " AND language = ?"
+            params.append(language)
+        if not include_pending:
+            where += " AND status = ?"
+            params.append(PUBLISHED)
+        conn = self._conn()
+        total = conn.execute(f"SELECT COUNT(*) FROM summaries WHERE {where}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT slug, language, status, title, author, description,"
+            f" snippet(summaries, 3, '{MARK_START}', '{MARK_END}', '…', 24),"
+            f" bm25(summaries, {', '.join(str(weight) for weight in RANK_WEIGHTS)}) AS rank"
+            f" FROM summaries WHERE {where} ORDER BY rank, language != 'english' LIMIT ? OFFSET ?",
+            params + [limit, (page - 1) * limit]
+        ).fetchall()
+        results = [{
+            'slug': slug,
+            'language': language,
+            'status': status,
+            'title': title,
+            'author': author,
+            'description': description,
+            'snippet': highlight(snippet),
+            'score': round(-rank, 6)
+        } for slug, language, status, title, author, description, snippet, rank in rows]
+        return {"results": results, "total": total, "page": page, "hasMore": page * limit < total}
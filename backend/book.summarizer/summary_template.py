@@ -0,0 +1,87 @@
+"""Markdown template for published summaries.
+
+Bump TEMPLATE_VERSION whenever render_summary's output changes, so that
+`python rerender.py` knows to rebuild every stored summary.
+"""
+from datetime import datetime
+
+from quotes import extract_quotes
+
+TEMPLATE_VERSION = 1
+
+
+def generate_amazon_link(title, authors):
+    """Generate Amazon affiliate link"""
+    base_url = "https://www.amazon.com/s"
+    query = f"{title} {' '.join(authors)}".replace(' ', '+')
+    return f"{base_url}?k={query}&tag=gmh07-20"
+
+
+def render_summary(title, authors, description, gpt_summary, language='english', related_books=None, pub_date=None):
+    """Format the summary in the desired Markdown structure
+
+    Everything the output depends on is passed in, so a stored completion
+    renders to the same file until TEMPLATE_VERSION or an input changes.
+    """
+    # Ensure authors is a string
+    if isinstance(authors, list):
+        authors = ', '.join(authors)
+    
+    # Generate links and suggestions
+    amazon_link = generate_amazon_link(title, [authors])
+    related_books = related_books or []
+    quotes = extract_quotes(gpt_summary)
+    
+    # Parse the GPT-generated summary
+    sections = gpt_summary.split('## ')
+    
+    # Extract sections, with fallback values
+    short_summary = sections[1].split('\n')[0].strip() if len(sections) > 1 else "A brief overview of the book."
+    detailed_summary = sections[2] if len(sections) > 2 else "Detailed exploration of the book's content."
+    key_takeaways = sections[3].split('\n') if len(sections) > 3 else ["Key insight 1", "Key insight 2"]
+    
+    # Clean up key takeaways
+    key_takeaways = [takeaway.strip().replace('- ', '') for takeaway in key_takeaways if takeaway.strip()]
+    takeaways_md = ''.join(f"🔑 {takeaway}\n" for takeaway in key_takeaways)
+    pair_with_md = ''.join(f"{number}. {book}\n" for number, book in enumerate(related_books, 1))
+    
+    summary_content = f"""---
+title: "{title}"
+author: "{authors}"
+pubDate: "{pub_date or datetime.now().strftime('%Y-%m-%d')}"
+description: "{description or 'A comprehensive book summary'}"
+language: "{language}"
+amazonLink: "{amazon_link}"
+---
+
+## Intro Sentence
+{short_summary}
+
+## The Big Idea
+A concise statement of the book's central thesis or most important concept.
+
+## Core Summary
+{detailed_summary.strip()}
+
+## Key Takeaways
+{takeaways_md}
+
+## Apply This Now
+1. 🎯 First actionable step derived from the book
+2. 🛠 Second practical application
+3. 🌱 Third implementable strategy
+
+## Quotes to Remember
+1. "{quotes[0]}"
+2. "{quotes[1]}"
+3. "{quotes[2]}"
+
+## Get this Book Now
+[Buy on Amazon]({amazon_link})
+
+## Pair With
+{pair_with_md}
+## About the Author
+{authors} is a notable author known for their significant contributions to literature and writing. Their other works include [List other books by the author if available].
+"""
+    return summary_content
@@ -0,0 +1,78 @@
+import re
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from llm import prompt_hash
+
+FRONTMATTER_RE = re.compile(r'\A---\n.*?\n---\n', re.DOTALL)
+SECTION_RE = re.compile(r'^## ', re.MULTILINE)
+
+
+def split_sections(text, max_chars=4000):
+    """Split markdown into chunks along '## ' headings
+
+    Sections longer than max_chars are further split on blank lines. The
+    chunks concatenate back to exactly the original text.
+    """
+    starts = [m.start() for m in SECTION_RE.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    bounds = starts + [len(text)]
+    chunks = []
+    for start, end in zip(bounds, bounds[1:]):
+        section = text[start:end]
+        if len(section) <= max_chars:
+            chunks.append(section)
+            continue
+        current = ''
+        for paragraph in re.split(r'(?<=\n\n)', section):
+            if current and len(current) + len(paragraph) > max_chars:
+                chunks.append(current)
+                current = ''
+            current += paragraph
+        if current:
+            chunks.append(current)
+    return [chunk for chunk in chunks if chunk]
+
+
+class Translator:
+    """Translate markdown section by section, in parallel, caching each chunk"""
+
+    def __init__(self, llm_client, model, max_workers=8, max_chunk_chars=4000):
+        self.llm_client = llm_client
+        self.model = model
+        self.max_chunk_chars = max_chunk_chars
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="translate")
+
+    def translate(self, text, target_language):
+        """Return the translated text; YAML frontmatter is passed through untouched"""
+        frontmatter = ''
+        match = FRONTMATTER_RE.match(text)
+        if match:
+            frontmatter, text = match.group(0), text[match.end():]
+        chunks = split_sections(text, self.max_chunk_chars)
+        translated = self.executor.map(lambda chunk: self._translate_chunk(chunk, target_language), chunks)
+        return frontmatter + ''.join(translated)
+
+    def _translate_chunk(self, chunk, target_language):
+        body = chunk.strip()
+        if not body:
+            return chunk
+        # Keep the chunk's surrounding whitespace so sections reassemble cleanly
+        leading = chunk[:len(chunk) - len(chunk.lstrip())]
+        trailing = chunk[len(chunk.rstrip()):]
+        content_hash = hashlib.sha256(body.encode('utf-8')).hexdigest()
+        completion = self.llm_client.complete(
+            self.model,
+            [
+                {"role": "system", "content": "You are a professional translator."},
+                {"role": "user", "content": (
+                    f"Translate the following text to {target_language}. "
+                    f"Keep the markdown formatting and reply with the translation only.\n\n{body}"
+                )}
+            ],
+            temperature=0.3,
+            key=prompt_hash(kind='translation', model=self.model, content=content_hash,
+                            language=target_language.lower())
+        )
+        return leading + completion['content'].strip() + trailing
@@ -0,0 +1,441 @@
+import json
+import time
+import random
+import asyncio
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+USER_AGENT = "book-summaries/1.0 (+https://github.com/quiet-innovator/book-summaries)"
+
+
+def create_session(pool_size=20):
+    """Create a requests session with a keep-alive connection pool"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"User-Agent": USER_AGENT})
+    return session
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `rate` tokens per second"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, amount):
+        """Bucket allowing `amount` tokens per minute, with a one-minute burst"""
+        return cls(amount / 60.0, capacity=amount)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens=1):
+        """Take tokens if available right now; return False otherwise"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens=1, timeout=None):
+        """Block until tokens are available; False if timeout expires first
+
+        Requests larger than the bucket are clamped to its capacity so they
+        can still proceed once the bucket is full.
+        """
+        tokens = min(tokens, self.capacity)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens=1, timeout=None):
+        """acquire() for coroutines: waits without blocking the event loop"""
+        tokens = min(tokens, self.capacity)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            await asyncio.sleep(wait)
+
+    def adjust(self, tokens):
+        """Debit (positive) or credit (negative) tokens after the fact, e.g. once real usage is known"""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens - tokens)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit breaker is open"""
+
+
+class RateLimitedError(Exception):
+    """Raised when the local rate limiter cannot admit a call in time"""
+
+
+class CircuitBreaker:
+    """Closed/open/half-open circuit breaker counting consecutive failures"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Return True if a call may go through right now"""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN:
+                # Let exactly one probe through until it reports back
+                if self._probing:
+                    return False
+                self._probing = True
+            return True
+
+    def release(self):
+        """Give back a probe slot that was granted but never used"""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.trips += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def snapshot(self):
+        with self._lock:
+            retry_in = None
+            if self.state == self.OPEN:
+                retry_in = max(0.0, round(self.reset_timeout - (time.monotonic() - self.opened_at), 1))
+            return {
+                'state': self.state,
+                'consecutiveFailures': self.failures,
+                'trips': self.trips,
+                'retryInSeconds': retry_in
+            }
+
+
+class RetryBudget:
+    """Cap retries at a fraction of recent traffic, plus a small steady floor
+
+    Every request deposits `ratio` tokens and every retry spends one, so
+    retries can never multiply load on an upstream that is already failing.
+    """
+
+    def __init__(self, ratio=0.2, min_per_second=0.5, max_tokens=20):
+        self.ratio = ratio
+        self._bucket = TokenBucket(min_per_second, capacity=max_tokens)
+
+    def record_request(self):
+        self._bucket.adjust(-self.ratio)
+
+    def try_spend(self):
+        return self._bucket.try_acquire(1)
+
+
+def _retry_after(response):
+    """Seconds from a numeric Retry-After header, if any"""
+    try:
+        return float(response.headers.get('Retry-After'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class UpstreamClient:
+    """One upstream host: timeouts, rate limit, retries within a budget, circuit breaker"""
+
+    def __init__(self, name, session=None, connect_timeout=3.05, read_timeout=10.0,
+                 rate=10.0, burst=20, max_rate_wait=2.0, max_retries=2,
+                 backoff_base=0.25, backoff_max=4.0, retry_ratio=0.2,
+                 failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.session = session
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.limiter = TokenBucket(rate, capacity=burst)
+        self.max_rate_wait = max_rate_wait
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_budget = RetryBudget(ratio=retry_ratio)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._lock = threading.Lock()
+        self.counters = {'calls': 0, 'retries': 0, 'failures': 0, 'rejected': 0, 'rateLimited': 0}
+
+    @property
+    def timeout(self):
+        return (self.connect_timeout, self.read_timeout)
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _backoff(self, attempt, retry_after=None):
+        # Full jitter, but never sooner than the upstream asked us to wait
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return min(delay, self.backoff_max)
+
+    def call(self, fn, retryable=lambda e: True, failed=None):
+        """Run fn() under the breaker, rate limiter and retry budget
+
+        retryable(exception) says whether an exception is an upstream
+        failure worth retrying; other exceptions propagate immediately and
+        count as the upstream being healthy. failed(result) flags results
+        such as HTTP 429/5xx responses, which are retried and, if they
+        persist, returned to the caller as-is.
+        """
+        if not self.breaker.allow():
+            self._count('rejected')
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        self._count('calls')
+        self.retry_budget.record_request()
+        attempt = 0
+        while True:
+            if not self.limiter.acquire(timeout=self.max_rate_wait):
+                self.breaker.release()
+                self._count('rateLimited')
+                raise RateLimitedError(f"{self.name} rate limit exceeded")
+            error = None
+            result = None
+            try:
+                result = fn()
+            except Exception as e:
+                if not retryable(e):
+                    self.breaker.record_success()
+                    raise
+                error = e
+            if error is None and not (failed and failed(result)):
+                self.breaker.record_success()
+                return result
+            if attempt >= self.max_retries or not self.retry_budget.try_spend():
+                self.breaker.record_failure()
+                self._count('failures')
+                if error is not None:
+                    raise error
+                return result
+            self._count('retries')
+            time.sleep(self._backoff(attempt, None if result is None else _retry_after(result)))
+            attempt += 1
+
+    async def call_async(self, fn, retryable=lambda e: True, failed=None):
+        """call() for coroutine functions, sharing this client's breaker, limiter and budget"""
+        if not self.breaker.allow():
+            self._count('rejected')
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        self._count('calls')
+        self.retry_budget.record_request()
+        attempt = 0
+        while True:
+            if not await self.limiter.acquire_async(timeout=self.max_rate_wait):
+                self.breaker.release()
+                self._count('rateLimited')
+                raise RateLimitedError(f"{self.name} rate limit exceeded")
+            error = None
+            result = None
+            try:
+                result = await fn()
+            except Exception as e:
+                if not retryable(e):
+                    self.breaker.record_success()
+                    raise
+                error = e
+            if error is None and not (failed and failed(result)):
+                self.breaker.record_success()
+                return result
+            if attempt >= self.max_retries or not self.retry_budget.try_spend():
+                self.breaker.record_failure()
+                self._count('failures')
+                if error is not None:
+                    raise error
+                return result
+            self._count('retries')
+            await asyncio.sleep(self._backoff(attempt, None if result is None else _retry_after(result)))
+            attempt += 1
+
+    def request(self, method, url, **kwargs):
+        """Issue an HTTP request through the session with this host's policy"""
+        kwargs['timeout'] = self.timeout
+        return self.call(
+            lambda: self.session.request(method, url, **kwargs),
+            retryable=lambda e: isinstance(e, requests.RequestException),
+            failed=lambda response: response.status_code == 429 or response.status_code >= 500
+        )
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self.counters)
+        return dict(counters, name=self.name, breaker=self.breaker.snapshot(),
+                    timeouts={'connect': self.connect_timeout, 'read': self.read_timeout})
+
+
+class ResilientSession:
+    """Session-like front routing each request to the UpstreamClient for its host
+
+    Timeouts are the host's own policy; there is no per-call timeout.
+    """
+
+    def __init__(self, clients, default):
+        self.clients = clients
+        self.default = default
+
+    def client_for(self, url):
+        # Keyed by netloc so that stubs on different local ports stay distinct
+        return self.clients.get(urlsplit(url).netloc, self.default)
+
+    def get(self, url, site=None, **kwargs):
+        """GET url through its host's client, recording latency and errors under `site`"""
+        if 'timeout' in kwargs:
+            raise TypeError("timeouts are set per host by its UpstreamClient")
+        client = self.client_for(url)
+        site = site or client.name
+        started = time.perf_counter()
+        try:
+            response = client.request('GET', url, **kwargs)
+        except Exception as e:
+            metrics.record_call(site, time.perf_counter() - started, type(e).__name__)
+            raise
+        error = f"http_{response.status_code}" if response.status_code >= 400 else None
+        metrics.record_call(site, time.perf_counter() - started, error)
+        return response
+
+
+class FetchedResponse:
+    """A fully read aiohttp response with the parts of the requests API we use"""
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            import aiohttp
+            raise aiohttp.ClientResponseError(None, (), status=self.status_code,
+                                              message=f"HTTP {self.status_code}")
+
+
+class AsyncResilientSession:
+    """ResilientSession for asyncio, over one pooled keep-alive aiohttp session
+
+    Requests go through the same UpstreamClient objects as the synchronous
+    session, so breakers, rate limits and counters are shared between the
+    Flask and ASGI entry points. The aiohttp session is created on first
+    use, inside the running event loop (aiohttp itself is only imported
+    then, so the WSGI app never pays for it).
+    """
+
+    def __init__(self, clients, default, pool_size=100, keepalive_timeout=30.0):
+        self.clients = clients
+        self.default = default
+        self.pool_size = pool_size
+        self.keepalive_timeout = keepalive_timeout
+        self._session = None
+
+    def client_for(self, url):
+        return self.clients.get(urlsplit(url).netloc, self.default)
+
+    @property
+    def session(self):
+        if self._session is None or self._session.closed:
+            import aiohttp
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=self.keepalive_timeout,
+                                             ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(connector=connector, headers={"User-Agent": USER_AGENT})
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _fetch(self, method, url, timeout, **kwargs):
+        async with self.session.request(method, url, timeout=timeout, **kwargs) as response:
+            return FetchedResponse(response.status, response.headers, await response.read())
+
+    async def get(self, url, site=None, **kwargs):
+        """GET url through its host's client, recording latency and errors under `site`"""
+        import aiohttp
+        if 'timeout' in kwargs:
+            raise TypeError("timeouts are set per host by its UpstreamClient")
+        client = self.client_for(url)
+        site = site or client.name
+        timeout = aiohttp.ClientTimeout(sock_connect=client.connect_timeout, sock_read=client.read_timeout)
+        started = time.perf_counter()
+        try:
+            response = await client.call_async(
+                lambda: self._fetch('GET', url, timeout, **kwargs),
+                retryable=lambda e: isinstance(e, (aiohttp.ClientError, asyncio.TimeoutError)),
+                failed=lambda response: response.status_code == 429 or response.status_code >= 500
+            )
+        except Exception as e:
+            metrics.record_call(site, time.perf_counter() - started, type(e).__name__)
+            raise
+        error = f"http_{response.status_code}" if response.status_code >= 400 else None
+        metrics.record_call(site, time.perf_counter() - started, error)
+        return response